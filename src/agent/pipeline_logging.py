@@ -0,0 +1,34 @@
+"""
+Logging setup shared by the pipeline steps.
+Step modules report progress through their module loggers; the verbose flag
+picks the level. Records always propagate to the application's handlers.
+Until the application configures logging, a plain message-only handler prints
+them so standalone runs look the same as before.
+"""
+
+import logging
+
+
+class _FallbackHandler(logging.StreamHandler):
+    """Message-only handler that goes quiet once the root logger has handlers."""
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if logging.getLogger().handlers:
+            return  # Propagation delivers the record to the application's handlers
+        super().emit(record)
+
+
+def configure_step_logger(logger: logging.Logger, verbose: bool, verbose_level: int = logging.INFO) -> None:
+    """
+    Map a step's verbose flag onto its logger level.
+    
+    Args:
+        logger: The step module's logger
+        verbose: If True, log at verbose_level; otherwise warnings only
+        verbose_level: Level used for progress output when verbose
+    """
+    if not any(isinstance(handler, _FallbackHandler) for handler in logger.handlers):
+        handler = _FallbackHandler()
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(handler)
+    logger.setLevel(verbose_level if verbose else logging.WARNING)
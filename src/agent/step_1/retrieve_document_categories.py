@@ -4,9 +4,11 @@ Simple function to find which category/compartment a document belongs to.
 """
 
 import os
-from neo4j import GraphDatabase
+from functools import lru_cache
+from typing import List, Tuple
+
 from dotenv import load_dotenv
-from typing import List
+from neo4j import GraphDatabase
 
 # Load environment variables
 load_dotenv()
@@ -16,6 +18,10 @@ NEO4J_URI = os.getenv('NEO4J_URI', 'bolt://localhost:7687')
 NEO4J_USER = os.getenv('NEO4J_USER', 'neo4j')
 NEO4J_PASSWORD = os.getenv('NEO4J_PASSWORD')
 
+# DocumentCategory membership is static reference data, so lookups are memoized
+# for the life of the process. PIPELINE_CACHE_CLEAR=1 turns this off.
+CACHE_DISABLED = os.getenv('PIPELINE_CACHE_CLEAR') == '1'
+
 
 def get_document_category(document_name: str) -> List[str]:
     """
@@ -32,6 +38,13 @@ def get_document_category(document_name: str) -> List[str]:
         >>> get_document_category("Appraisal Report")
         ['Loan & Property Information', 'Assets & Liabilities']
     """
+    if CACHE_DISABLED:
+        return list(_fetch_document_category(document_name))
+    return list(_fetch_document_category_cached(document_name))
+
+
+def _fetch_document_category(document_name: str) -> Tuple[str, ...]:
+    """Query Neo4j for the categories containing a document."""
     query = """
     MATCH (dc:DocumentCategory)
     WHERE $document_name IN dc.documents
@@ -42,12 +55,16 @@ def get_document_category(document_name: str) -> List[str]:
     try:
         with driver.session() as session:
             result = session.run(query, document_name=document_name)
-            return [record['name'] for record in result]
+            return tuple(record['name'] for record in result)
     finally:
         driver.close()
 
 
 
+_fetch_document_category_cached = lru_cache(maxsize=256)(_fetch_document_category)
+get_document_category.cache_clear = _fetch_document_category_cached.cache_clear
+
+
 # Example usage:
 if __name__ == "__main__":
     # Test with different documents
@@ -66,5 +83,5 @@ if __name__ == "__main__":
         if categories:
             print(f"  → Found in: {categories}")
         else:
-            print(f"  → Not found in any category")
+            print("  → Not found in any category")
 
@@ -4,9 +4,10 @@ Retrieves requirement nodes from Neo4j that match the document's compartment lab
 """
 
 import os
-from neo4j import GraphDatabase
+from typing import Any, Dict, List, Optional
+
 from dotenv import load_dotenv
-from typing import List, Dict, Any, Optional
+from neo4j import GraphDatabase
 
 # Load environment variables
 load_dotenv()
@@ -16,8 +17,35 @@ NEO4J_URI = os.getenv('NEO4J_URI', 'bolt://localhost:7687')
 NEO4J_USER = os.getenv('NEO4J_USER', 'neo4j')
 NEO4J_PASSWORD = os.getenv('NEO4J_PASSWORD')
 
+# Large vector properties that are left out of query results unless requested
+EMBEDDING_PROPERTIES = ('embedding', 'vector')
+
+
+def requirement_return_clause(include_embeddings: bool = False) -> str:
+    """
+    Build the RETURN projection for a `req` variable.
+    
+    Embedding arrays (3072 floats each) are nulled out in Cypher so they are
+    never sent over the wire, unless include_embeddings is True.
+    """
+    if include_embeddings:
+        return "req, elementId(req) AS element_id"
+    nulled = ", ".join(f"{prop}: null" for prop in EMBEDDING_PROPERTIES)
+    return f"req {{ .*, {nulled} }} AS req, elementId(req) AS element_id"
+
+
+def record_to_requirement(record) -> Dict[str, Any]:
+    """Convert a record produced by requirement_return_clause() to a dict."""
+    # Neo4j never stores null properties, so None only marks projected-out fields
+    req_dict = {key: value for key, value in record['req'].items() if value is not None}
+    req_dict['_element_id'] = record['element_id']
+    return req_dict
+
 
-def get_requirements_by_compartment(compartment_label: str) -> List[Dict[str, Any]]:
+def get_requirements_by_compartment(
+    compartment_label: str,
+    include_embeddings: bool = False
+) -> List[Dict[str, Any]]:
     """
     Retrieve all requirement nodes that match the given compartment label.
     
@@ -26,6 +54,7 @@ def get_requirements_by_compartment(compartment_label: str) -> List[Dict[str, An
     Args:
         compartment_label: The compartment/category label to filter by
                           (e.g., "Continuation / Additional Information")
+        include_embeddings: If True, keep the 'embedding'/'vector' properties
     
     Returns:
         List of requirement nodes as dictionaries with their properties.
@@ -44,10 +73,10 @@ def get_requirements_by_compartment(compartment_label: str) -> List[Dict[str, An
             ...
         ]
     """
-    query = """
+    query = f"""
     MATCH (req:Requirement)
     WHERE req.compartment = $compartment_label
-    RETURN req
+    RETURN {requirement_return_clause(include_embeddings)}
     """
     
     driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
@@ -57,10 +86,7 @@ def get_requirements_by_compartment(compartment_label: str) -> List[Dict[str, An
             requirements = []
             
             for record in result:
-                req_node = record['req']
-                # Convert Neo4j node to dictionary
-                req_dict = dict(req_node)
-                requirements.append(req_dict)
+                requirements.append(record_to_requirement(record))
             
             return requirements
     finally:
@@ -69,7 +95,8 @@ def get_requirements_by_compartment(compartment_label: str) -> List[Dict[str, An
 
 def get_requirements_by_compartment_with_entities(
     compartment_label: str, 
-    entities: List[str]
+    entities: List[str],
+    include_embeddings: bool = False
 ) -> List[Dict[str, Any]]:
     """
     Retrieve requirement nodes that match the compartment label AND contain
@@ -82,6 +109,7 @@ def get_requirements_by_compartment_with_entities(
         compartment_label: The compartment/category label to filter by
         entities: List of entity names to match against
                  (e.g., ['Appraisal Report', 'Tax Returns', 'W-2'])
+        include_embeddings: If True, keep the 'embedding'/'vector' properties
     
     Returns:
         List of requirement nodes that match both compartment and have at least
@@ -103,11 +131,11 @@ def get_requirements_by_compartment_with_entities(
             ...
         ]
     """
-    query = """
+    query = f"""
     MATCH (req:Requirement)
     WHERE req.compartment = $compartment_label
     AND ANY(entity IN $entities WHERE entity IN req.suggested_data_elements)
-    RETURN req
+    RETURN {requirement_return_clause(include_embeddings)}
     """
     
     driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
@@ -121,9 +149,7 @@ def get_requirements_by_compartment_with_entities(
             requirements = []
             
             for record in result:
-                req_node = record['req']
-                req_dict = dict(req_node)
-                requirements.append(req_dict)
+                requirements.append(record_to_requirement(record))
             
             return requirements
     finally:
@@ -132,7 +158,8 @@ def get_requirements_by_compartment_with_entities(
 
 def filter_requirements(
     compartment_label: str,
-    entities: Optional[List[str]] = None
+    entities: Optional[List[str]] = None,
+    include_embeddings: bool = False
 ) -> List[Dict[str, Any]]:
     """
     Main filtering function. Retrieves requirements by compartment label,
@@ -143,6 +170,7 @@ def filter_requirements(
     Args:
         compartment_label: The compartment/category label (from Step 1)
         entities: Optional list of entity names to filter by
+        include_embeddings: If True, keep the 'embedding'/'vector' properties
         
     Returns:
         List of matching requirement nodes
@@ -158,15 +186,20 @@ def filter_requirements(
         ... )
     """
     if entities:
-        return get_requirements_by_compartment_with_entities(compartment_label, entities)
+        return get_requirements_by_compartment_with_entities(
+            compartment_label, entities, include_embeddings=include_embeddings
+        )
     else:
-        return get_requirements_by_compartment(compartment_label)
+        return get_requirements_by_compartment(
+            compartment_label, include_embeddings=include_embeddings
+        )
 
 
 def filter_requirements_multiple_compartments(
     compartment_labels: List[str],
     entities: Optional[List[str]] = None,
-    deduplicate: bool = True
+    deduplicate: bool = True,
+    include_embeddings: bool = False
 ) -> List[Dict[str, Any]]:
     """
     Filter requirements across MULTIPLE compartments.
@@ -178,6 +211,7 @@ def filter_requirements_multiple_compartments(
         compartment_labels: List of compartment labels (from Step 1)
         entities: Optional list of entity names to filter by
         deduplicate: If True, removes duplicate requirements (default: True)
+        include_embeddings: If True, keep the 'embedding'/'vector' properties
         
     Returns:
         List of all matching requirement nodes across all compartments
@@ -199,13 +233,14 @@ def filter_requirements_multiple_compartments(
     seen_ids = set()
     
     for compartment in compartment_labels:
-        requirements = filter_requirements(compartment, entities=entities)
+        requirements = filter_requirements(
+            compartment, entities=entities, include_embeddings=include_embeddings
+        )
         
         if deduplicate:
-            # Add only unique requirements (based on ID or properties)
+            # Add only unique requirements (based on Neo4j element ID)
             for req in requirements:
-                # Use a unique identifier (adjust based on your node properties)
-                req_id = req.get('id') or str(req)
+                req_id = req['_element_id']
                 
                 if req_id not in seen_ids:
                     seen_ids.add(req_id)
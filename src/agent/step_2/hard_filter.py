@@ -8,14 +8,16 @@ Process:
 3. Return requirements that match BOTH (intersection)
 """
 
+import concurrent.futures
 import os
-from neo4j import GraphDatabase
+import time
+from typing import Any, Dict, List
+
 from dotenv import load_dotenv
-from typing import List, Dict, Any, Optional
+from neo4j import GraphDatabase
 from openai import OpenAI
-from functools import lru_cache
-import concurrent.futures
-import time
+from openai_rate_limit import create_embeddings
+from ttl_cache import copy_requirements, ttl_cache
 
 # Load environment variables
 load_dotenv()
@@ -113,7 +115,7 @@ def get_requirements_by_compartment(
             
             # Print summary of programs found
             if program_counts:
-                print(f"\n  Requirements by Program:")
+                print("\n  Requirements by Program:")
                 for prog, count in sorted(program_counts.items(), key=lambda x: x[1], reverse=True):
                     print(f"    • {prog}: {count} requirement(s)")
             
@@ -146,7 +148,8 @@ def get_entity_embedding(entity_text: str, use_cache: bool = True, model: str =
     if use_cache and cache_key in _embedding_cache:
         return _embedding_cache[cache_key]
     
-    response = openai_client.embeddings.create(
+    response = create_embeddings(
+        openai_client,
         input=entity_text,
         model=model
     )
@@ -194,7 +197,8 @@ def get_entity_embeddings_batch(entities: List[str], model: str = "text-embeddin
     # Batch embed uncached entities
     if uncached_entities:
         try:
-            response = openai_client.embeddings.create(
+            response = create_embeddings(
+                openai_client,
                 input=uncached_entities,
                 model=model
             )
@@ -355,7 +359,7 @@ def get_requirements_by_semantic_search(
                         reqs = future.result()
                         count = 0
                         for req_dict in reqs:
-                            req_id = req_dict.get('id') or str(req_dict)
+                            req_id = req_dict['_element_id']
                             if req_id not in seen_req_ids:
                                 seen_req_ids.add(req_id)
                                 all_requirements.append(req_dict)
@@ -376,7 +380,7 @@ def get_requirements_by_semantic_search(
                     )
                     count = 0
                     for req_dict in reqs:
-                        req_id = req_dict.get('id') or str(req_dict)
+                        req_id = req_dict['_element_id']
                         if req_id not in seen_req_ids:
                             seen_req_ids.add(req_id)
                             all_requirements.append(req_dict)
@@ -388,6 +392,7 @@ def get_requirements_by_semantic_search(
         driver.close()
 
 
+@ttl_cache(maxsize=256, ttl=600, copier=copy_requirements)
 def hard_filter(
     compartments: List[str],
     entities: List[str],
@@ -422,6 +427,8 @@ def hard_filter(
     Returns:
         List of requirement nodes that match BOTH compartment AND entities.
         If no intersection, returns all compartment-matched requirements.
+        Results are cached per argument set for 10 minutes (see ttl_cache.py);
+        call hard_filter.cache_clear() to force a fresh query.
         
     Example:
         >>> # Basic usage
@@ -449,7 +456,7 @@ def hard_filter(
         print("\n" + "="*70)
         print("STEP 2: HARD FILTER")
         print("="*70)
-        print(f"\nInput:")
+        print("\nInput:")
         print(f"  Compartments: {compartments}")
         print(f"  Entities: {entities}")
         if loan_program:
@@ -471,7 +478,7 @@ def hard_filter(
         
         # Show sample requirements with their programs
         if reqs_by_compartment and len(reqs_by_compartment) > 0:
-            print(f"\n  Sample Requirements (showing up to 3):")
+            print("\n  Sample Requirements (showing up to 3):")
             for i, req in enumerate(reqs_by_compartment[:3], 1):
                 req_name = req.get('name') or req.get('title') or req.get('id', 'N/A')
                 programs = req.get('_programs', ['Unknown'])
@@ -509,19 +516,18 @@ def hard_filter(
         print('─'*70)
     
     # Create set of IDs from compartment results
-    compartment_ids = {req.get('id') or str(req) for req in reqs_by_compartment}
+    compartment_ids = {req['_element_id'] for req in reqs_by_compartment}
     
     # Keep only entity results that are also in compartment results
     final_requirements = []
     for req in reqs_by_entities:
-        req_id = req.get('id') or str(req)
-        if req_id in compartment_ids:
+        if req['_element_id'] in compartment_ids:
             final_requirements.append(req)
     
     # Fallback: If no intersection, return all compartment results
     if len(final_requirements) == 0:
         if verbose:
-            print(f"⚠️  No requirements matched BOTH conditions")
+            print("⚠️  No requirements matched BOTH conditions")
             print(f"📋 Fallback: Returning all {len(reqs_by_compartment)} requirement(s) from Path A (compartment)")
         final_requirements = reqs_by_compartment
     else:
@@ -555,7 +561,7 @@ if __name__ == "__main__":
         
         # Show results
         if requirements:
-            print(f"\nSample Result (first requirement):")
+            print("\nSample Result (first requirement):")
             req = requirements[0]
             for key, value in req.items():
                 if key not in ['embedding', 'vector']:
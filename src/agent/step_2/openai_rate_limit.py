@@ -0,0 +1,86 @@
+"""
+Rate-limit aware wrapper for OpenAI embedding calls.
+Keeps concurrent Step 2 embedding requests under the account's requests-per-minute
+ceiling and retries 429s with jittered exponential backoff (honoring Retry-After).
+
+Configure the ceiling with OPENAI_MAX_RPM (default 3500).
+"""
+
+import os
+import random
+import threading
+import time
+from typing import Optional
+
+from openai import RateLimitError
+
+OPENAI_MAX_RPM = int(os.getenv('OPENAI_MAX_RPM', '3500'))
+
+# Retry settings for 429 responses
+MAX_ATTEMPTS = 5
+INITIAL_WAIT = 1.0
+MAX_WAIT = 30.0
+
+
+class RateLimiter:
+    """
+    Thread-safe token bucket: at most `max_rate` acquisitions per `time_period` seconds.
+    Starts full, so short bursts go through immediately.
+    """
+
+    def __init__(self, max_rate: float, time_period: float = 60.0):
+        self.max_rate = max_rate
+        self.fill_rate = max_rate / time_period
+        self._tokens = max_rate
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Block until a request slot is available."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.max_rate, self._tokens + (now - self._last) * self.fill_rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.fill_rate
+            time.sleep(wait)
+
+
+# Shared by every embedding call in the process
+_limiter = RateLimiter(max_rate=OPENAI_MAX_RPM, time_period=60)
+
+
+def _retry_after_seconds(error: RateLimitError) -> Optional[float]:
+    """Read the Retry-After header from a 429 response, if present."""
+    response = getattr(error, 'response', None)
+    if response is None:
+        return None
+    value = response.headers.get('retry-after')
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def create_embeddings(client, **kwargs):
+    """
+    Call client.embeddings.create(**kwargs) under the shared rate limiter.
+
+    Retries RateLimitError up to MAX_ATTEMPTS times, waiting for Retry-After
+    when the server sends it and exponential backoff with jitter otherwise.
+    Other errors are raised immediately.
+    """
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        _limiter.acquire()
+        try:
+            return client.embeddings.create(**kwargs)
+        except RateLimitError as e:
+            if attempt == MAX_ATTEMPTS:
+                raise
+            wait = _retry_after_seconds(e)
+            if wait is None:
+                wait = min(MAX_WAIT, INITIAL_WAIT * 2 ** (attempt - 1)) + random.uniform(0, INITIAL_WAIT)
+            time.sleep(wait)
@@ -4,11 +4,37 @@ Uses vector similarity search to find nodes related to entities,
 then retrieves their connected Requirement nodes.
 """
 
+import logging
 import os
-from neo4j import GraphDatabase
+import sys
+import time
+from itertools import chain, islice
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
 from dotenv import load_dotenv
-from typing import List, Dict, Any, Optional
+from filter_requirements_by_compartment import (
+    record_to_requirement,
+    requirement_return_clause,
+)
+from neo4j import GraphDatabase
 from openai import OpenAI
+from openai_rate_limit import create_embeddings
+from ttl_cache import copy_requirements, ttl_cache
+
+try:
+    import simsimd  # Optional: SIMD cosine kernels for the local search path
+except ImportError:
+    simsimd = None
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))  # src/agent: shared pipeline modules
+from pipeline_logging import configure_step_logger
+
+logger = logging.getLogger(__name__)
+
+# Section separator for progress output (built once)
+_BANNER = '─' * 70
 
 # Load environment variables
 load_dotenv()
@@ -22,6 +48,24 @@ NEO4J_PASSWORD = os.getenv('NEO4J_PASSWORD')
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
 openai_client = OpenAI(api_key=OPENAI_API_KEY) if OPENAI_API_KEY else None
 
+# Local copy of every node embedding, L2-normalized then int8-quantized
+# (loaded once, see _load_embedding_matrix)
+_embedding_matrix: Optional[np.ndarray] = None
+_embedding_scales: Optional[np.ndarray] = None
+_embedding_ids: List[str] = []
+_embedding_node_count: Optional[int] = None
+_embedding_checked_at = 0.0
+
+# Seconds between node-count checks for a stale embedding matrix
+_EMBEDDING_CHECK_TTL = 300
+
+# Candidates per entity re-scored with the fp32 query after the int8 pass
+_RERANK_HEAD = 50
+# Rows dequantized at a time in the numpy fallback (bounds temporary memory)
+_QUANT_CHUNK_ROWS = 4096
+# Whether the simsimd -> numpy fallback has been logged (logged once per process)
+_simsimd_fallback_logged = False
+
 
 def get_entity_embedding(entity_text: str) -> List[float]:
     """
@@ -36,35 +80,137 @@ def get_entity_embedding(entity_text: str) -> List[float]:
     if not openai_client:
         raise ValueError("OpenAI API key not configured")
     
-    response = openai_client.embeddings.create(
+    response = create_embeddings(
+        openai_client,
         input=entity_text,
         model="text-embedding-3-large"
     )
     return response.data[0].embedding
 
 
-def semantic_search_nodes_by_entity(
-    entity_text: str,
-    top_k: int = 10,
-    similarity_threshold: float = 0.7
-) -> List[Dict[str, Any]]:
+def _count_nodes(session) -> int:
+    """Total node count (served from the Neo4j count store, no scan)."""
+    return session.run("MATCH (n) RETURN count(n) AS c").single()['c']
+
+
+def _quantize_int8(matrix: np.ndarray):
     """
-    Perform semantic search to find nodes similar to the entity.
+    Scalar-quantize each row to int8 with its own scale.
     
-    Uses vector similarity search in Neo4j to find the closest nodes
-    based on embedding similarity.
+    Returns:
+        (int8 matrix, float32 per-row scales) such that row ≈ q_row * scale
+    """
+    scales = np.abs(matrix).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    quantized = np.clip(np.round(matrix / scales[:, None]), -127, 127).astype(np.int8)
+    return quantized, scales.astype(np.float32)
+
+
+def _load_embedding_matrix():
+    """
+    Load all node embeddings into a local int8 matrix, once.
+    
+    Rows are L2-normalized (so cosine similarity becomes a dot product) and
+    then quantized to int8, which keeps a 3072-dim vector at 3 KB instead
+    of 12 KB. The matrix is reloaded when the graph's node count changes;
+    the count is checked at most once every _EMBEDDING_CHECK_TTL seconds.
     
-    Args:
-        entity_text: The entity text to search for
-        top_k: Number of top similar nodes to return
-        similarity_threshold: Minimum similarity score (0-1)
-        
     Returns:
-        List of similar nodes with their similarity scores
+        (int8 (N, D) matrix, float32 (N,) scales), or None if no node has
+        an embedding
+    """
+    global _embedding_matrix, _embedding_scales, _embedding_ids, _embedding_node_count
+    global _embedding_checked_at
+    
+    now = time.monotonic()
+    if _embedding_matrix is not None and now - _embedding_checked_at < _EMBEDDING_CHECK_TTL:
+        return _embedding_matrix, _embedding_scales
+    
+    driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
+    try:
+        with driver.session() as session:
+            node_count = _count_nodes(session)
+            if _embedding_matrix is not None and node_count == _embedding_node_count:
+                _embedding_checked_at = now
+                return _embedding_matrix, _embedding_scales
+            
+            result = session.run("""
+            MATCH (n)
+            WHERE n.embedding IS NOT NULL
+            RETURN elementId(n) AS element_id, n.embedding AS embedding
+            """)
+            ids = []
+            vectors = []
+            for record in result:
+                ids.append(record['element_id'])
+                vectors.append(record['embedding'])
+    finally:
+        driver.close()
+    
+    if not vectors:
+        _embedding_matrix, _embedding_scales = None, None
+        _embedding_ids, _embedding_node_count = [], None
+        return None
+    
+    matrix = np.asarray(vectors, dtype=np.float32)
+    del vectors
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix /= norms
+    quantized, scales = _quantize_int8(matrix)
+    
+    _embedding_matrix, _embedding_scales = quantized, scales
+    _embedding_ids, _embedding_node_count = ids, node_count
+    _embedding_checked_at = now
+    return quantized, scales
+
+
+def _approx_cosine_scores(
+    queries: np.ndarray,
+    matrix_q: np.ndarray,
+    scales: np.ndarray
+) -> np.ndarray:
     """
-    # Get embedding for the entity
-    entity_embedding = get_entity_embedding(entity_text)
+    Approximate cosine similarity of each query against each int8 row.
+    
+    Queries are quantized with their own per-row scale. simsimd scores the
+    int8 inputs directly when installed; otherwise rows are dequantized in
+    chunks and multiplied, then rescaled by s_query * s_row.
     
+    Returns:
+        (E, N) float32 similarity matrix
+    """
+    global _simsimd_fallback_logged
+    queries_q, query_scales = _quantize_int8(queries)
+    
+    if simsimd is not None:
+        try:
+            distances = np.asarray(
+                simsimd.cdist(queries_q, np.ascontiguousarray(matrix_q), metric="cosine"),
+                dtype=np.float32
+            )
+            return 1.0 - distances
+        except (ImportError, TypeError, ValueError) as e:
+            # e.g. a simsimd build without int8 cdist support
+            if not _simsimd_fallback_logged:
+                _simsimd_fallback_logged = True
+                logger.debug("simsimd cdist failed, using the numpy fallback: %s", e)
+    
+    queries_t = queries_q.astype(np.float32).T
+    sims = np.empty((len(queries_q), len(matrix_q)), dtype=np.float32)
+    for start in range(0, len(matrix_q), _QUANT_CHUNK_ROWS):
+        chunk = matrix_q[start:start + _QUANT_CHUNK_ROWS].astype(np.float32)
+        sims[:, start:start + len(chunk)] = (chunk @ queries_t).T
+    sims *= query_scales[:, None] * scales[None, :]
+    return sims
+
+
+def _search_nodes_cypher(
+    entity_embedding: List[float],
+    top_k: int,
+    similarity_threshold: float
+) -> List[Dict[str, Any]]:
+    """Server-side similarity search with gds.similarity.cosine (fallback path)."""
     # Neo4j vector similarity search
     # Note: Assumes nodes have an 'embedding' property
     query = """
@@ -73,7 +219,7 @@ def semantic_search_nodes_by_entity(
     WITH n, 
          gds.similarity.cosine(n.embedding, $entity_embedding) AS similarity
     WHERE similarity >= $threshold
-    RETURN n, similarity
+    RETURN n { .*, embedding: null } AS n, elementId(n) AS element_id, similarity
     ORDER BY similarity DESC
     LIMIT $top_k
     """
@@ -90,7 +236,8 @@ def semantic_search_nodes_by_entity(
             
             nodes = []
             for record in result:
-                node_data = dict(record['n'])
+                node_data = {key: value for key, value in record['n'].items() if value is not None}
+                node_data['_element_id'] = record['element_id']
                 node_data['similarity_score'] = record['similarity']
                 nodes.append(node_data)
             
@@ -99,7 +246,145 @@ def semantic_search_nodes_by_entity(
         driver.close()
 
 
-def get_requirements_from_nodes(node_ids: List[str]) -> List[Dict[str, Any]]:
+def _hydrate_nodes(nodes_per_entity: List[List[Dict[str, Any]]]) -> List[List[Dict[str, Any]]]:
+    """
+    Fill in node properties for local search hits (one query for all entities),
+    so they have the same shape as _search_nodes_cypher results.
+    """
+    element_ids = list({node['_element_id'] for nodes in nodes_per_entity for node in nodes})
+    if not element_ids:
+        return nodes_per_entity
+    
+    driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
+    try:
+        with driver.session() as session:
+            result = session.run("""
+            MATCH (n)
+            WHERE elementId(n) IN $element_ids
+            RETURN n { .*, embedding: null } AS n, elementId(n) AS element_id
+            """, element_ids=element_ids)
+            properties = {
+                record['element_id']: {key: value for key, value in record['n'].items() if value is not None}
+                for record in result
+            }
+    finally:
+        driver.close()
+    
+    return [
+        [{**properties.get(node['_element_id'], {}), **node} for node in nodes]
+        for nodes in nodes_per_entity
+    ]
+
+
+def semantic_search_nodes_by_entities(
+    entity_texts: List[str],
+    top_k: int = 10,
+    similarity_threshold: float = 0.7
+) -> List[List[Dict[str, Any]]]:
+    """
+    Perform semantic search for several entities at once.
+    
+    Scores every entity against the locally cached (int8) node embeddings
+    with a single matrix product (Q @ R.T) instead of one Neo4j round-trip
+    per entity, then re-scores the best candidates. Falls back to the gds.similarity.cosine query if the matrix
+    cannot be loaded.
+    
+    Args:
+        entity_texts: The entity texts to search for
+        top_k: Number of top similar nodes to return per entity
+        similarity_threshold: Minimum similarity score (0-1)
+        
+    Returns:
+        One list of similar nodes per entity (same order as entity_texts).
+        Each node has its properties (except 'embedding') plus '_element_id'
+        and 'similarity_score', whichever search path ran.
+    """
+    if not entity_texts:
+        return []
+    
+    entity_embeddings = [get_entity_embedding(text) for text in entity_texts]
+    
+    try:
+        loaded = _load_embedding_matrix()
+    except Exception as e:
+        logger.warning("    ⚠️  Could not load embedding matrix, using Cypher search: %s", e)
+        loaded = None
+    
+    if loaded is None:
+        return [
+            _search_nodes_cypher(emb, top_k, similarity_threshold)
+            for emb in entity_embeddings
+        ]
+    
+    matrix_q, scales = loaded
+    n_rows = len(matrix_q)
+    
+    queries = np.asarray(entity_embeddings, dtype=np.float32)
+    query_norms = np.linalg.norm(queries, axis=1, keepdims=True)
+    query_norms[query_norms == 0] = 1.0
+    queries /= query_norms
+    
+    # Coarse pass over the int8 matrix
+    approx = _approx_cosine_scores(queries, matrix_q, scales)  # (E, N)
+    
+    head = min(max(top_k, _RERANK_HEAD), n_rows)
+    if head < n_rows:
+        head_idx = np.argpartition(-approx, head, axis=1)[:, :head]
+    else:
+        head_idx = np.broadcast_to(np.arange(n_rows), (len(queries), head))
+    
+    all_nodes = []
+    for row, idx in enumerate(head_idx):
+        # Re-score the head with the fp32 query against the dequantized rows
+        candidates = matrix_q[idx].astype(np.float32) * scales[idx][:, None]
+        scores = candidates @ queries[row]
+        order = np.argsort(-scores)[:top_k]
+        nodes = []
+        for i in order:
+            score = float(scores[i])
+            if score < similarity_threshold:
+                break
+            nodes.append({
+                '_element_id': _embedding_ids[idx[i]],
+                'similarity_score': score
+            })
+        all_nodes.append(nodes)
+    
+    return _hydrate_nodes(all_nodes)
+
+
+def semantic_search_nodes_by_entity(
+    entity_text: str,
+    top_k: int = 10,
+    similarity_threshold: float = 0.7
+) -> List[Dict[str, Any]]:
+    """
+    Perform semantic search to find nodes similar to the entity.
+    
+    Uses the locally cached node embeddings (see
+    semantic_search_nodes_by_entities) to find the closest nodes
+    based on embedding similarity.
+    
+    Args:
+        entity_text: The entity text to search for
+        top_k: Number of top similar nodes to return
+        similarity_threshold: Minimum similarity score (0-1)
+        
+    Returns:
+        List of similar nodes with their similarity scores
+    """
+    return semantic_search_nodes_by_entities(
+        [entity_text],
+        top_k=top_k,
+        similarity_threshold=similarity_threshold
+    )[0]
+
+
+def get_requirements_from_nodes(
+    node_ids: List[str],
+    limit: Optional[int] = None,
+    include_embeddings: bool = False
+) -> List[Dict[str, Any]]:
     """
     Get Requirement nodes that are connected to the given nodes.
     
@@ -108,26 +393,30 @@ def get_requirements_from_nodes(node_ids: List[str]) -> List[Dict[str, Any]]:
     
     Args:
         node_ids: List of node IDs to find requirements for
+        limit: Optional maximum number of requirements to return
+        include_embeddings: If True, keep the 'embedding'/'vector' properties
         
     Returns:
         List of unique Requirement nodes
     """
-    query = """
+    query = f"""
     MATCH (n)
     WHERE elementId(n) IN $node_ids
     MATCH (n)-[*1..2]-(req:Requirement)
-    RETURN DISTINCT req
+    WITH DISTINCT req
+    RETURN {requirement_return_clause(include_embeddings)}
     """
+    if limit is not None:
+        query += "LIMIT $limit\n"
     
     driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
     try:
         with driver.session() as session:
-            result = session.run(query, node_ids=node_ids)
+            result = session.run(query, node_ids=node_ids, limit=limit)
             
             requirements = []
             for record in result:
-                req_node = record['req']
-                requirements.append(dict(req_node))
+                requirements.append(record_to_requirement(record))
             
             return requirements
     finally:
@@ -137,7 +426,8 @@ def get_requirements_from_nodes(node_ids: List[str]) -> List[Dict[str, Any]]:
 def get_requirements_by_entity_semantic_search(
     entities: List[str],
     top_k_per_entity: int = 5,
-    similarity_threshold: float = 0.7
+    similarity_threshold: float = 0.7,
+    include_embeddings: bool = False
 ) -> List[Dict[str, Any]]:
     """
     Find Requirement nodes via semantic search of entities.
@@ -152,52 +442,95 @@ def get_requirements_by_entity_semantic_search(
         entities: List of entity texts from the input document
         top_k_per_entity: How many similar nodes to find per entity
         similarity_threshold: Minimum similarity score
+        include_embeddings: If True, keep the 'embedding'/'vector' properties
         
     Returns:
         List of unique Requirement nodes found via entity similarity
     """
-    all_requirements = []
-    seen_req_ids = set()
+    return list(iter_requirements_by_entity_semantic_search(
+        entities,
+        top_k_per_entity=top_k_per_entity,
+        similarity_threshold=similarity_threshold,
+        include_embeddings=include_embeddings
+    ))
+
+
+def iter_requirements_by_entity_semantic_search(
+    entities: List[str],
+    top_k_per_entity: int = 5,
+    similarity_threshold: float = 0.7,
+    include_embeddings: bool = False
+) -> Iterator[Dict[str, Any]]:
+    """
+    Lazy version of get_requirements_by_entity_semantic_search.
     
-    for entity in entities:
-        print(f"  Searching for entity: '{entity}'...")
+    Requirements are yielded as they are found, so a caller that only needs
+    the first few stops before the remaining entities are traversed.
+    
+    Args:
+        entities: List of entity texts from the input document
+        top_k_per_entity: How many similar nodes to find per entity
+        similarity_threshold: Minimum similarity score
+        include_embeddings: If True, keep the 'embedding'/'vector' properties
         
-        # Find similar nodes
-        similar_nodes = semantic_search_nodes_by_entity(
-            entity,
-            top_k=top_k_per_entity,
-            similarity_threshold=similarity_threshold
-        )
+    Yields:
+        Unique Requirement nodes found via entity similarity
+    """
+    seen_req_ids = set()
+    
+    # Score all entities against the node embeddings in one pass
+    similar_nodes_per_entity = semantic_search_nodes_by_entities(
+        entities,
+        top_k=top_k_per_entity,
+        similarity_threshold=similarity_threshold
+    )
+    
+    debug = logger.isEnabledFor(logging.DEBUG)
+    
+    for entity, similar_nodes in zip(entities, similar_nodes_per_entity):
+        if debug:
+            logger.debug("  Searching for entity: '%s'...", entity)
         
         if not similar_nodes:
-            print(f"    No similar nodes found")
+            if debug:
+                logger.debug("    No similar nodes found")
             continue
         
-        print(f"    Found {len(similar_nodes)} similar nodes")
+        if debug:
+            logger.debug("    Found %d similar nodes", len(similar_nodes))
         
-        # Get node IDs
-        node_ids = [node.get('id') or str(node) for node in similar_nodes]
+        # Get Neo4j element IDs (set by both the local and the Cypher search)
+        node_ids = []
+        for node in similar_nodes:
+            if '_element_id' not in node:
+                raise KeyError(f"Similar node for '{entity}' has no '_element_id'")
+            node_ids.append(node['_element_id'])
         
         # Get connected Requirement nodes
-        requirements = get_requirements_from_nodes(node_ids)
+        requirements = get_requirements_from_nodes(
+            node_ids, include_embeddings=include_embeddings
+        )
         
-        print(f"    → {len(requirements)} requirement(s) found")
+        if debug:
+            logger.debug("    → %d requirement(s) found", len(requirements))
         
         # Add unique requirements
         for req in requirements:
-            req_id = req.get('id') or str(req)
+            req_id = req['_element_id']
             if req_id not in seen_req_ids:
                 seen_req_ids.add(req_id)
-                all_requirements.append(req)
-    
-    return all_requirements
+                yield req
 
 
+@ttl_cache(maxsize=256, ttl=600, copier=copy_requirements)
 def filter_requirements_combined(
     compartment_labels: List[str],
     entities: Optional[List[str]] = None,
     use_semantic_search: bool = True,
-    combine_method: str = 'intersection'
+    combine_method: str = 'intersection',
+    limit: Optional[int] = None,
+    include_embeddings: bool = False,
+    verbose: bool = True
 ) -> List[Dict[str, Any]]:
     """
     Combined filtering: Compartment matching + Entity semantic search.
@@ -211,6 +544,11 @@ def filter_requirements_combined(
         entities: List of entity texts from input document
         use_semantic_search: If True, use embeddings; if False, use keyword match
         combine_method: 'intersection' (AND) or 'union' (OR)
+        limit: Optional maximum number of requirements to return. Entity
+               searches stop as soon as enough matches are found.
+        include_embeddings: If True, keep the 'embedding'/'vector' properties
+                            (needed by the Step 3 ranker)
+        verbose: If True, log progress (DEBUG level); otherwise warnings only
         
     Returns:
         List of Requirement nodes based on combine_method
@@ -223,51 +561,60 @@ def filter_requirements_combined(
         ...     combine_method='intersection'
         ... )
     """
-    from filter_requirements_by_compartment import filter_requirements_multiple_compartments
+    from filter_requirements_by_compartment import (
+        filter_requirements_multiple_compartments,
+    )
     
-    print(f"\n{'─'*70}")
-    print("Combined Filtering (Compartment + Entity Semantic Search)")
-    print('─'*70)
+    configure_step_logger(logger, verbose, verbose_level=logging.DEBUG)
+    
+    logger.info("\n%s", _BANNER)
+    logger.info("Combined Filtering (Compartment + Entity Semantic Search)")
+    logger.info(_BANNER)
     
     # Path A: Get requirements by compartment
-    print("\nPath A: Filtering by compartment labels...")
-    print(f"Compartments: {compartment_labels}")
-    reqs_by_compartment = filter_requirements_multiple_compartments(compartment_labels)
-    print(f"✓ Found {len(reqs_by_compartment)} requirement(s) by compartment")
+    logger.info("\nPath A: Filtering by compartment labels...")
+    logger.info("Compartments: %s", compartment_labels)
+    reqs_by_compartment = filter_requirements_multiple_compartments(
+        compartment_labels, include_embeddings=include_embeddings
+    )
+    logger.info("✓ Found %d requirement(s) by compartment", len(reqs_by_compartment))
     
     # If no entities provided, return compartment results only
     if not entities:
-        return reqs_by_compartment
+        return reqs_by_compartment[:limit]
     
     # Path B: Get requirements by entity semantic search
-    print("\nPath B: Filtering by entity semantic search...")
-    print(f"Entities: {entities}")
+    logger.info("\nPath B: Filtering by entity semantic search...")
+    logger.info("Entities: %s", entities)
     
     if use_semantic_search:
-        reqs_by_entities = get_requirements_by_entity_semantic_search(entities)
-        print(f"✓ Found {len(reqs_by_entities)} requirement(s) by semantic search")
+        # Consumed lazily below, so the search stops once `limit` is reached
+        reqs_by_entities = iter_requirements_by_entity_semantic_search(
+            entities, include_embeddings=include_embeddings
+        )
     else:
         # Fallback to keyword matching
         reqs_by_entities = filter_requirements_multiple_compartments(
             compartment_labels,
-            entities=entities
+            entities=entities,
+            include_embeddings=include_embeddings
         )
-        print(f"✓ Found {len(reqs_by_entities)} requirement(s) by keyword match")
+        logger.info("✓ Found %d requirement(s) by keyword match", len(reqs_by_entities))
     
     # Combine results
-    print(f"\nCombining results using '{combine_method}' method...")
+    logger.info("\nCombining results using '%s' method...", combine_method)
     
     if combine_method == 'intersection':
         # Requirements must be in BOTH sets (AND logic)
-        reqs_comp_ids = {req.get('id') or str(req) for req in reqs_by_compartment}
+        reqs_comp_ids = {req['_element_id'] for req in reqs_by_compartment}
         
-        combined = []
-        for req in reqs_by_entities:
-            req_id = req.get('id') or str(req)
-            if req_id in reqs_comp_ids:
-                combined.append(req)
+        combined = list(islice(
+            (req for req in reqs_by_entities
+             if req['_element_id'] in reqs_comp_ids),
+            limit
+        ))
         
-        print(f"✓ {len(combined)} requirement(s) match BOTH compartment AND entities")
+        logger.info("✓ %d requirement(s) match BOTH compartment AND entities", len(combined))
         return combined
     
     else:  # union
@@ -275,13 +622,15 @@ def filter_requirements_combined(
         seen_ids = set()
         combined = []
         
-        for req in reqs_by_compartment + reqs_by_entities:
-            req_id = req.get('id') or str(req)
+        for req in chain(reqs_by_compartment, reqs_by_entities):
+            if limit is not None and len(combined) >= limit:
+                break
+            req_id = req['_element_id']
             if req_id not in seen_ids:
                 seen_ids.add(req_id)
                 combined.append(req)
         
-        print(f"✓ {len(combined)} unique requirement(s) match compartment OR entities")
+        logger.info("✓ %d unique requirement(s) match compartment OR entities", len(combined))
         return combined
 
 
@@ -295,7 +644,7 @@ if __name__ == "__main__":
     compartments = ["Loan & Property Information"]
     entities = ["Appraisal Report", "Property Valuation"]
     
-    print(f"\nInput:")
+    print("\nInput:")
     print(f"  Compartments: {compartments}")
     print(f"  Entities: {entities}")
     
@@ -4,6 +4,7 @@ Enter a compartment label and get the requirement nodes that match.
 """
 
 import sys
+from itertools import islice
 from pathlib import Path
 
 # Add step_2 directory to path
@@ -11,7 +12,7 @@ sys.path.insert(0, str(Path(__file__).parent))
 
 from filter_requirements_by_compartment import (
     filter_requirements,
-    filter_requirements_multiple_compartments
+    filter_requirements_multiple_compartments,
 )
 
 
@@ -71,7 +72,7 @@ def main():
                 print(f"✅ Found {len(requirements)} requirement(s)\n")
                 
                 # Display first 5 requirements
-                for i, req in enumerate(requirements[:5], 1):
+                for i, req in enumerate(islice(requirements, 5), 1):
                     print(f"Requirement {i}:")
                     
                     # Display important fields
@@ -106,7 +107,7 @@ def main():
                         
                         print(f"✅ Found {len(filtered_reqs)} requirement(s) matching entities\n")
                         
-                        for i, req in enumerate(filtered_reqs[:3], 1):
+                        for i, req in enumerate(islice(filtered_reqs, 3), 1):
                             print(f"Requirement {i}:")
                             for key, value in req.items():
                                 if key in ['embedding', 'vector']:
@@ -4,6 +4,7 @@ Interactive testing for compartment + semantic entity filtering.
 """
 
 import sys
+from itertools import islice
 from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).parent))
@@ -72,7 +73,7 @@ def main():
                 print("─" * 70)
                 
                 # Show first 3
-                for i, req in enumerate(requirements[:3], 1):
+                for i, req in enumerate(islice(requirements, 3), 1):
                     print(f"\nRequirement {i}:")
                     for key, value in req.items():
                         if key in ['embedding', 'vector']:
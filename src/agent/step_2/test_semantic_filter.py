@@ -3,6 +3,7 @@ Test script for semantic entity filtering in Step 2.
 """
 
 import sys
+from itertools import islice
 from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).parent))
@@ -58,7 +59,7 @@ def main():
         print("=" * 70)
         
         # Display results
-        for i, req in enumerate(requirements[:5], 1):
+        for i, req in enumerate(islice(requirements, 5), 1):
             print(f"\nRequirement {i}:")
             for key, value in req.items():
                 if key in ['embedding', 'vector']:
@@ -0,0 +1,102 @@
+"""
+Small in-process TTL cache for Step 2 filter results.
+Repeated pipeline runs with the same inputs (e.g. re-running a scenario)
+return instantly instead of re-querying Neo4j and OpenAI.
+
+Set PIPELINE_CACHE_CLEAR=1 to start with caching turned off
+(every call goes to the database).
+"""
+
+import inspect
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from typing import Any, Callable, Iterable, Optional
+
+# Caches are per-process; this switch disables them for the whole run
+CACHE_DISABLED = os.getenv('PIPELINE_CACHE_CLEAR') == '1'
+
+
+def _freeze(value: Any) -> Any:
+    """Turn lists/dicts/sets into hashable equivalents for use in a cache key."""
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, set):
+        return frozenset(_freeze(v) for v in value)
+    return value
+
+
+def copy_requirements(requirements):
+    """Shallow-copy each requirement dict so callers can mutate the result safely."""
+    return [dict(req) for req in requirements]
+
+
+def ttl_cache(
+    maxsize: int = 256,
+    ttl: float = 600,
+    ignore: Iterable[str] = ('verbose',),
+    copier: Optional[Callable[[Any], Any]] = None
+):
+    """
+    Memoize a function by its arguments for `ttl` seconds.
+
+    Arguments are bound to the function's signature (defaults filled in)
+    before keying, so f(x), f(x, 10) and f(a=x) share one entry when 10 is
+    the default. List arguments are converted to tuples for the key, so
+    calls like hard_filter(["A"], ["x"]) can be cached.
+
+    Args:
+        maxsize: Maximum number of cached results (least recently used evicted first)
+        ttl: Seconds a cached result stays valid
+        ignore: Arguments that don't affect the result (left out of the key)
+        copier: Optional function applied to the cached value before returning it
+
+    Returns:
+        Decorator. The wrapped function gets a cache_clear() method.
+    """
+    ignored = frozenset(ignore)
+
+    def decorator(func):
+        cache: OrderedDict[Any, tuple] = OrderedDict()
+        lock = threading.Lock()
+        signature = inspect.signature(func)
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if CACHE_DISABLED:
+                return func(*args, **kwargs)
+
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            key = _freeze({k: v for k, v in bound.arguments.items() if k not in ignored})
+            now = time.monotonic()
+
+            with lock:
+                hit = cache.get(key)
+                if hit is not None and now - hit[0] < ttl:
+                    cache.move_to_end(key)
+                    value = hit[1]
+                    return copier(value) if copier else value
+
+            value = func(*args, **kwargs)
+
+            with lock:
+                cache[key] = (now, value)
+                cache.move_to_end(key)
+                while len(cache) > maxsize:
+                    cache.popitem(last=False)
+
+            return copier(value) if copier else value
+
+        def cache_clear():
+            with lock:
+                cache.clear()
+
+        wrapper.cache_clear = cache_clear
+        return wrapper
+
+    return decorator
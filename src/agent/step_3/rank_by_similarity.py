@@ -4,12 +4,35 @@ Ranks filtered requirements from Step 2 based on semantic similarity to input en
 Also retrieves all connected nodes (conditions, dependencies, etc.) for each requirement.
 """
 
+import asyncio
+import atexit
+import hashlib
+import heapq
+import logging
+import math
 import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
 import numpy as np
-from openai import OpenAI
-from neo4j import GraphDatabase
 from dotenv import load_dotenv
-from typing import List, Dict, Any
+from neo4j import GraphDatabase
+from openai import OpenAI
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))  # src/agent: shared pipeline modules
+from pipeline_logging import configure_step_logger
+
+logger = logging.getLogger(__name__)
+
+# Progress output separators (built once)
+_HEADER = '=' * 70
+_BANNER = '─' * 70
+
 
 # Load environment variables
 load_dotenv()
@@ -23,6 +46,60 @@ NEO4J_URI = os.getenv('NEO4J_URI', 'bolt://localhost:7687')
 NEO4J_USER = os.getenv('NEO4J_USER', 'neo4j')
 NEO4J_PASSWORD = os.getenv('NEO4J_PASSWORD')
 
+# One driver (and connection pool) for the whole process, created on first use
+_DRIVER = None
+_driver_lock = threading.Lock()
+
+
+def _get_driver():
+    """Return the shared Neo4j driver, creating and verifying it once."""
+    global _DRIVER
+    if _DRIVER is None:
+        with _driver_lock:
+            if _DRIVER is None:
+                driver = GraphDatabase.driver(
+                    NEO4J_URI,
+                    auth=(NEO4J_USER, NEO4J_PASSWORD),
+                    max_connection_pool_size=50
+                )
+                driver.verify_connectivity()
+                _DRIVER = driver
+    return _DRIVER
+
+
+atexit.register(lambda: _DRIVER and _DRIVER.close())
+
+EMBEDDING_MODEL = "text-embedding-3-large"  # Must match Neo4j requirement embeddings for proper similarity
+
+# Persistent entity-embedding cache (survives restarts, keyed by model + text)
+EMB_CACHE_DIR = os.getenv('EMB_CACHE_DIR', '.emb_cache')
+_emb_cache_conn = None
+_emb_cache_lock = threading.Lock()
+
+
+def _get_emb_cache():
+    """Open the on-disk embedding cache on first use (None if unavailable)."""
+    global _emb_cache_conn
+    if _emb_cache_conn is None:
+        try:
+            os.makedirs(EMB_CACHE_DIR, exist_ok=True)
+            conn = sqlite3.connect(
+                os.path.join(EMB_CACHE_DIR, 'embeddings.sqlite'),
+                check_same_thread=False
+            )
+            conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vec BLOB)")
+            conn.commit()
+            _emb_cache_conn = conn
+            atexit.register(conn.close)
+        except (OSError, sqlite3.Error) as e:
+            logger.warning("  ⚠️  Embedding cache disabled: %s", e)
+            _emb_cache_conn = False
+    return _emb_cache_conn or None
+
+
+def _emb_cache_key(text: str, model: str = EMBEDDING_MODEL) -> str:
+    return hashlib.sha256(f"{model}|{text}".encode()).hexdigest()
+
 
 def get_entity_embedding(entity_text: str) -> List[float]:
     """
@@ -44,90 +121,232 @@ def get_entity_embedding(entity_text: str) -> List[float]:
     return response.data[0].embedding
 
 
-def get_connected_nodes(requirement_id: str, max_conditions: int = 20) -> Dict[str, List[Dict[str, Any]]]:
+def get_entity_embeddings(entities: List[str]) -> List[List[float]]:
     """
-    Retrieve connected nodes from Neo4j (optimized for speed).
+    Generate embeddings for several entities in a single OpenAI request.
+    
+    Embeddings are cached on disk (EMB_CACHE_DIR, default ".emb_cache") so
+    repeated entities across runs cost no API calls; only misses are sent.
     
     Args:
-        requirement_id: The ID of the requirement node
-        max_conditions: Maximum number of conditions to fetch per requirement (default: 20)
+        entities: Entity texts to embed
         
     Returns:
-        Dictionary with node types as keys and lists of nodes as values
-        Example: {
-            'conditions': [{...}, {...}],
-            'dependencies': [{...}],
-            'other_nodes': [{...}]
-        }
+        Embedding vectors in the same order as entities
     """
-    # Optimized query: limit conditions fetched and exclude embeddings for speed
-    query = """
-    MATCH (req:Requirement)
-    WHERE elementId(req) = $req_id 
-       OR req.id = $req_id 
-       OR req._id = $req_id
-       OR req.name = $req_id
+    if not entities:
+        return []
     
-    // Get connected conditions (limited for speed)
-    OPTIONAL MATCH (req)-[r1]-(cond:Condition)
-    WITH req, collect({node: cond, rel_type: type(r1), labels: labels(cond)})[0..$max_conditions] as conditions
+    keys = [_emb_cache_key(text) for text in entities]
+    results: Dict[str, List[float]] = {}
     
-    // Get other connected nodes (dependencies, etc.)
-    OPTIONAL MATCH (req)-[r2]-(other)
-    WHERE other IS NOT NULL AND NOT 'Condition' IN labels(other)
+    cache = _get_emb_cache()
+    if cache is not None:
+        with _emb_cache_lock:
+            placeholders = ",".join("?" * len(set(keys)))
+            rows = cache.execute(
+                f"SELECT key, vec FROM embeddings WHERE key IN ({placeholders})",
+                list(set(keys))
+            ).fetchall()
+        for key, blob in rows:
+            results[key] = np.frombuffer(blob, dtype=np.float32).tolist()
     
-    RETURN 
-        conditions,
-        collect({node: other, rel_type: type(r2), labels: labels(other)}) as other_nodes
+    # Embed the misses in one request (each distinct text once)
+    misses = list(dict.fromkeys(text for text, key in zip(entities, keys) if key not in results))
+    if misses:
+        if not openai_client:
+            raise ValueError("OpenAI API key not configured")
+        
+        response = openai_client.embeddings.create(
+            input=misses,
+            model=EMBEDDING_MODEL
+        )
+        new_rows = []
+        for text, d in zip(misses, sorted(response.data, key=lambda d: d.index)):
+            key = _emb_cache_key(text)
+            results[key] = d.embedding
+            new_rows.append((key, np.asarray(d.embedding, dtype=np.float32).tobytes()))
+        
+        if cache is not None:
+            with _emb_cache_lock:
+                cache.executemany("INSERT OR REPLACE INTO embeddings (key, vec) VALUES (?, ?)", new_rows)
+                cache.commit()
+    
+    return [results[key] for key in keys]
+
+
+# Node label -> connected_nodes bucket, in priority order; unlisted labels go to 'other_nodes'
+LABEL_TO_BUCKET = {
+    'Condition': 'conditions',
+    'Dependency': 'dependencies',
+    'Dependencies': 'dependencies',
+    'Requirement': 'related_requirements',
+}
+
+
+# Connected-node properties returned by default (what Steps 4-5 and the examples read);
+# pass detailed=True to get every property except the embedding
+CONNECTED_NODE_FIELDS = ('id', 'name', 'title', 'Title', 'description', 'Description', 'type')
+
+
+def _connected_projection(var: str, detailed: bool) -> str:
+    """Cypher map projection for a connected node variable."""
+    if detailed:
+        return f"{var} {{.*, embedding: null}}"
+    return f"{var} {{{', '.join('.' + field for field in CONNECTED_NODE_FIELDS)}}}"
+
+
+def _empty_connected_nodes() -> Dict[str, List[Dict[str, Any]]]:
+    """Return an empty connected-nodes structure."""
+    return {
+        'conditions': [],
+        'dependencies': [],
+        'related_requirements': [],
+        'other_nodes': []
+    }
+
+
+def _categorize_connected_nodes(record) -> Dict[str, List[Dict[str, Any]]]:
+    """Sort a record's 'conditions' and 'other_nodes' into node-type buckets."""
+    connected_nodes = _empty_connected_nodes()
+    
+    # Process conditions (already limited in query)
+    for item in record['conditions'] or []:
+        if item and item.get('node') is not None:
+            # Drop properties projected as null (absent fields, embedding)
+            node = {key: value for key, value in item['node'].items() if value is not None}
+            connected_nodes['conditions'].append(node)
+    
+    # Process other nodes
+    for item in record['other_nodes'] or []:
+        if not item or item.get('node') is None:
+            continue
+            
+        # Drop properties projected as null (absent fields, embedding)
+        node = {key: value for key, value in item['node'].items() if value is not None}
+        labels = item['labels']
+        
+        # Categorize by label (first match in LABEL_TO_BUCKET order wins)
+        bucket = next(
+            (bucket for label, bucket in LABEL_TO_BUCKET.items() if label in labels),
+            'other_nodes'
+        )
+        connected_nodes[bucket].append(node)
+    
+    return connected_nodes
+
+
+# How a requirement is matched for each kind of ID; each form can use an index
+# (elementId lookups go straight to the node store; the property indexes are
+# created by setup_requirement_indexes.py)
+REQUIREMENT_MATCH_BY_KIND = {
+    'element': "MATCH (req:Requirement) WHERE elementId(req) = rid",
+    'id': "MATCH (req:Requirement {id: rid})",
+    '_id': "MATCH (req:Requirement {_id: rid})",
+    'name': "MATCH (req:Requirement {name: rid})",
+}
+
+
+def get_connected_nodes_batch(
+    requirement_ids: List[str],
+    max_conditions: int = 20,
+    detailed: bool = False,
+    id_kinds: Optional[List[str]] = None
+) -> Dict[str, Dict[str, List[Dict[str, Any]]]]:
     """
+    Retrieve connected nodes for many requirements in one Neo4j round-trip per ID kind.
     
-    driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
+    Args:
+        requirement_ids: IDs of the requirement nodes
+        max_conditions: Maximum number of conditions to fetch per requirement (default: 20)
+        detailed: If True, return every node property (except embedding) instead
+                  of just CONNECTED_NODE_FIELDS
+        id_kinds: What each ID is, parallel to requirement_ids: 'element'
+                  (Neo4j element ID), 'id', '_id' or 'name'.
+                  Default: all element IDs (what Step 2 provides)
+        
+    Returns:
+        Dictionary mapping each requirement ID to its connected nodes
+        (same structure as get_connected_nodes). IDs with no matching
+        requirement map to empty lists.
+    """
+    if id_kinds is None:
+        id_kinds = ['element'] * len(requirement_ids)
     
-    try:
-        with driver.session() as session:
-            result = session.run(query, req_id=requirement_id, max_conditions=max_conditions)
-            record = result.single()
+    connected_by_id = {req_id: _empty_connected_nodes() for req_id in requirement_ids}
+    if not requirement_ids:
+        return connected_by_id
+    
+    # One query per kind of ID, each matching through a single indexed predicate
+    ids_by_kind: Dict[str, List[str]] = {}
+    for req_id, kind in zip(requirement_ids, id_kinds):
+        if req_id is None:
+            continue  # Requirement without any ID: nothing to look up
+        if kind not in REQUIREMENT_MATCH_BY_KIND:
+            raise ValueError(f"Unknown requirement ID kind: {kind!r}")
+        ids_by_kind.setdefault(kind, []).append(req_id)
+    
+    with _get_driver().session() as session:
+        for kind, ids in ids_by_kind.items():
+            # UNWIND runs the per-requirement lookup server-side for the whole batch
+            query = f"""
+            UNWIND $req_ids AS rid
+            {REQUIREMENT_MATCH_BY_KIND[kind]}
             
-            connected_nodes = {
-                'conditions': [],
-                'dependencies': [],
-                'related_requirements': [],
-                'other_nodes': []
-            }
+            // Get connected conditions (limited for speed, only projected fields transferred)
+            OPTIONAL MATCH (req)-[r1]-(cond:Condition)
+            WITH rid, req, collect({{node: {_connected_projection('cond', detailed)}, rel_type: type(r1), labels: labels(cond)}})[0..$max_conditions] as conditions
             
-            if not record:
-                return connected_nodes
+            // Get other connected nodes (dependencies, etc.)
+            OPTIONAL MATCH (req)-[r2]-(other)
+            WHERE other IS NOT NULL AND NOT 'Condition' IN labels(other)
             
-            # Process conditions (already limited in query)
-            for item in record['conditions'] or []:
-                if item and item.get('node'):
-                    node = dict(item['node'])
-                    # Remove embedding to reduce data size
-                    node.pop('embedding', None)
-                    connected_nodes['conditions'].append(node)
+            RETURN 
+                rid,
+                conditions,
+                collect({{node: {_connected_projection('other', detailed)}, rel_type: type(r2), labels: labels(other)}}) as other_nodes
+            """
             
-            # Process other nodes
-            for item in record['other_nodes'] or []:
-                if not item or not item.get('node'):
+            result = session.run(query, req_ids=ids, max_conditions=max_conditions)
+            seen = set()
+            for record in result:
+                rid = record['rid']
+                # Keep the first match per ID (same as result.single() before)
+                if rid in seen:
                     continue
-                    
-                node = dict(item['node'])
-                labels = item['labels']
-                
-                # Remove embedding to reduce data size
-                node.pop('embedding', None)
-                
-                # Categorize by label
-                if 'Dependency' in labels or 'Dependencies' in labels:
-                    connected_nodes['dependencies'].append(node)
-                elif 'Requirement' in labels:
-                    connected_nodes['related_requirements'].append(node)
-                else:
-                    connected_nodes['other_nodes'].append(node)
-            
-            return connected_nodes
-    finally:
-        driver.close()
+                seen.add(rid)
+                connected_by_id[rid] = _categorize_connected_nodes(record)
+    
+    return connected_by_id
+
+
+def get_connected_nodes(
+    requirement_id: str,
+    max_conditions: int = 20,
+    detailed: bool = False,
+    id_kind: str = 'element'
+) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Retrieve connected nodes from Neo4j (optimized for speed).
+    
+    Args:
+        requirement_id: The ID of the requirement node
+        max_conditions: Maximum number of conditions to fetch per requirement (default: 20)
+        detailed: If True, return every node property (except embedding)
+        id_kind: What requirement_id is: 'element' (Neo4j element ID, default),
+                 'id', '_id' or 'name'
+        
+    Returns:
+        Dictionary with node types as keys and lists of nodes as values
+        Example: {
+            'conditions': [{...}, {...}],
+            'dependencies': [{...}],
+            'other_nodes': [{...}]
+        }
+    """
+    return get_connected_nodes_batch(
+        [requirement_id], max_conditions=max_conditions, detailed=detailed, id_kinds=[id_kind]
+    )[requirement_id]
 
 
 def cosine_similarity(vec1: List[float], vec2: List[float]) -> float:
@@ -140,22 +359,24 @@ def cosine_similarity(vec1: List[float], vec2: List[float]) -> float:
         
     Returns:
         Similarity score between 0 and 1 (1 = identical, 0 = completely different)
+    
+    Note:
+        Used for single pairs only; rank_requirements_by_similarity scores
+        everything at once with a matrix product on pre-normalized vectors.
     """
-    vec1_np = np.array(vec1)
-    vec2_np = np.array(vec2)
+    a = np.asarray(vec1, dtype=np.float32)
+    b = np.asarray(vec2, dtype=np.float32)
     
-    # Calculate cosine similarity
-    dot_product = np.dot(vec1_np, vec2_np)
-    norm1 = np.linalg.norm(vec1_np)
-    norm2 = np.linalg.norm(vec2_np)
+    # Three dot products instead of dot + two norms (one sqrt total)
+    dot_product = float(a @ b)
+    norm_sq1 = float(a @ a)
+    norm_sq2 = float(b @ b)
     
-    if norm1 == 0 or norm2 == 0:
+    if norm_sq1 == 0 or norm_sq2 == 0:
         return 0.0
     
-    similarity = dot_product / (norm1 * norm2)
-    
     # Ensure result is between 0 and 1
-    return float(max(0.0, min(1.0, similarity)))
+    return max(0.0, min(1.0, dot_product / math.sqrt(norm_sq1 * norm_sq2)))
 
 
 def calculate_requirement_similarity(
@@ -178,7 +399,7 @@ def calculate_requirement_similarity(
     """
     req_embedding = requirement.get('embedding')
     
-    if not req_embedding:
+    if req_embedding is None or len(req_embedding) == 0:
         return 0.0
     
     # Calculate similarity to each entity
@@ -198,13 +419,474 @@ def calculate_requirement_similarity(
         return max(similarities) if similarities else 0.0
 
 
+# Stored requirement matrices kept in EMB_CACHE_DIR (newest first), and their max age
+REQ_MATRIX_CACHE_MAX = int(os.getenv('REQ_MATRIX_CACHE_MAX', '32'))
+REQ_MATRIX_CACHE_MAX_AGE = float(os.getenv('REQ_MATRIX_CACHE_MAX_AGE', str(7 * 24 * 3600)))
+_REQ_MATRIX_NAME = re.compile(r'requirements_[0-9a-f]{16}\.npy')
+
+
+def _requirement_matrix_path(
+    requirements: List[Dict[str, Any]],
+    fingerprints: Optional[List[Optional[bytes]]] = None
+) -> str:
+    """
+    Location of the stored matrix for a set of requirements.
+    
+    The name hashes each requirement ID together with its embedding
+    fingerprint, so an edited embedding gets a new file instead of the
+    stale one.
+    """
+    if fingerprints is None:
+        fingerprints = [_embedding_fingerprint(req) for req in requirements]
+    fingerprint_by_id = {}
+    for req, fingerprint in zip(requirements, fingerprints):
+        req_id = _requirement_id(req)
+        # First embedding per ID wins, as in build_requirement_matrix
+        if req_id is not None and fingerprint_by_id.get(req_id) is None:
+            fingerprint_by_id[req_id] = fingerprint
+    digest = hashlib.sha256()
+    for req_id in sorted(fingerprint_by_id):
+        digest.update(req_id.encode())
+        digest.update(b"\0" + (fingerprint_by_id[req_id] or b"") + b"\n")
+    return os.path.join(EMB_CACHE_DIR, f"requirements_{digest.hexdigest()[:16]}.npy")
+
+
+def _prune_requirement_matrices(keep: str) -> None:
+    """
+    Delete stored matrices older than REQ_MATRIX_CACHE_MAX_AGE and all but
+    the REQ_MATRIX_CACHE_MAX most recently used (by mtime); `keep` is never deleted.
+    """
+    try:
+        names = [name for name in os.listdir(EMB_CACHE_DIR) if _REQ_MATRIX_NAME.fullmatch(name)]
+    except OSError:
+        return
+    mtimes = []
+    for name in names:
+        path = os.path.join(EMB_CACHE_DIR, name)
+        try:
+            mtimes.append((os.path.getmtime(path), path))
+        except OSError:
+            continue  # Removed by another process meanwhile
+    mtimes.sort(reverse=True)
+    
+    now = time.time()
+    for rank, (mtime, path) in enumerate(mtimes):
+        if os.path.abspath(path) == os.path.abspath(keep):
+            continue
+        if rank >= REQ_MATRIX_CACHE_MAX or now - mtime > REQ_MATRIX_CACHE_MAX_AGE:
+            # The fp32 file goes first so a half-deleted set never looks complete
+            for stale in (path, *_int8_paths(path)):
+                try:
+                    os.remove(stale)
+                except OSError:
+                    pass
+
+
+def quantize_int8(matrix: np.ndarray):
+    """
+    Symmetric per-row int8 quantization.
+    
+    Returns:
+        (Q, scales) with matrix ≈ Q * scales[:, None]
+    """
+    scales = np.max(np.abs(matrix), axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    q = np.round(matrix / scales[:, None]).astype(np.int8)
+    return q, scales.astype(np.float32)
+
+
+def _int8_paths(path: str):
+    """Paths of the int8 copy and its row scales stored next to a requirement matrix."""
+    base = path[:-len('.npy')]
+    return f"{base}_int8.npy", f"{base}_scales.npy"
+
+
+def _save_npy_atomic(path: str, array: np.ndarray) -> None:
+    tmp_path = f"{path}.{os.getpid()}.tmp.npy"
+    np.save(tmp_path, array)
+    os.replace(tmp_path, path)  # Atomic, so readers never see a partial file
+
+
+def build_requirement_matrix(requirements: List[Dict[str, Any]], path: str = None) -> str:
+    """
+    Write the L2-normalized requirement embeddings to a float32 .npy file.
+    
+    Rows follow the sorted requirement IDs; requirements without an
+    embedding get a zero row (similarity 0). The file is keyed by a hash of
+    the IDs and their embeddings, so a different requirement set (or a
+    re-embedded requirement) gets a different file. An int8 copy (plus
+    per-row scales) is written alongside for coarse ranking.
+    
+    Args:
+        requirements: Requirement nodes with 'embedding' properties
+        path: Output path (default: derived from the requirement IDs)
+        
+    Returns:
+        Path of the written .npy file
+    """
+    embedding_by_id = {}
+    for req in requirements:
+        req_id = _requirement_id(req)
+        emb = req.get('embedding')
+        if req_id is not None and emb is not None and len(emb) > 0:
+            embedding_by_id.setdefault(req_id, emb)
+    
+    if not embedding_by_id:
+        raise ValueError("No requirement embeddings to store")
+    
+    ids = sorted({_requirement_id(req) for req in requirements if _requirement_id(req) is not None})
+    dim = len(next(iter(embedding_by_id.values())))
+    matrix = np.zeros((len(ids), dim), dtype=np.float32)
+    for row, req_id in enumerate(ids):
+        if req_id in embedding_by_id:
+            matrix[row] = np.asarray(embedding_by_id[req_id], dtype=np.float32)
+    
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix /= norms
+    
+    path = path or _requirement_matrix_path(requirements)
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    q_path, scales_path = _int8_paths(path)
+    q, scales = quantize_int8(matrix)
+    _save_npy_atomic(q_path, q)
+    _save_npy_atomic(scales_path, scales)
+    # Written last: its presence means the whole set is complete
+    _save_npy_atomic(path, matrix)
+    return path
+
+
+def _stored_matrix_rows(
+    requirements: List[Dict[str, Any]],
+    fingerprints: Optional[List[Optional[bytes]]] = None
+):
+    """
+    Locate the stored matrix for these requirements, building it on first use.
+    
+    Building a new matrix also prunes old ones (see _prune_requirement_matrices);
+    reusing one refreshes its mtime.
+    
+    Returns:
+        (path, rows) where rows[i] is the matrix row of requirements[i],
+        or None if the requirements can't be stored (missing IDs or embeddings,
+        unwritable cache directory).
+    """
+    req_ids = [_requirement_id(req) for req in requirements]
+    if any(req_id is None for req_id in req_ids):
+        return None
+    try:
+        path = _requirement_matrix_path(requirements, fingerprints)
+        if os.path.exists(path):
+            os.utime(path)
+        else:
+            build_requirement_matrix(requirements, path)
+            _prune_requirement_matrices(keep=path)
+    except (OSError, ValueError) as e:
+        logger.warning("  ⚠️  Requirement matrix cache unavailable: %s", e)
+        return None
+    row_of = {req_id: row for row, req_id in enumerate(sorted(set(req_ids)))}
+    return path, np.array([row_of[req_id] for req_id in req_ids], dtype=np.int64)
+
+
+def _requirement_matrix(
+    requirements: List[Dict[str, Any]],
+    dim: int,
+    fingerprints: Optional[List[Optional[bytes]]] = None
+):
+    """
+    Get normalized requirement embeddings as a float32 matrix.
+    
+    Uses the memory-mapped .npy for this requirement set (building it on
+    first use); falls back to copying the embeddings in memory.
+    
+    Returns:
+        (M, idx_map): M has one row per entry of idx_map, which holds the
+        positions in `requirements` being scored. (None, []) if nothing to score.
+    """
+    stored = _stored_matrix_rows(requirements, fingerprints)
+    if stored is not None:
+        path, rows = stored
+        try:
+            matrix = np.load(path, mmap_mode='r')
+            if matrix.shape[1] == dim:
+                # Pages are read on demand; only the needed rows are copied
+                return matrix[rows], list(range(len(requirements)))
+        except (OSError, ValueError) as e:
+            logger.warning("  ⚠️  Requirement matrix cache unavailable: %s", e)
+    
+    # Copy requirement embeddings once into a contiguous float32 matrix
+    # (half the memory/bandwidth of Python float lists); idx_map holds the
+    # positions in `requirements` of the rows actually filled
+    idx_map = [
+        i for i, req in enumerate(requirements)
+        if req.get('embedding') is not None and len(req['embedding']) > 0
+    ]
+    if not idx_map:
+        return None, []
+    
+    M = np.empty((len(idx_map), dim), dtype=np.float32)
+    for row, i in enumerate(idx_map):
+        M[row] = np.asarray(requirements[i]['embedding'], dtype=np.float32)
+    M_norms = np.linalg.norm(M, axis=1, keepdims=True)
+    M_norms[M_norms == 0] = 1.0
+    M /= M_norms
+    return M, idx_map
+
+
+def _combine(S: np.ndarray, method: str) -> np.ndarray:
+    """Reduce an (R, E) similarity matrix to one score per requirement."""
+    S = np.clip(S, 0.0, 1.0)  # Clamped to [0, 1] like cosine_similarity()
+    return S.mean(axis=1) if method == 'avg' else S.max(axis=1)
+
+
+def _score_requirements_int8(
+    requirements: List[Dict[str, Any]],
+    E: np.ndarray,
+    method: str,
+    top_n: int,
+    fingerprints: Optional[List[Optional[bytes]]] = None
+) -> Optional[List[int]]:
+    """
+    Coarse int8 ranking over the stored matrix, exact fp32 re-scoring of the head.
+    
+    Only the int8 copy (a quarter of the fp32 bytes) is read for every
+    requirement; fp32 rows are read just for the _int8_candidate_count(top_n)
+    best candidates. Candidates get exact scores, the tail keeps its
+    approximate score.
+    
+    Returns:
+        Positions in `requirements` of the exactly scored candidates,
+        or None if the int8 path couldn't be used
+    """
+    stored = _stored_matrix_rows(requirements, fingerprints)
+    if stored is None:
+        return None
+    path, rows = stored
+    q_path, scales_path = _int8_paths(path)
+    try:
+        Q = np.load(q_path, mmap_mode='r')
+        scales = np.load(scales_path, mmap_mode='r')
+        matrix = np.load(path, mmap_mode='r')
+    except (OSError, ValueError):
+        return None
+    if Q.shape[1] != E.shape[1]:
+        return None
+    
+    Qe, scales_e = quantize_int8(E)
+    # int8 values are exact in float32, so this is the int8 dot product, rescaled
+    approx = (Q[rows].astype(np.float32) @ Qe.T.astype(np.float32)) * scales[rows][:, None] * scales_e[None, :]
+    approx_scores = _combine(approx, method)
+    
+    head = min(_int8_candidate_count(top_n), len(requirements))
+    candidates = np.argpartition(-approx_scores, head - 1)[:head]
+    exact_scores = _combine(matrix[rows[candidates]] @ E.T, method)
+    
+    for req, score in zip(requirements, approx_scores):
+        req['similarity_score'] = float(score)
+    for i, score in zip(candidates, exact_scores):
+        requirements[i]['similarity_score'] = float(score)
+    return candidates.tolist()
+
+
+# Below this many requirements a full fp32 pass is already cheap
+_INT8_PREFILTER_MIN = 1000
+# Extra exactly re-scored candidates beyond top_n, so int8 rounding near the
+# cut-off can't push a true top-n requirement out of the candidate set
+INT8_CANDIDATE_MARGIN = 64
+
+
+def _int8_candidate_count(top_n: int) -> int:
+    """How many int8 candidates get exact fp32 scores for a given top_n."""
+    return max(3 * top_n, top_n + INT8_CANDIDATE_MARGIN)
+
+
+def _score_requirements(
+    requirements: List[Dict[str, Any]],
+    entity_embeddings: List[List[float]],
+    method: str = 'max',
+    top_n: int = None,
+    fingerprints: Optional[List[Optional[bytes]]] = None
+) -> Optional[List[int]]:
+    """
+    Set 'similarity_score' on every requirement (0.0 when it has no embedding).
+    
+    With a small top_n over a large requirement set, an int8 coarse pass
+    picks _int8_candidate_count(top_n) candidates that are then scored
+    exactly. `fingerprints` (from _embedding_fingerprint) saves re-hashing
+    the embeddings.
+    
+    Returns:
+        None if every score is exact; otherwise the positions of the exactly
+        scored candidates (the rest keep approximate int8 scores), which is
+        what _select_top must pick the top_n from
+    """
+    # All (requirement x entity) cosine similarities as one matrix product:
+    # after L2-normalizing both sides, cosine similarity is just the dot product
+    E = np.asarray(entity_embeddings, dtype=np.float32)
+    E_norms = np.linalg.norm(E, axis=1, keepdims=True)
+    E_norms[E_norms == 0] = 1.0
+    E /= E_norms
+    
+    if (top_n and len(requirements) >= _INT8_PREFILTER_MIN
+            and _int8_candidate_count(top_n) < len(requirements)):
+        candidates = _score_requirements_int8(requirements, E, method, top_n, fingerprints)
+        if candidates is not None:
+            return candidates
+    
+    for req in requirements:
+        req['similarity_score'] = 0.0
+    
+    M, idx_map = _requirement_matrix(requirements, E.shape[1], fingerprints)
+    if M is None:
+        return None
+    
+    # Shape (R, E)
+    scores = _combine(M @ E.T, method)
+    
+    for i, score in zip(idx_map, scores):
+        requirements[i]['similarity_score'] = float(score)
+    return None
+
+
+def _requirement_key(req: Dict[str, Any]) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Pick the ID used to look a requirement up in Neo4j, and what kind of ID it is.
+    
+    Returns:
+        (id_kind, req_id), e.g. ('element', '4:abc:12'); (None, None) if there is no ID
+    """
+    # Use Neo4j element ID (from Step 2) - this is the internal Neo4j ID
+    for field, kind in (('_element_id', 'element'),  # Primary: Neo4j element ID
+                        ('id', 'id'),
+                        ('_id', '_id'),
+                        ('elementId', 'element'),
+                        ('name', 'name')):  # Fallback to name if no ID
+        if req.get(field):
+            return kind, req[field]
+    return None, None
+
+
+def _requirement_id(req: Dict[str, Any]) -> Optional[str]:
+    """Pick the ID used to look a requirement up in Neo4j."""
+    return _requirement_key(req)[1]
+
+
+def _similarity_score(req: Dict[str, Any]) -> float:
+    return req.get('similarity_score', 0.0)
+
+
+def _select_top(
+    requirements: List[Dict[str, Any]],
+    top_n: int = None,
+    candidates: Optional[List[int]] = None
+) -> List[Dict[str, Any]]:
+    """
+    Return requirements sorted by similarity_score (highest first), cut to top_n.
+    
+    candidates: positions of the exactly scored requirements (from
+    _score_requirements); when given, only those can be selected.
+    """
+    if candidates is not None:
+        requirements = [requirements[i] for i in sorted(candidates)]
+    # A small top N out of many: partial selection beats a full sort
+    if top_n and top_n * 10 < len(requirements):
+        return heapq.nlargest(top_n, requirements, key=_similarity_score)
+    ranked = sorted(requirements, key=_similarity_score, reverse=True)
+    return ranked[:top_n] if top_n else ranked
+
+
+# Similarity scores from earlier calls, keyed by
+# (requirement id, embedding fingerprint, entities, method)
+_SCORE_CACHE: Dict[tuple, float] = {}
+
+
+# Embedding components hashed into a fingerprint (evenly spaced)
+FINGERPRINT_SAMPLES = 32
+
+
+def _embedding_fingerprint(req: Dict[str, Any]) -> Optional[bytes]:
+    """
+    Short digest of a requirement's embedding (None if it has none).
+    
+    Only the length and FINGERPRINT_SAMPLES evenly spaced components are
+    hashed, so fingerprinting a requirement set costs O(N) instead of a pass
+    over every embedding; re-embedding a requirement changes all of its
+    components, so the sample still tells old and new embeddings apart.
+    """
+    emb = req.get('embedding')
+    if emb is None or len(emb) == 0:
+        return None
+    step = max(1, len(emb) // FINGERPRINT_SAMPLES)
+    sample = np.asarray(emb[::step], dtype=np.float32)
+    return hashlib.blake2b(len(emb).to_bytes(4, 'little') + sample.tobytes(), digest_size=16).digest()
+
+
+def _score_cache_key(req: Dict[str, Any], fingerprint: Optional[bytes], entities: List[str], method: str):
+    """
+    Cache key for a requirement's score; includes the embedding fingerprint so
+    a re-embedded requirement is scored again instead of served a stale score.
+    """
+    req_id = _requirement_id(req)
+    return None if req_id is None else (req_id, fingerprint, tuple(entities), method)
+
+
+def _score_cache_keys(
+    requirements: List[Dict[str, Any]],
+    fingerprints: List[Optional[bytes]],
+    entities: List[str],
+    method: str
+) -> List[Optional[tuple]]:
+    """_SCORE_CACHE key of each requirement (computed once per ranking call)."""
+    return [
+        _score_cache_key(req, fingerprint, entities, method)
+        for req, fingerprint in zip(requirements, fingerprints)
+    ]
+
+
+def _apply_cached_scores(
+    requirements: List[Dict[str, Any]],
+    keys: List[Optional[tuple]]
+) -> bool:
+    """
+    Fill 'similarity_score' from _SCORE_CACHE if every requirement is cached.
+    
+    Returns:
+        True if all scores came from the cache (nothing needs computing)
+    """
+    if any(key is None or key not in _SCORE_CACHE for key in keys):
+        return False
+    for req, key in zip(requirements, keys):
+        req['similarity_score'] = _SCORE_CACHE[key]
+    return True
+
+
+def _store_cached_scores(
+    requirements: List[Dict[str, Any]],
+    keys: List[Optional[tuple]]
+) -> None:
+    """Remember freshly computed scores for later calls."""
+    for req, key in zip(requirements, keys):
+        if key is None:
+            continue
+        # Limit cache size to prevent memory issues (simple clear)
+        if len(_SCORE_CACHE) > 10000:
+            _SCORE_CACHE.clear()
+        _SCORE_CACHE[key] = req['similarity_score']
+
+
+def clear_score_cache() -> None:
+    """Forget all cached similarity scores (e.g. between tests)."""
+    _SCORE_CACHE.clear()
+
+
 def rank_requirements_by_similarity(
     requirements: List[Dict[str, Any]],
     entities: List[str],
     top_n: int = None,
     method: str = 'max',
     include_connected_nodes: bool = True,
-    verbose: bool = True
+    verbose: bool = True,
+    detailed_connected_nodes: bool = False
 ) -> List[Dict[str, Any]]:
     """
     Rank requirements by similarity to input entities.
@@ -218,6 +900,8 @@ def rank_requirements_by_similarity(
         method: Similarity combination method ('max' or 'avg')
         include_connected_nodes: If True, fetch all connected nodes for each requirement
         verbose: Print progress
+        detailed_connected_nodes: If True, connected nodes carry every property
+                                  (default: only CONNECTED_NODE_FIELDS)
         
     Returns:
         List of requirements sorted by similarity (highest first),
@@ -241,71 +925,69 @@ def rank_requirements_by_similarity(
         >>> print("Score:", ranked[0]['similarity_score'])
         >>> print("Conditions:", len(ranked[0]['connected_nodes']['conditions']))
     """
-    if verbose:
-        print("\n" + "="*70)
-        print("STEP 3: RANK BY SIMILARITY")
-        print("="*70)
-        print(f"\nInput:")
-        print(f"  Requirements: {len(requirements)}")
-        print(f"  Entities: {entities}")
-        print(f"  Method: {method} (how to combine entity similarities)")
+    configure_step_logger(logger, verbose)
+    
+    logger.info("\n%s", _HEADER)
+    logger.info("STEP 3: RANK BY SIMILARITY")
+    logger.info(_HEADER)
+    logger.info("\nInput:")
+    logger.info("  Requirements: %d", len(requirements))
+    logger.info("  Entities: %s", entities)
+    logger.info("  Method: %s (how to combine entity similarities)", method)
     
     if not requirements:
-        if verbose:
-            print("\n⚠️  No requirements to rank")
+        logger.warning("\n⚠️  No requirements to rank")
         return []
     
-    # Generate embeddings for entities
-    if verbose:
-        print(f"\n{'─'*70}")
-        print("Generating entity embeddings...")
-        print('─'*70)
-    
-    entity_embeddings = []
-    for entity in entities:
+    # Same requirements and entities scored before: skip embedding entirely
+    fingerprints = [_embedding_fingerprint(req) for req in requirements]
+    cache_keys = _score_cache_keys(requirements, fingerprints, entities, method)
+    candidates = None  # Exactly scored positions when the int8 pre-filter ran
+    if _apply_cached_scores(requirements, cache_keys):
+        logger.info("\n✓ Using cached similarity scores")
+    else:
+        # Generate embeddings for entities
+        logger.info("\n%s", _BANNER)
+        logger.info("Generating entity embeddings...")
+        logger.info(_BANNER)
+        
+        entity_embeddings = []
         try:
-            emb = get_entity_embedding(entity)
-            entity_embeddings.append(emb)
-            if verbose:
-                print(f"  ✓ '{entity}' embedded")
+            # One request for all entities
+            entity_embeddings = get_entity_embeddings(entities)
+            logger.info("  ✓ %d entities embedded", len(entity_embeddings))
         except Exception as e:
-            if verbose:
-                print(f"  ⚠️  Failed to embed '{entity}': {e}")
-            continue
-    
-    if not entity_embeddings:
-        if verbose:
-            print("\n⚠️  No entity embeddings generated")
-        return requirements
-    
-    # Calculate similarity scores
-    if verbose:
-        print(f"\n{'─'*70}")
-        print("Calculating similarity scores...")
-        print('─'*70)
-    
-    for req in requirements:
-        similarity = calculate_requirement_similarity(
-            req,
-            entity_embeddings,
-            method=method
-        )
-        req['similarity_score'] = similarity
-    
-    # Sort by similarity (highest first)
-    ranked_requirements = sorted(
-        requirements,
-        key=lambda x: x.get('similarity_score', 0.0),
-        reverse=True
-    )
+            logger.warning("  ⚠️  Batch embedding failed (%s), embedding one at a time", e)
+            # Fallback: per-entity calls so one bad input doesn't drop the rest
+            for entity in entities:
+                try:
+                    emb = get_entity_embedding(entity)
+                    entity_embeddings.append(emb)
+                    logger.info("  ✓ '%s' embedded", entity)
+                except Exception as e:
+                    logger.warning("  ⚠️  Failed to embed '%s': %s", entity, e)
+                    continue
+        
+        if not entity_embeddings:
+            logger.warning("\n⚠️  No entity embeddings generated")
+            return requirements
+        
+        # Calculate similarity scores
+        logger.info("\n%s", _BANNER)
+        logger.info("Calculating similarity scores...")
+        logger.info(_BANNER)
+        
+        candidates = _score_requirements(requirements, entity_embeddings, method, top_n, fingerprints)
+        # Only cache exact scores computed against every entity
+        if candidates is None and len(entity_embeddings) == len(entities):
+            _store_cached_scores(requirements, cache_keys)
     
-    # Limit to top N if specified
-    if top_n:
-        ranked_requirements = ranked_requirements[:top_n]
+    # Sort by similarity (highest first), limited to top N if specified
+    ranked_requirements = _select_top(requirements, top_n, candidates)
     
-    if verbose:
-        print(f"✓ Ranked {len(requirements)} requirements")
-        print(f"\nTop 5 similarity scores:")
+    if logger.isEnabledFor(logging.INFO):
+        logger.info("✓ Ranked %d requirements", len(requirements))
+        logger.info("\nTop 5 similarity scores:")
         for i, req in enumerate(ranked_requirements[:5], 1):
             score = req.get('similarity_score', 0.0)
             # Try different possible field names
@@ -314,60 +996,136 @@ def rank_requirements_by_similarity(
                     req.get('Title') or 
                     req.get('description', '').split('.')[0] or  # First sentence
                     f"Requirement {req.get('id', i)}")
-            print(f"  {i}. {title[:50]:50s} Score: {score:.3f}")
+            logger.info("  %d. %-50s Score: %.3f", i, title[:50], score)
         
         if top_n:
-            print(f"\n✓ Returning top {top_n} requirements")
+            logger.info("\n✓ Returning top %d requirements", top_n)
     
     # Fetch connected nodes for each requirement
     if include_connected_nodes:
-        if verbose:
-            print(f"\n{'─'*70}")
-            print("Fetching connected nodes (conditions, dependencies, etc.)...")
-            print('─'*70)
+        logger.info("\n%s", _BANNER)
+        logger.info("Fetching connected nodes (conditions, dependencies, etc.)...")
+        logger.info(_BANNER)
+        
+        # Only the returned (top N) requirements, never the tail
+        id_kinds, req_ids = zip(*map(_requirement_key, ranked_requirements)) if ranked_requirements else ((), ())
+        
+        # One UNWIND query per ID kind for all ranked requirements
+        try:
+            connected_by_id = get_connected_nodes_batch(
+                list(req_ids), detailed=detailed_connected_nodes, id_kinds=list(id_kinds)
+            )
+        except Exception as e:
+            logger.error("    ❌ Error: %s", e)
+            connected_by_id = {}
         
-        for req in ranked_requirements:
-            # Use Neo4j element ID (from Step 2) - this is the internal Neo4j ID
-            req_id = (req.get('_element_id') or  # Primary: Neo4j element ID
-                     req.get('id') or 
-                     req.get('_id') or 
-                     req.get('elementId') or
-                     req.get('name'))  # Fallback to name if no ID
+        for req, req_id in zip(ranked_requirements, req_ids):
+            connected = connected_by_id.get(req_id) or _empty_connected_nodes()
+            req['connected_nodes'] = connected
             
-            if verbose:
+            if logger.isEnabledFor(logging.INFO):
                 name = req.get('name') or req.get('title') or 'Unknown'
                 id_type = "_element_id" if req.get('_element_id') else "other"
-                print(f"  Fetching nodes for '{name[:40]}' ({id_type}: {str(req_id)[:50]}...)")
-            
-            try:
-                connected = get_connected_nodes(req_id)
-                req['connected_nodes'] = connected
-                
-                if verbose:
-                    total_connected = sum(len(nodes) for nodes in connected.values())
-                    if total_connected > 0:
-                        print(f"    ✓ Found {total_connected} connected node(s)")
-                        for node_type, nodes in connected.items():
-                            if nodes:
-                                print(f"      - {node_type}: {len(nodes)}")
-                    else:
-                        print(f"    ⚠️  No connected nodes found")
-            except Exception as e:
-                if verbose:
-                    print(f"    ❌ Error: {e}")
-                req['connected_nodes'] = {
-                    'conditions': [],
-                    'dependencies': [],
-                    'related_requirements': [],
-                    'other_nodes': []
-                }
-    
-    if verbose:
-        print("\n" + "="*70)
-        print(f"STEP 3 COMPLETE: {len(ranked_requirements)} ranked requirements")
+                logger.info("  Nodes for '%s' (%s: %s...)", name[:40], id_type, str(req_id)[:50])
+                total_connected = sum(len(nodes) for nodes in connected.values())
+                if total_connected > 0:
+                    logger.info("    ✓ Found %d connected node(s)", total_connected)
+                    for node_type, nodes in connected.items():
+                        if nodes:
+                            logger.info("      - %s: %d", node_type, len(nodes))
+                else:
+                    logger.info("    ⚠️  No connected nodes found")
+    
+    if logger.isEnabledFor(logging.INFO):
+        logger.info("\n%s", _HEADER)
+        logger.info("STEP 3 COMPLETE: %d ranked requirements", len(ranked_requirements))
         if include_connected_nodes:
-            print("(with connected nodes included)")
-        print("="*70)
+            logger.info("(with connected nodes included)")
+        logger.info(_HEADER)
+    
+    return ranked_requirements
+
+
+async def rank_requirements_by_similarity_async(
+    requirements: List[Dict[str, Any]],
+    entities: List[str],
+    top_n: int = None,
+    method: str = 'max',
+    include_connected_nodes: bool = True,
+    verbose: bool = False,
+    detailed_connected_nodes: bool = False
+) -> List[Dict[str, Any]]:
+    """
+    Async version of rank_requirements_by_similarity that overlaps I/O.
+    
+    The entity embedding request and the Neo4j connected-node query run
+    concurrently whenever the ranked set is known up front (top_n is None or
+    covers every requirement); otherwise the connected-node query starts as
+    soon as the top N are picked. Blocking clients run in worker threads so
+    the shared driver pool and embedding cache are reused.
+    
+    Args and return value are the same as rank_requirements_by_similarity.
+    """
+    configure_step_logger(logger, verbose)
+    
+    if not requirements:
+        return []
+    
+    fingerprints = [_embedding_fingerprint(req) for req in requirements]
+    cache_keys = _score_cache_keys(requirements, fingerprints, entities, method)
+    scores_cached = _apply_cached_scores(requirements, cache_keys)
+    candidates = None  # Exactly scored positions when the int8 pre-filter ran
+    emb_task = None
+    if not scores_cached:
+        emb_task = asyncio.create_task(asyncio.to_thread(get_entity_embeddings, entities))
+    
+    # Every requirement will be returned, so their connected nodes can be
+    # fetched while the entities are still being embedded
+    prefetch_task = None
+    if include_connected_nodes and (not top_n or top_n >= len(requirements)):
+        id_kinds, req_ids = zip(*map(_requirement_key, requirements))
+        prefetch_task = asyncio.create_task(asyncio.to_thread(
+            get_connected_nodes_batch, list(req_ids),
+            detailed=detailed_connected_nodes, id_kinds=list(id_kinds)
+        ))
+    
+    if emb_task:
+        try:
+            entity_embeddings = await emb_task
+        except Exception as e:
+            logger.warning("  ⚠️  Failed to embed entities: %s", e)
+            entity_embeddings = []
+        
+        if not entity_embeddings:
+            if prefetch_task:
+                prefetch_task.cancel()
+            logger.warning("\n⚠️  No entity embeddings generated")
+            return requirements
+        
+        candidates = _score_requirements(requirements, entity_embeddings, method, top_n, fingerprints)
+        if candidates is None:
+            _store_cached_scores(requirements, cache_keys)
+    
+    ranked_requirements = _select_top(requirements, top_n, candidates)
+    
+    if include_connected_nodes:
+        id_kinds, req_ids = zip(*map(_requirement_key, ranked_requirements)) if ranked_requirements else ((), ())
+        try:
+            if prefetch_task:
+                connected_by_id = await prefetch_task
+            else:
+                connected_by_id = await asyncio.to_thread(
+                    get_connected_nodes_batch, list(req_ids),
+                    detailed=detailed_connected_nodes, id_kinds=list(id_kinds)
+                )
+        except Exception as e:
+            logger.error("    ❌ Error: %s", e)
+            connected_by_id = {}
+        
+        for req, req_id in zip(ranked_requirements, req_ids):
+            req['connected_nodes'] = connected_by_id.get(req_id) or _empty_connected_nodes()
+    
+    logger.info("✓ Ranked %d requirements, returning %d", len(requirements), len(ranked_requirements))
     
     return ranked_requirements
 
@@ -0,0 +1,53 @@
+"""
+Create the Neo4j indexes used by Step 3 requirement lookups.
+
+get_connected_nodes_batch matches requirements by 'id', '_id' or 'name'
+when Step 2 didn't provide an element ID; these property indexes keep those
+lookups from scanning every Requirement node. Run once per database (needs
+a user allowed to create indexes):
+
+    python setup_requirement_indexes.py
+"""
+import os
+import sys
+
+from dotenv import load_dotenv
+from neo4j import GraphDatabase
+
+# (index name, property) for each non-elementId lookup kind in
+# rank_by_similarity.REQUIREMENT_MATCH_BY_KIND
+REQUIREMENT_INDEXES = (
+    ('requirement_id', 'id'),
+    ('requirement_internal_id', '_id'),
+    ('requirement_name', 'name'),
+)
+
+
+def ensure_requirement_indexes(driver) -> None:
+    """Create each Requirement property index if it doesn't exist yet."""
+    with driver.session() as session:
+        for index_name, prop in REQUIREMENT_INDEXES:
+            session.run(
+                f"CREATE INDEX {index_name} IF NOT EXISTS FOR (r:Requirement) ON (r.{prop})"
+            ).consume()
+            print(f"✓ {index_name} on :Requirement({prop})")
+
+
+def main() -> int:
+    load_dotenv()
+    driver = GraphDatabase.driver(
+        os.getenv('NEO4J_URI', 'bolt://localhost:7687'),
+        auth=(os.getenv('NEO4J_USER', 'neo4j'), os.getenv('NEO4J_PASSWORD'))
+    )
+    try:
+        ensure_requirement_indexes(driver)
+    except Exception as e:
+        print(f"✗ Could not create Requirement indexes: {e}")
+        return 1
+    finally:
+        driver.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
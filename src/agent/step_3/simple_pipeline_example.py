@@ -4,43 +4,42 @@ Runs a single scenario showing the full workflow.
 Saves output to JSON file for inspection.
 """
 
-import sys
 import json
+import sys
 from pathlib import Path
-from typing import List
+from typing import Any, Dict, List
+
 import numpy as np
 
+try:
+    import orjson  # Optional: faster single-pass serialization
+except ImportError:
+    orjson = None
+
 # Add paths
 parent_dir = Path(__file__).parent.parent
 sys.path.insert(0, str(parent_dir / "step_1"))
 sys.path.insert(0, str(parent_dir / "step_2"))
 sys.path.insert(0, str(parent_dir / "step_3"))
 
-from retrieve_document_categories import get_document_category
 from hard_filter import hard_filter
 from rank_by_similarity import rank_requirements_by_similarity
+from retrieve_document_categories import get_document_category
 
 
-def convert_to_json_serializable(obj):
-    """Convert numpy arrays and other non-serializable objects to JSON-compatible format."""
+def _json_default(obj):
+    """Serialize the types orjson/json don't handle natively (Neo4j temporals, numpy)."""
     # Handle Neo4j temporal types
     if hasattr(obj, 'iso_format'):  # Neo4j DateTime, Date, Time
         return obj.iso_format()
-    elif hasattr(obj, '__class__') and obj.__class__.__name__ in ['DateTime', 'Date', 'Time', 'Duration']:
+    elif obj.__class__.__name__ in ['DateTime', 'Date', 'Time', 'Duration']:
         return str(obj)
-    # Handle numpy types
+    # Handle numpy types (stdlib json fallback only; orjson serializes them natively)
     elif isinstance(obj, np.ndarray):
         return obj.tolist()
-    elif isinstance(obj, np.integer):
-        return int(obj)
-    elif isinstance(obj, np.floating):
-        return float(obj)
-    elif isinstance(obj, dict):
-        return {key: convert_to_json_serializable(value) for key, value in obj.items()}
-    elif isinstance(obj, list):
-        return [convert_to_json_serializable(item) for item in obj]
-    else:
-        return obj
+    elif isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
 
 
 def run_complete_pipeline(
@@ -148,7 +147,7 @@ def run_complete_pipeline(
         # Display connected nodes
         if 'connected_nodes' in req:
             print(f"\n  {'─'*66}")
-            print(f"  Connected Nodes:")
+            print("  Connected Nodes:")
             print(f"  {'─'*66}")
             
             connected = req['connected_nodes']
@@ -198,22 +197,24 @@ def save_output_to_json(
         'requirements': []
     }
     
-    # Convert requirements to JSON-serializable format
     for req in ranked_requirements:
-        req_clean = {}
-        
-        for key, value in req.items():
-            # Skip embedding (too large) but keep everything else
-            if key in ['embedding', 'vector']:
-                req_clean[key] = f"<{len(value)}-dimensional vector omitted>"
-            else:
-                req_clean[key] = convert_to_json_serializable(value)
-        
-        output_data['requirements'].append(req_clean)
+        # Skip embedding (too large) but keep everything else
+        output_data['requirements'].append({
+            key: (f"<{len(value)}-dimensional vector omitted>"
+                  if key in ['embedding', 'vector'] else value)
+            for key, value in req.items()
+        })
     
-    # Save to JSON
-    with open(output_file, 'w') as f:
-        json.dump(output_data, f, indent=2)
+    # Save to JSON (non-native types handled by _json_default during serialization)
+    if orjson is not None:
+        Path(output_file).write_bytes(orjson.dumps(
+            output_data,
+            default=_json_default,
+            option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY
+        ))
+    else:
+        with open(output_file, 'w') as f:
+            json.dump(output_data, f, indent=2, default=_json_default)
     
     print(f"\n💾 Output saved to: {output_file}")
     print(f"   Total requirements: {len(ranked_requirements)}")
@@ -221,7 +222,7 @@ def save_output_to_json(
     # Show structure summary
     if ranked_requirements:
         sample = ranked_requirements[0]
-        print(f"\n📋 Structure of each requirement:")
+        print("\n📋 Structure of each requirement:")
         print(f"   Main fields: {len(sample)} fields")
         if 'connected_nodes' in sample:
             for node_type, nodes in sample['connected_nodes'].items():
@@ -238,7 +239,7 @@ if __name__ == "__main__":
     document_name = "Contractor Bid"
     document_entities = ["Contractor Bid", "Repair Estimate", "Property Address"]
     
-    print(f"\nScenario: Contractor Document")
+    print("\nScenario: Contractor Document")
     print(f"Document: {document_name}")
     print(f"Entities: {document_entities}")
     
@@ -251,7 +252,7 @@ if __name__ == "__main__":
         )
         
         print(f"\n{'='*70}")
-        print(f"✓ Pipeline completed successfully!")
+        print("✓ Pipeline completed successfully!")
         print(f"✓ Returned {len(results)} ranked requirements")
         print(f"{'='*70}")
         
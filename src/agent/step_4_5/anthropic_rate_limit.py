@@ -0,0 +1,156 @@
+"""
+Retry and rate-limit wrapper for Claude messages.create calls.
+Caps the number of in-flight requests, keeps token usage under a per-minute
+budget, and retries rate-limit / transient errors with jittered exponential
+backoff (honoring Retry-After) instead of failing the whole run.
+
+Configure with ANTHROPIC_MAX_CONCURRENT (default 8) and
+ANTHROPIC_MAX_TPM (input + output tokens per minute, default 400000).
+"""
+
+import asyncio
+import os
+import random
+import threading
+import time
+import weakref
+from collections import deque
+
+from anthropic import APIConnectionError, InternalServerError, RateLimitError
+
+ANTHROPIC_MAX_CONCURRENT = int(os.getenv('ANTHROPIC_MAX_CONCURRENT', '8'))
+ANTHROPIC_MAX_TPM = int(os.getenv('ANTHROPIC_MAX_TPM', '400000'))
+
+# Retry settings (APITimeoutError is a subclass of APIConnectionError)
+MAX_ATTEMPTS = 3
+BASE_WAIT = 1.0
+RETRYABLE_ERRORS = (RateLimitError, APIConnectionError, InternalServerError)
+
+
+class TokenBudget:
+    """
+    Thread-safe sliding-window token counter: new requests wait while the
+    tokens used in the last `window` seconds are at or above `max_tokens`.
+    """
+
+    def __init__(self, max_tokens: int, window: float = 60.0):
+        self.max_tokens = max_tokens
+        self.window = window
+        self._used = deque()  # (timestamp, tokens)
+        self._total = 0
+        self._lock = threading.Lock()
+
+    def wait_time(self) -> float:
+        """Seconds until there is room in the budget (0 if there is room now)."""
+        with self._lock:
+            now = time.monotonic()
+            while self._used and now - self._used[0][0] >= self.window:
+                self._total -= self._used.popleft()[1]
+            if self._total < self.max_tokens or not self._used:
+                return 0.0
+            return self._used[0][0] + self.window - now
+
+    def record(self, tokens: int) -> None:
+        """Count tokens used by a finished request."""
+        with self._lock:
+            self._used.append((time.monotonic(), tokens))
+            self._total += tokens
+
+
+# Shared by every Claude call in the process
+_budget = TokenBudget(max_tokens=ANTHROPIC_MAX_TPM)
+_thread_slots = threading.BoundedSemaphore(ANTHROPIC_MAX_CONCURRENT)
+# asyncio semaphores belong to one event loop, so keep one per loop
+_async_slots: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+
+
+def _get_async_slots() -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    slots = _async_slots.get(loop)
+    if slots is None:
+        slots = _async_slots[loop] = asyncio.Semaphore(ANTHROPIC_MAX_CONCURRENT)
+    return slots
+
+
+def _retry_wait(error: Exception, attempt: int) -> float:
+    """Retry-After from the response if present, else base * 2**attempt + jitter."""
+    response = getattr(error, 'response', None)
+    if response is not None:
+        value = response.headers.get('retry-after')
+        try:
+            if value is not None:
+                return float(value)
+        except ValueError:
+            pass
+    return BASE_WAIT * 2 ** attempt + random.uniform(0, BASE_WAIT)
+
+
+def _usage_tokens(response) -> int:
+    usage = getattr(response, 'usage', None)
+    if usage is None:
+        return 0
+    return (usage.input_tokens or 0) + (usage.output_tokens or 0)
+
+
+def _send(client, kwargs, stream):
+    if not stream:
+        return client.messages.create(**kwargs)
+    with client.messages.stream(**kwargs) as response_stream:
+        return response_stream.get_final_message()
+
+
+async def _send_async(client, kwargs, stream):
+    if not stream:
+        return await client.messages.create(**kwargs)
+    async with client.messages.stream(**kwargs) as response_stream:
+        return await response_stream.get_final_message()
+
+
+def create_message(client, stream=False, **kwargs):
+    """
+    Call client.messages.create(**kwargs) with bounded concurrency, the shared
+    token budget, and up to MAX_ATTEMPTS tries on rate-limit / transient errors.
+    Other errors are raised immediately.
+    
+    With stream=True the message is streamed (client.messages.stream) and the
+    final Message returned. Tokens keep arriving during long generations, so
+    the client's read timeout applies between chunks, not to the whole response.
+    """
+    for attempt in range(MAX_ATTEMPTS):
+        while (wait := _budget.wait_time()) > 0:
+            time.sleep(wait)
+
+        with _thread_slots:
+            try:
+                response = _send(client, kwargs, stream)
+            except RETRYABLE_ERRORS as e:
+                if attempt == MAX_ATTEMPTS - 1:
+                    raise
+                wait = _retry_wait(e, attempt)
+            else:
+                _budget.record(_usage_tokens(response))
+                return response
+
+        # Back off without holding a concurrency slot
+        time.sleep(wait)
+
+
+async def create_message_async(client, stream=False, **kwargs):
+    """Async version of create_message for AsyncAnthropic clients."""
+    slots = _get_async_slots()
+    for attempt in range(MAX_ATTEMPTS):
+        while (wait := _budget.wait_time()) > 0:
+            await asyncio.sleep(wait)
+
+        async with slots:
+            try:
+                response = await _send_async(client, kwargs, stream)
+            except RETRYABLE_ERRORS as e:
+                if attempt == MAX_ATTEMPTS - 1:
+                    raise
+                wait = _retry_wait(e, attempt)
+            else:
+                _budget.record(_usage_tokens(response))
+                return response
+
+        await asyncio.sleep(wait)
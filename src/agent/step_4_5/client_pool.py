@@ -0,0 +1,100 @@
+"""
+Shared Anthropic clients, one per API key.
+Each client owns an httpx connection pool; reusing it keeps connections
+(and TLS sessions) warm across calls instead of reconnecting per detector/check.
+When the `h2` package is installed the pools speak HTTP/2, so concurrent
+requests are multiplexed over one connection.
+
+Sync clients are process-wide. Async clients are shared within one event loop
+only: an async pool's connections belong to the loop that opened them, so a
+client kept past its asyncio.run would fail with "Event loop is closed".
+
+Retries are left to anthropic_rate_limit, so the SDK's own retries are turned off.
+"""
+
+import asyncio
+import atexit
+import threading
+import weakref
+from functools import lru_cache
+from typing import Awaitable, Dict, TypeVar
+
+import httpx
+from anthropic import (
+    Anthropic,
+    AsyncAnthropic,
+    DefaultAsyncHttpxClient,
+    DefaultHttpxClient,
+)
+from anthropic_rate_limit import ANTHROPIC_MAX_CONCURRENT
+
+try:
+    import h2  # noqa: F401  (enables httpx HTTP/2 support)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# Seconds before a single request times out
+REQUEST_TIMEOUT = 60
+# Connection pool size per client: enough for every in-flight request that
+# anthropic_rate_limit allows (with headroom for batch-API polling), so raising
+# ANTHROPIC_MAX_CONCURRENT never leaves requests queued on the pool instead
+POOL_LIMITS = httpx.Limits(
+    max_connections=max(32, 2 * ANTHROPIC_MAX_CONCURRENT),
+    max_keepalive_connections=max(16, ANTHROPIC_MAX_CONCURRENT)
+)
+
+T = TypeVar("T")
+
+# Async clients per event loop (and API key); entries go away with their loop
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, AsyncAnthropic]]" = (
+    weakref.WeakKeyDictionary()
+)
+_async_clients_lock = threading.Lock()
+
+
+@lru_cache(maxsize=4)
+def get_anthropic(api_key: str) -> Anthropic:
+    """Shared sync client for this API key."""
+    http_client = DefaultHttpxClient(http2=HTTP2_AVAILABLE, limits=POOL_LIMITS, timeout=REQUEST_TIMEOUT)
+    atexit.register(http_client.close)
+    return Anthropic(api_key=api_key, max_retries=0, timeout=REQUEST_TIMEOUT, http_client=http_client)
+
+
+def get_async_anthropic(api_key: str) -> AsyncAnthropic:
+    """
+    Async client for this API key, shared within the running event loop.
+    
+    Call from a coroutine. Loops started with run_async close their clients
+    before they end; a long-lived loop keeps its clients for its lifetime.
+    """
+    loop = asyncio.get_running_loop()
+    with _async_clients_lock:
+        clients = _async_clients.setdefault(loop, {})
+        client = clients.get(api_key)
+        if client is None:
+            # A new HTTP/2 pool per loop: its connections can't be used from another loop or thread
+            http_client = DefaultAsyncHttpxClient(http2=HTTP2_AVAILABLE, limits=POOL_LIMITS, timeout=REQUEST_TIMEOUT)
+            client = clients[api_key] = AsyncAnthropic(
+                api_key=api_key, max_retries=0, timeout=REQUEST_TIMEOUT, http_client=http_client
+            )
+    return client
+
+
+async def close_async_anthropic() -> None:
+    """Close the running event loop's async clients."""
+    with _async_clients_lock:
+        clients = _async_clients.pop(asyncio.get_running_loop(), {})
+    for client in clients.values():
+        await client.close()
+
+
+def run_async(main: Awaitable[T]) -> T:
+    """asyncio.run(main), closing the async clients it opened before the loop ends."""
+    async def run() -> T:
+        try:
+            return await main
+        finally:
+            await close_async_anthropic()
+    return asyncio.run(run())
+
@@ -2,12 +2,31 @@
 # - Assumes you already have the candidate "condition templates" (from Steps 1–3).
 # - We only implement: compare doc features vs. condition rules and emit deficiencies.
 
-from typing import Any, Dict, List, Tuple
-from dotenv import load_dotenv
 import json
+import operator
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from env_init import init_env
+
+try:
+    import orjson  # Optional: faster JSON serialization
+except ImportError:
+    orjson = None
 
 CONF_T = 0.6  # confidence threshold to treat a parsed value as usable
-load_dotenv()
+init_env()
+
+def _dumps(obj: Any) -> str:
+    """Pretty-print obj as JSON (orjson when installed, else the stdlib)."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY).decode()
+    return json.dumps(obj, indent=2)
 
 # ---------- Sample input: normalized/ETL doc JSON (what Step 0 would output) ----------
 
@@ -123,19 +142,65 @@ CONDITION_TEMPLATES = [
 
 # ---------- Validator utilities ----------
 
-def _get_nested(d: Dict[str, Any], dotted_key: str) -> Any:
-    """Fetch d['a']['b']['c'] via 'a.b.c', return {} if missing to avoid KeyError."""
+def _split_field(dotted_key: str) -> Tuple[str, ...]:
+    return tuple(dotted_key.split("."))
+
+def _compile_rule(rule: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Copy of a rule with its dotted field pre-split into '_parts' and its
+    comparison resolved into '_op' (so evaluation skips the OPS lookup).
+    """
+    return {**rule, "_parts": _split_field(rule["field"]), "_op": OPS.get(rule["op"], _unknown_op)}
+
+# id(cond) -> (cond, compiled); holding cond keeps its id from being reused.
+# Least recently used templates are dropped beyond COMPILED_CACHE_SIZE, so a
+# long-running server doesn't keep every condition set it has ever seen.
+COMPILED_CACHE_SIZE = 1024
+_COMPILED: "OrderedDict[int, Tuple[Dict[str, Any], Dict[str, Any]]]" = OrderedDict()
+_compiled_lock = threading.Lock()
+
+def _compile_condition(cond: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Pre-split every field path in a condition template (applies_when, checks,
+    exceptions) so evaluation never re-parses 'a.b.c'. Memoized per template.
+    """
+    with _compiled_lock:
+        cached = _COMPILED.get(id(cond))
+        if cached is not None and cached[0] is cond:
+            _COMPILED.move_to_end(id(cond))
+            return cached[1]
+    compiled = {
+        **cond,
+        "_id": cond["condition_id"],
+        "_title": cond.get("title"),
+        "applies_when": [_compile_rule(rule) for rule in cond.get("applies_when", [])],
+        "checks": [_compile_rule(rule) for rule in cond.get("checks", [])],
+        "exceptions": [
+            {**ex, "when": _compile_rule(ex["when"])} for ex in cond.get("exceptions", [])
+        ],
+    }
+    with _compiled_lock:
+        _COMPILED[id(cond)] = (cond, compiled)
+        _COMPILED.move_to_end(id(cond))
+        while len(_COMPILED) > COMPILED_CACHE_SIZE:
+            _COMPILED.popitem(last=False)
+    return compiled
+
+def _get_nested(d: Dict[str, Any], parts: Tuple[str, ...]) -> Any:
+    """Fetch d['a']['b']['c'] via ('a', 'b', 'c'), return None if missing."""
     cur = d
-    for part in dotted_key.split("."):
-        if isinstance(cur, dict) and part in cur:
-            cur = cur[part]
-        else:
-            return {}
+    try:
+        for part in parts:
+            cur = cur.get(part)
+            if cur is None:
+                return None
+    except AttributeError:  # walked into a non-dict leaf
+        return None
     return cur
 
-def _get_value(d: Dict[str, Any], dotted_key: str) -> Tuple[Any, float, Any]:
+def _get_value(d: Dict[str, Any], parts: Tuple[str, ...]) -> Tuple[Any, float, Any]:
     """Return (value, confidence, provenance) from a normalized field or (None, 0.0, None)."""
-    node = _get_nested(d, dotted_key)
+    node = _get_nested(d, parts)
     if isinstance(node, dict) and "value" in node:
         val = node.get("value")
         conf = float(node.get("confidence", 0.0) or 0.0)
@@ -146,78 +211,154 @@ def _get_value(d: Dict[str, Any], dotted_key: str) -> Tuple[Any, float, Any]:
         return node, 1.0, None
     return None, 0.0, None
 
-def _compare(op: str, actual: Any, expected: Any) -> bool:
-    if op == "eq":
-        return actual == expected
-    if op == "neq":
-        return actual != expected
-    if op == "gte":
-        try: return float(actual) >= float(expected)
-        except: return False
-    if op == "lte":
-        try: return float(actual) <= float(expected)
-        except: return False
-    if op == "in":
-        try: return actual in expected
-        except: return False
-    if op == "between":
-        try:
-            lo, hi = expected
-            return float(lo) <= float(actual) <= float(hi)
-        except:
-            return False
+_MISSING = (None, 0.0, None)
+_UNPARSED = object()  # node whose confidence didn't parse; _get_value raises on it
+
+def flatten_doc(doc: Dict[str, Any]) -> Dict[Tuple[str, ...], Tuple[Any, float, Any]]:
+    """
+    Walk doc once and map every field path (as a parts tuple) to what _get_value
+    would return for it, so rules sharing a doc do one dict lookup per field.
+    Paths that aren't in the map are missing: (None, 0.0, None).
+    """
+    flat: Dict[Tuple[str, ...], Tuple[Any, float, Any]] = {}
+    stack = [((), doc)]
+    while stack:
+        prefix, node = stack.pop()
+        for key, child in node.items():
+            parts = prefix + (key,)
+            if isinstance(child, dict):
+                if "value" in child:
+                    try:
+                        flat[parts] = _get_value(child, ())
+                    except (TypeError, ValueError):
+                        flat[parts] = _UNPARSED
+                stack.append((parts, child))
+            elif child is not None and isinstance(child, (bool, int, float, str)):
+                flat[parts] = (child, 1.0, None)
+    return flat
+
+def _value_getter(
+    doc: Dict[str, Any],
+    flat: Optional[Dict[Tuple[str, ...], Tuple[Any, float, Any]]]
+) -> Callable[[Tuple[str, ...]], Tuple[Any, float, Any]]:
+    """Field lookup for one doc: flatten_doc map when given, else a dict walk."""
+    if flat is None:
+        return lambda parts: _get_value(doc, parts)
+
+    def get(parts: Tuple[str, ...]) -> Tuple[Any, float, Any]:
+        hit = flat.get(parts, _MISSING)
+        return _get_value(doc, parts) if hit is _UNPARSED else hit
+    return get
+
+def _num_cmp(cmp: Callable[[float, float], bool]) -> Callable[[Any, Any], bool]:
+    return lambda actual, expected: cmp(float(actual), float(expected))
+
+def _between(actual: Any, expected: Any) -> bool:
+    lo, hi = expected
+    return float(lo) <= float(actual) <= float(hi)
+
+# op name -> comparison; unknown ops compare False
+OPS: Dict[str, Callable[[Any, Any], bool]] = {
+    "eq": operator.eq,
+    "neq": operator.ne,
+    "gte": _num_cmp(operator.ge),
+    "lte": _num_cmp(operator.le),
+    "in": lambda actual, expected: actual in expected,
+    "between": _between,
+}
+
+def _unknown_op(actual: Any, expected: Any) -> bool:
     return False
 
-def _applies_when(doc: Dict[str, Any], cond: Dict[str, Any]) -> bool:
+def _compare(op: str, actual: Any, expected: Any) -> bool:
+    try:
+        return OPS.get(op, _unknown_op)(actual, expected)
+    except Exception:
+        return False
+
+def _rule_holds(rule: Dict[str, Any], actual: Any) -> bool:
+    """_compare for a compiled rule, using its pre-resolved '_op'."""
+    try:
+        return rule["_op"](actual, rule["value"])
+    except Exception:
+        return False
+
+def _applies_when(get: Callable[[Tuple[str, ...]], Tuple[Any, float, Any]], cond: Dict[str, Any]) -> bool:
     for rule in cond.get("applies_when", []):
-        actual, conf, _ = _get_value(doc, rule["field"])
+        actual, conf, _ = get(rule["_parts"])
         if conf < CONF_T:
             return False
-        if not _compare(rule["op"], actual, rule["value"]):
+        if not _rule_holds(rule, actual):
             return False
     return True
 
-def evaluate_condition(doc: Dict[str, Any], cond: Dict[str, Any]) -> Dict[str, Any]:
+def _not_applicable(cond: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "condition_id": cond["_id"],
+        "title": cond["_title"],
+        "status": "not_applicable",
+        "failures": [],
+        "notes": "applies_when not satisfied"
+    }
+
+def present_docs(doc: Dict[str, Any]) -> frozenset:
+    """Names of documents marked present in doc_presence (compute once per doc)."""
+    return frozenset(name for name, present in doc.get("doc_presence", {}).items() if present)
+
+def evaluate_condition(
+    doc: Dict[str, Any],
+    cond: Dict[str, Any],
+    present: Optional[frozenset] = None,
+    fail_fast: bool = False,
+    flat: Optional[Dict[Tuple[str, ...], Tuple[Any, float, Any]]] = None
+) -> Dict[str, Any]:
+    """
+    present: optional present_docs(doc), to share across conditions for the same doc.
+    flat: optional flatten_doc(doc), likewise; fields are then read from it.
+    fail_fast: for severity "hard" conditions, stop at the first missing doc / failed
+               check (exceptions are still applied). The status is the same, but
+               failures lists only the first problem found.
+    """
+    cond = _compile_condition(cond)
+    stop_early = fail_fast and cond.get("severity") == "hard"
+    get = _value_getter(doc, flat)
+
     # 1) Check applicability
-    if not _applies_when(doc, cond):
-        return {
-            "condition_id": cond["condition_id"],
-            "title": cond.get("title"),
-            "status": "not_applicable",
-            "failures": [],
-            "notes": "applies_when not satisfied"
-        }
+    if not _applies_when(get, cond):
+        return _not_applicable(cond)
 
     failures = []
     notes = []
+    result = {"condition_id": cond["_id"], "title": cond["_title"], "status": None,
+              "failures": failures, "notes": ""}
 
     # 2) Check required documents
+    if present is None:
+        present = present_docs(doc)
     for docname in cond.get("must_have_docs", []):
-        present = doc.get("doc_presence", {}).get(docname, False)
-        if not present:
+        if docname not in present:
             failures.append({
                 "field": f"doc_presence.{docname}",
                 "expected": "present",
                 "actual": "missing",
                 "provenance": None
             })
+            if stop_early:
+                break
 
     # 3) Apply exception guardrails first (if any)
     for ex in cond.get("exceptions", []):
-        actual, conf, prov = _get_value(doc, ex["when"]["field"])
-        if conf >= CONF_T and _compare(ex["when"]["op"], actual, ex["when"]["value"]):
-            status = ex.get("action", "unknown")
-            return {
-                "condition_id": cond["condition_id"],
-                "title": cond.get("title"),
-                "status": status,
-                "failures": failures,  # may include missing docs already
-                "notes": ex.get("note", "")
-            }
+        actual, conf, prov = get(ex["when"]["_parts"])
+        if conf >= CONF_T and _rule_holds(ex["when"], actual):
+            result["status"] = ex.get("action", "unknown")
+            result["notes"] = ex.get("note", "")  # failures may include missing docs already
+            return result
 
     # 4) Evaluate checks
     for rule in cond.get("checks", []):
-        actual, conf, prov = _get_value(doc, rule["field"])
+        if stop_early and failures:
+            break  # already deficient
+        actual, conf, prov = get(rule["_parts"])
         if conf < CONF_T or actual is None:
             failures.append({
                 "field": rule["field"],
@@ -226,7 +367,7 @@ def evaluate_condition(doc: Dict[str, Any], cond: Dict[str, Any]) -> Dict[str, A
                 "provenance": prov
             })
             continue
-        if not _compare(rule["op"], actual, rule["value"]):
+        if not _rule_holds(rule, actual):
             failures.append({
                 "field": rule["field"],
                 "expected": f"{rule['op']} {rule['value']}",
@@ -234,19 +375,261 @@ def evaluate_condition(doc: Dict[str, Any], cond: Dict[str, Any]) -> Dict[str, A
                 "provenance": prov
             })
 
-    status = "satisfied" if len(failures) == 0 else "deficient"
-    return {
-        "condition_id": cond["condition_id"],
-        "title": cond.get("title"),
-        "status": status,
-        "failures": failures,
-        "notes": "; ".join(notes) if notes else ""
-    }
+    result["status"] = "satisfied" if len(failures) == 0 else "deficient"
+    result["notes"] = "; ".join(notes) if notes else ""
+    return result
+
+
+# ---------- Applicability index (skip conditions that can't apply) ----------
+
+class ConditionIndex:
+    """
+    Inverted index from an applies_when equality (field, value) to the conditions
+    that require it. Every applies_when rule must hold, so a condition whose
+    indexed (field, value) doesn't match the doc can be skipped without evaluation.
+    Conditions without a usable 'eq' rule are always candidates.
+    """
+
+    def __init__(self, conditions: List[Dict[str, Any]]):
+        self.conditions = [_compile_condition(c) for c in conditions]
+        self._position = {id(c): i for i, c in enumerate(self.conditions)}
+        self._index: Dict[Tuple[str, Any], List[Dict[str, Any]]] = {}
+        self._fields: Dict[str, Tuple[str, ...]] = {}
+        self._always: List[Dict[str, Any]] = []
+
+        for cond in self.conditions:
+            rule = next((r for r in cond["applies_when"] if r["op"] == "eq" and _hashable(r["value"])), None)
+            if rule is None:
+                self._always.append(cond)
+                continue
+            self._index.setdefault((rule["field"], rule["value"]), []).append(cond)
+            self._fields[rule["field"]] = rule["_parts"]
+
+    def get_candidates(self, doc: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Conditions that may apply to doc, in their original order."""
+        candidates = list(self._always)
+        for field, parts in self._fields.items():
+            actual, conf, _ = _get_value(doc, parts)
+            if conf < CONF_T or not _hashable(actual):
+                continue
+            candidates.extend(self._index.get((field, actual), ()))
+        candidates.sort(key=lambda c: self._position[id(c)])
+        return candidates
+
+def _hashable(value: Any) -> bool:
+    try:
+        hash(value)
+    except TypeError:
+        return False
+    return True
+
+def evaluate_document(doc: Dict[str, Any], index: ConditionIndex) -> List[Dict[str, Any]]:
+    """
+    evaluate_condition for every indexed condition; conditions ruled out by the
+    index are reported as not_applicable without being evaluated.
+    """
+    candidate_ids = {id(c) for c in index.get_candidates(doc)}
+    present = present_docs(doc)
+    flat = flatten_doc(doc)
+    return [
+        evaluate_condition(doc, cond, present, flat=flat) if id(cond) in candidate_ids else _not_applicable(cond)
+        for cond in index.conditions
+    ]
+
+
+# ---------- Batch evaluator (many docs at once) ----------
+
+def _field_columns(docs: List[Dict[str, Any]], parts: Tuple[str, ...]) -> Tuple[pd.Series, np.ndarray, List[Any]]:
+    """
+    Column version of _get_value: (value, confidence, provenance) for one field
+    across all docs. Only the fields rules reference are ever extracted.
+    """
+    values, confs, provs = zip(*[_get_value(doc, parts) for doc in docs])
+    return pd.Series(values, dtype=object), np.fromiter(confs, dtype=float, count=len(docs)), list(provs)
+
+def _compare_column(op: str, actual: pd.Series, expected: Any) -> np.ndarray:
+    """Vectorized _compare over a column; falls back to per-value _compare."""
+    try:
+        if op in ("eq", "neq") and not isinstance(expected, (list, tuple, set, dict)):
+            result = OPS[op](actual, expected)
+        elif op in ("gte", "lte"):
+            result = OPS[op](pd.to_numeric(actual, errors="coerce"), float(expected))
+        elif op == "between":
+            lo, hi = expected
+            result = pd.to_numeric(actual, errors="coerce").between(float(lo), float(hi))
+        elif op == "in" and isinstance(expected, (list, tuple, set)):
+            result = actual.isin(expected)
+        else:
+            raise TypeError(op)
+        return np.asarray(result, dtype=bool)
+    except Exception:
+        return np.fromiter((_compare(op, a, expected) for a in actual), dtype=bool, count=len(actual))
+
+def evaluate_batch(docs: List[Dict[str, Any]], conditions: List[Dict[str, Any]]) -> pd.DataFrame:
+    """
+    Evaluate every condition against every doc, same results as evaluate_condition.
+
+    Each field a rule references is pulled out once into a column (value,
+    confidence, provenance arrays across all docs), and each rule is evaluated as
+    one column operation; failure details are only built for the report.
+
+    Returns:
+        DataFrame with one row per (doc, condition): doc_index, condition_id,
+        title, status, failures, notes
+    """
+    columns = ["doc_index", "condition_id", "title", "status", "failures", "notes"]
+    if not docs or not conditions:
+        return pd.DataFrame(columns=columns)
+
+    n = len(docs)
+    field_cache: Dict[str, Tuple[pd.Series, np.ndarray, List[Any]]] = {}
+    missing_cache: Dict[str, np.ndarray] = {}
+    presents = [present_docs(doc) for doc in docs]
+
+    def field(rule: Dict[str, Any]):
+        if rule["field"] not in field_cache:
+            field_cache[rule["field"]] = _field_columns(docs, rule["_parts"])
+        return field_cache[rule["field"]]
+
+    def missing_mask(docname: str) -> np.ndarray:
+        if docname not in missing_cache:
+            missing_cache[docname] = np.fromiter((docname not in p for p in presents), dtype=bool, count=n)
+        return missing_cache[docname]
+
+    parts = []
+    for cond in map(_compile_condition, conditions):
+        # 1) Applicability
+        applies = np.ones(n, dtype=bool)
+        for rule in cond["applies_when"]:
+            actual, conf, _ = field(rule)
+            applies &= (conf >= CONF_T) & _compare_column(rule["op"], actual, rule["value"])
+
+        # 2) Required documents
+        missing_docs = [(docname, missing_mask(docname)) for docname in cond.get("must_have_docs", [])]
+
+        # 3) First matching exception per doc (-1 = none)
+        exception_idx = np.full(n, -1)
+        for i, ex in enumerate(cond["exceptions"]):
+            actual, conf, _ = field(ex["when"])
+            hit = (conf >= CONF_T) & _compare_column(ex["when"]["op"], actual, ex["when"]["value"])
+            exception_idx[(exception_idx == -1) & hit] = i
+
+        # 4) Checks: unknown (low confidence / missing) or failed comparison
+        check_masks = []
+        for rule in cond["checks"]:
+            actual, conf, prov = field(rule)
+            unknown = (conf < CONF_T) | actual.isna().to_numpy(dtype=bool)
+            failed = ~unknown & ~_compare_column(rule["op"], actual, rule["value"])
+            check_masks.append((rule, actual, prov, unknown, failed))
+
+        # Report: statuses are set column-wise, failure details only built where needed
+        any_missing = np.zeros(n, dtype=bool)
+        for _, missing in missing_docs:
+            any_missing |= missing
+        any_check_failed = np.zeros(n, dtype=bool)
+        for *_, unknown, failed in check_masks:
+            any_check_failed |= unknown | failed
+        no_exception = exception_idx < 0
+
+        status = np.where(any_missing | any_check_failed, "deficient", "satisfied").astype(object)
+        notes = np.full(n, "", dtype=object)
+        for i, ex in enumerate(cond["exceptions"]):
+            status[exception_idx == i] = ex.get("action", "unknown")
+            notes[exception_idx == i] = ex.get("note", "")
+        status[~applies] = "not_applicable"
+        notes[~applies] = "applies_when not satisfied"
+
+        failures = [[] for _ in range(n)]
+        needs_detail = applies & (any_missing | (no_exception & any_check_failed))
+        for j in np.flatnonzero(needs_detail).tolist():
+            doc_failures = failures[j]
+            for docname, missing in missing_docs:
+                if missing[j]:
+                    doc_failures.append({
+                        "field": f"doc_presence.{docname}",
+                        "expected": "present",
+                        "actual": "missing",
+                        "provenance": None
+                    })
+            if not no_exception[j]:
+                continue
+            for rule, actual, prov, unknown, failed in check_masks:
+                if unknown[j] or failed[j]:
+                    doc_failures.append({
+                        "field": rule["field"],
+                        "expected": f"{rule['op']} {rule['value']}",
+                        "actual": "unknown" if unknown[j] else actual.iat[j],
+                        "provenance": prov[j]
+                    })
+
+        parts.append(pd.DataFrame({
+            "doc_index": np.arange(n),
+            "condition_id": cond["_id"],
+            "title": cond["_title"],
+            "status": status,
+            "failures": failures,
+            "notes": notes,
+        }, columns=columns))
+
+    return pd.concat(parts, ignore_index=True)
+
+
+# ---------- Parallel evaluator (CPU-bound, one process per core) ----------
+
+_WORKER_INDEX: Optional[ConditionIndex] = None
+
+def _init_worker(conditions: List[Dict[str, Any]]) -> None:
+    # Compiled rules hold lambdas that don't pickle, so each worker compiles its own copy once
+    global _WORKER_INDEX
+    _WORKER_INDEX = ConditionIndex(conditions)
+
+def _evaluate_in_worker(doc: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return evaluate_document(doc, _WORKER_INDEX)
+
+def evaluate_batch_parallel(
+    docs: List[Dict[str, Any]],
+    conditions: List[Dict[str, Any]],
+    workers: Optional[int] = None,
+    chunksize: int = 64
+) -> pd.DataFrame:
+    """
+    evaluate_batch across worker processes: docs are independent, so each worker
+    runs evaluate_document on its share. Same rows and order as evaluate_batch.
+
+    Args:
+        docs: Documents to evaluate
+        conditions: Condition templates (raw, not compiled)
+        workers: Number of processes (default: os.cpu_count()); 1 runs in-process
+        chunksize: Docs sent to a worker per task
+    """
+    columns = ["doc_index", "condition_id", "title", "status", "failures", "notes"]
+    if not docs or not conditions:
+        return pd.DataFrame(columns=columns)
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(docs) <= chunksize:
+        index = ConditionIndex(conditions)
+        per_doc = [evaluate_document(doc, index) for doc in docs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(conditions,)) as pool:
+            per_doc = list(pool.map(_evaluate_in_worker, docs, chunksize=chunksize))
+
+    # Condition-major, like evaluate_batch
+    rows = [
+        {"doc_index": j, **per_doc[j][i]}
+        for i in range(len(conditions))
+        for j in range(len(docs))
+    ]
+    return pd.DataFrame(rows, columns=columns)
 
 
 # ---------- Run the evaluator on our sample inputs ----------
 
-results = [evaluate_condition(DOC_JSON, c) for c in CONDITION_TEMPLATES]
+# (guarded so worker processes of evaluate_batch_parallel can import this module quietly)
+if __name__ == "__main__":
+    CONDITION_INDEX = ConditionIndex(CONDITION_TEMPLATES)
+    results = evaluate_document(DOC_JSON, CONDITION_INDEX)
 
-print("=== DEFICIENCY RESULTS (Step 4) ===")
-print(json.dumps(results, indent=2))
+    print("=== DEFICIENCY RESULTS (Step 4) ===")
+    print(_dumps(results))
@@ -0,0 +1,16 @@
+"""
+Load the .env file once per process.
+Every Step 4/5 module calls init_env() at import; only the first call
+parses the file, later calls (and re-imports) are free.
+"""
+
+from functools import lru_cache
+
+
+@lru_cache(maxsize=1)
+def init_env() -> bool:
+    """Load .env into os.environ (searching upward from this directory)."""
+    from dotenv import load_dotenv
+    # Finds ../.env (src/agent/.env) as well as a local .env
+    load_dotenv()
+    return True
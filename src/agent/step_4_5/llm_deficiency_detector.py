@@ -3,15 +3,153 @@ LLM-Based Deficiency Detection System (Approach 1)
 Uses Claude with prompt caching to validate documents against natural language conditions.
 """
 
+import asyncio
 import json
+import logging
 import os
+import re
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Literal, Optional, Sequence, Set, Tuple
+
 import pandas as pd
-from typing import Dict, List, Any, Optional
-from anthropic import Anthropic
-from dotenv import load_dotenv
+from anthropic import APIError, AsyncAnthropic
+from anthropic_rate_limit import create_message, create_message_async
+from client_pool import get_anthropic, get_async_anthropic, run_async
+from env_init import init_env
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))  # src/agent: shared pipeline modules
+from pipeline_logging import configure_step_logger
+
+logger = logging.getLogger(__name__)
+
+# Load environment variables (once per process)
+init_env()
+
+
+# Extracted entities below this confidence are left out of compacted documents
+CONF_T = 0.6
+# Above this many characters of JSON, compacted documents also drop provenance
+PROMPT_SOFT_LIMIT = 20000
+# Max cached filter_by_classification results per detector
+FILTER_CACHE_SIZE = 256
+# Max cached per-condition-subset catalog blocks per detector
+PROMPT_CACHE_SIZE = 256
+# Max (column, term) -> matching rows entries in a detector's term index
+TERM_INDEX_SIZE = 4096
+# One condition per line in the system prompt's condition catalog (tab-separated)
+CATALOG_ENTRY = "{condition_id}\t{description}\t{related_docs}\t{data_elements}\n"
+# Fenced code block (``` or ```json) around a JSON response
+JSON_FENCE = re.compile(r"```(?:json)?\s*(.*?)```", re.DOTALL)
+# Per-call part of the user prompt (conditions vary per batch)
+REQUEST_TEMPLATE = """Please evaluate the submitted document(s) against the following conditions:
+
+CONDITIONS TO CHECK: {condition_ids}
+
+For each condition listed above:
+1. Determine if it applies to this loan
+2. Check if all requirements are satisfied
+3. Identify any deficiencies with specific field references and evidence
+4. Provide clear reasoning for your determination
+5. Consider the additional context provided when making your determination
+6. Provide a simple, actionable instruction for resolving each deficiency (e.g., "Upload signed tax return", "Obtain CPA letter showing 25% ownership")
+7. Include "documents_checked" array listing all document classifications reviewed for this condition
+8. Include "satisfied_by" field (string or null) specifying which document satisfied the requirement if compliant, or null if deficient
 
-# Load environment variables
-load_dotenv()
+Return the evaluation as JSON following the response format specified in the system prompt.
+IMPORTANT: Include the "actionable_instruction", "documents_checked", and "satisfied_by" fields for each condition.
+Do NOT include confidence scores - focus only on clear deficiency detection.
+"""
+# Appended after the documents when several are submitted together
+MULTI_DOC_INSTRUCTIONS = """IMPORTANT FOR MULTI-DOCUMENT EVALUATION:
+- Consider ALL documents collectively when evaluating each condition
+- A requirement missing in one document may be satisfied by another document
+- If a condition requires information found in any of the submitted documents, mark it as compliant
+- Specify which document(s) satisfied the requirement in your reasoning
+- In the "documents_checked" field, list all document classifications reviewed
+- In the "satisfied_by" field, specify which document satisfied the requirement (or null if deficient)
+
+"""
+# "All Docs", "All Documents", etc. in a lowercased Related documents value
+ALL_DOCS_PATTERN = re.compile(r'all\s+doc')
+# Opts in to the 1-hour prompt cache TTL (cache_ttl="1h")
+EXTENDED_CACHE_TTL_HEADERS = {"anthropic-beta": "extended-cache-ttl-2025-04-11"}
+
+try:
+    import orjson  # Optional: faster JSON serialization
+except ImportError:
+    orjson = None
+
+
+def _dumps(obj: Any) -> str:
+    """Pretty-print obj as JSON (orjson when installed, else the stdlib)."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY).decode()
+    return json.dumps(obj, indent=2)
+
+
+def _loads(text: str) -> Any:
+    """Parse JSON (orjson when installed); errors are json.JSONDecodeError either way."""
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
+
+
+def _canonical_json(obj: Any) -> str:
+    """Compact JSON with sorted keys: equal documents always serialize to the same text."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS).decode()
+    return json.dumps(obj, sort_keys=True, separators=(",", ":"))
+
+
+def _strip_provenance(value: Any) -> Any:
+    """Copy of value without 'source_doc' keys and with confidences rounded to 2 places."""
+    if isinstance(value, dict):
+        return {
+            k: round(v, 2) if k == 'confidence' and isinstance(v, float) else _strip_provenance(v)
+            for k, v in value.items()
+            if k != 'source_doc'
+        }
+    if isinstance(value, list):
+        return [_strip_provenance(v) for v in value]
+    return value
+
+
+# The columns the detector itself reads (catalog, filtering, related docs); pass
+# as columns= to skip parsing the rest when full rows aren't needed
+CATALOG_COLUMNS = ("Title", "Description", "Related documents", "Suggested Data Elements")
+
+
+def conditions_cache_paths(csv_path: str) -> List[str]:
+    """
+    Pre-parsed copies of a conditions CSV written by precompile_conditions.py,
+    in the order they're tried (Parquet needs pyarrow/fastparquet).
+    """
+    base = os.path.splitext(csv_path)[0]
+    return [base + ".parquet", base + ".pkl"]
+
+
+def load_conditions(csv_path: str, columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+    """
+    Load the conditions table, from the pre-parsed cache when it's at least
+    as new as the CSV, otherwise by parsing the CSV. With columns, only those
+    columns are read (other columns are never parsed).
+    """
+    columns = list(columns) if columns is not None else None
+    csv_mtime = os.path.getmtime(csv_path)
+    for cache_path in conditions_cache_paths(csv_path):
+        if not os.path.exists(cache_path) or os.path.getmtime(cache_path) < csv_mtime:
+            continue
+        try:
+            if cache_path.endswith(".parquet"):
+                return pd.read_parquet(cache_path, columns=columns)
+            df = pd.read_pickle(cache_path)
+            return df if columns is None else df[columns]
+        except (ImportError, ValueError, OSError) as e:
+            # No Parquet engine or unreadable cache: try the next one / the CSV
+            logger.warning("⚠ Could not read %s (%s), falling back", cache_path, e)
+    return pd.read_csv(csv_path, usecols=columns)
 
 
 class LLMDeficiencyDetector:
@@ -24,7 +162,10 @@ class LLMDeficiencyDetector:
         self, 
         conditions_csv_path: str,
         api_key: Optional[str] = None,
-        model: str = "claude-haiku-4-5-20251001"  # Optimized: Haiku is 3-5x faster than Sonnet
+        model: str = "claude-haiku-4-5-20251001",  # Optimized: Haiku is 3-5x faster than Sonnet
+        cache_ttl: Literal["5m", "1h"] = "1h",
+        verbose: bool = True,
+        columns: Optional[Sequence[str]] = None
     ):
         """
         Initialize the detector with conditions from CSV.
@@ -33,25 +174,99 @@ class LLMDeficiencyDetector:
             conditions_csv_path: Path to CSV file with conditions
             api_key: Anthropic API key (defaults to ANTHROPIC_API_KEY env var)
             model: Claude model to use
+            cache_ttl: Prompt cache lifetime for the system prompt. "1h" keeps one
+                       cache write alive across a whole bulk run; "5m" is cheaper
+                       to write when calls are close together.
+            verbose: Log progress (INFO); False keeps only warnings and errors
+            columns: CSV columns to load (e.g. CATALOG_COLUMNS); None loads every
+                     column, so get_condition_by_title returns full rows
         """
+        configure_step_logger(logger, verbose)
         self.api_key = api_key or os.getenv("ANTHROPIC_API_KEY")
         if not self.api_key:
             raise ValueError("ANTHROPIC_API_KEY not found in environment or parameters")
         
-        self.client = Anthropic(api_key=self.api_key)
+        # Shared per-process client (connection pool is reused across detectors);
+        # the async client is looked up per event loop (see async_client)
+        self.client = get_anthropic(self.api_key)
         self.model = model
+        if cache_ttl not in ("5m", "1h"):
+            raise ValueError(f"cache_ttl must be '5m' or '1h', got {cache_ttl!r}")
+        self.cache_ttl = cache_ttl
         
         # Load conditions
-        print(f"Loading conditions from {conditions_csv_path}...")
-        self.conditions_df = pd.read_csv(conditions_csv_path)
-        print(f"Loaded {len(self.conditions_df)} conditions")
+        logger.info("Loading conditions from %s...", conditions_csv_path)
+        self.conditions_df = load_conditions(conditions_csv_path, columns)  # Also resets the filter cache
+        logger.info("Loaded %d conditions", len(self.conditions_df))
         
         # Build cached system prompt with all conditions
-        self.system_prompt = self._build_system_prompt()
-        print(f"System prompt built ({len(self.system_prompt)} chars) - will be cached on first use")
+        # Instructions and condition catalog are separate cache blocks, so the
+        # instructions stay cached even when the catalog changes. Both are
+        # built deterministically, so they're byte-identical across calls.
+        # Each request sends only the catalog rows it checks, after the document
+        # (see _catalog_block), so the system prompt is just the instructions.
+        self.system_blocks = [self._build_instructions(), self._build_condition_catalog()]
+        self.system_prompt = "".join(self.system_blocks)
+        logger.info("System prompt built (%d chars) - will be cached on first use", len(self.system_prompt))
+    
+    @property
+    def async_client(self) -> AsyncAnthropic:
+        # Async pools are tied to the running event loop, so look it up per call
+        return get_async_anthropic(self.api_key)
+    
+    @property
+    def conditions_df(self) -> pd.DataFrame:
+        return self._conditions_df
+    
+    @conditions_df.setter
+    def conditions_df(self, df: pd.DataFrame) -> None:
+        # filter_by_classification results depend on the conditions, so reloading drops them
+        self._conditions_df = df
+        self._filter_cache: Dict[tuple, pd.DataFrame] = {}
+        self._prompt_cache: Dict[frozenset, Optional[str]] = {}
+        
+        # Title lookups used per API result (first row wins on duplicate titles)
+        first_rows = df.drop_duplicates('Title')
+        self._title_to_row: Dict[str, Dict[str, Any]] = dict(zip(first_rows['Title'], first_rows.to_dict('records')))
+        related_docs = first_rows['Related documents'].fillna('') if 'Related documents' in df.columns else [''] * len(first_rows)
+        self._related_docs_by_title: Dict[str, str] = dict(zip(first_rows['Title'], related_docs))
+        
+        # Plain-list text columns for the row scans in filter_by_classification and
+        # search_conditions (filter columns case folded once, not per call)
+        self._related_docs_lower = self._text_column('Related documents', lower=True)
+        self._suggested_elements_lower = self._text_column('Suggested Data Elements', lower=True)
+        self._titles = self._text_column('Title')
+        self._descriptions = self._text_column('Description')
+        
+        # Inverted index for filter_by_classification: (column, term) -> rows whose
+        # text contains the term, filled per term on first use. Document fields
+        # recur across documents, so terms are reused even when whole field sets aren't
+        self._term_rows: Dict[Tuple[str, str], Set[int]] = {}
+        self._all_docs_rows = [
+            i for i, docs in enumerate(self._related_docs_lower or ()) if ALL_DOCS_PATTERN.search(docs)
+        ]
+    
+    def _rows_containing(self, column: str, term: str) -> Set[int]:
+        """Rows whose lowercased column text ('related' or 'suggested') contains term."""
+        key = (column, term.lower())
+        rows = self._term_rows.get(key)
+        if rows is None:
+            texts = self._related_docs_lower if column == 'related' else self._suggested_elements_lower
+            rows = {i for i, text in enumerate(texts) if key[1] in text}
+            if len(self._term_rows) >= TERM_INDEX_SIZE:
+                self._term_rows.pop(next(iter(self._term_rows)))  # Drop the oldest entry
+            self._term_rows[key] = rows
+        return rows
+    
+    def _text_column(self, name: str, lower: bool = False) -> Optional[List[str]]:
+        """A text column as a list of str (NaN as ''), or None if the column is missing."""
+        if name not in self._conditions_df.columns:
+            return None
+        column = self._conditions_df[name].fillna('').astype(str)
+        return (column.str.lower() if lower else column).tolist()
     
-    def _build_system_prompt(self) -> str:
-        """Build the system prompt containing all conditions (for caching)."""
+    def _build_instructions(self) -> str:
+        """Build the static instructions + response format (first cached block)."""
         
         prompt = """You are an expert loan underwriting compliance checker.
 
@@ -68,34 +283,6 @@ INSTRUCTIONS:
 
 IMPORTANT: Focus on DETECTION only. Do not score or rank deficiencies - that will be done in post-processing.
 
-CONDITION CATALOG:
-Below are all underwriting conditions you may be asked to check:
-
-"""
-        
-        # Add each condition with full details
-        for idx, row in self.conditions_df.iterrows():
-            condition_id = row['Title']
-            description = row.get('Description', '')
-            # enhanced_desc = row.get('Enhanced Description by RAM', '')
-            # compartment = row.get('Proposed Compartmentalization', '')
-            related_docs = row.get('Related documents', '')
-            data_elements = row.get('Suggested Data Elements', '')
-            
-            # Removed enhanced description and compartment from prompt
-            # to shorten prompt length
-            
-            prompt += f"""
----
-CONDITION ID: {condition_id}
-DESCRIPTION: {description}
-RELATED DOCUMENTS: {related_docs}
-KEY DATA ELEMENTS: {data_elements}
-"""
-        
-        prompt += """
----
-
 RESPONSE FORMAT:
 Always return valid JSON with this exact structure:
 {
@@ -140,48 +327,99 @@ NOTE: Do not provide confidence scores. Focus only on clear deficiency detection
 """
         return prompt
     
-    def check_document(
-        self, 
-        document_data, 
+    def _build_condition_catalog(self, subset_df: Optional[pd.DataFrame] = None) -> str:
+        """Build the catalog of all conditions, or of subset_df's (sent with the request)."""
+        
+        prompt = """CONDITION CATALOG:
+Below are all underwriting conditions you may be asked to check, one per line.
+Columns are tab-separated: CONDITION ID, DESCRIPTION, RELATED DOCUMENTS, KEY DATA ELEMENTS.
+The CONDITION ID is the condition's title; use it exactly as written for "condition_id".
+
+"""
+        
+        # Add each condition with full details
+        # (enhanced description and compartmentalization are left out to shorten the prompt)
+        df = self.conditions_df if subset_df is None else subset_df
+        
+        def column(name):
+            if name not in df.columns:
+                return [''] * len(df)
+            # Tabs and newlines inside a value would break the row/column layout
+            return df[name].fillna('').astype(str).str.replace(r'\s*[\t\r\n]\s*', ' ', regex=True).to_numpy()
+        
+        entries = [
+            CATALOG_ENTRY.format(condition_id=condition_id, description=description,
+                                 related_docs=related_docs, data_elements=data_elements)
+            for condition_id, description, related_docs, data_elements in zip(
+                column('Title'), column('Description'),
+                column('Related documents'), column('Suggested Data Elements')
+            )
+        ]
+        
+        return prompt + "".join(entries)
+    
+    def _build_user_prompt(
+        self,
+        document_data,
         condition_ids: List[str],
-        max_tokens: int = 8000,  # Increased from 4000 to handle more conditions
         additional_context: Optional[List[Dict[str, Any]]] = None,
         loan_program: Optional[str] = None,
-        borrower_info: Optional[Dict[str, Any]] = None
-    ) -> Dict[str, Any]:
+        borrower_info: Optional[Dict[str, Any]] = None,
+        shared_blocks: Optional[Tuple[str, str]] = None
+    ) -> Tuple[str, str, str]:
         """
-        Check document(s) against specific conditions.
+        Build the user prompt as (context_block, document_block, request_block)
+        (see check_document for the arguments).
         
-        Args:
-            document_data: Either a single document dict or list of document dicts
-                          Single: {classification: str, extracted_entities: dict, ...}
-                          Multiple: [{classification: str, extracted_entities: dict}, ...]
-            condition_ids: List of condition IDs (titles) to check
-            max_tokens: Maximum tokens for response
-            additional_context: Optional context from step 3 (ranked requirements with connected nodes)
-            loan_program: Optional loan program name (e.g., "Flex Supreme")
-            borrower_info: Optional borrower information (name, type, SSN, etc.)
-            
-        Returns:
-            Dict with evaluation results for each condition
-        """
+        context_block holds loan program, borrower info and step-3 graph context, which
+        repeat across calls for the same loan; document_block holds the document data,
+        which repeats across condition batches. Both go first so they can be cached;
+        request_block holds the conditions to check and instructions for this call.
         
-        # Detect if we have single document or multiple documents
-        is_multi_doc = isinstance(document_data, list)
+        Pass shared_blocks from _build_shared_blocks to reuse the first two.
+        """
+        if shared_blocks is None:
+            shared_blocks = self._build_shared_blocks(document_data, additional_context, loan_program, borrower_info)
+        return (*shared_blocks, self._build_request_block(condition_ids))
+    
+    def _build_shared_blocks(
+        self,
+        document_data,
+        additional_context: Optional[List[Dict[str, Any]]] = None,
+        loan_program: Optional[str] = None,
+        borrower_info: Optional[Dict[str, Any]] = None
+    ) -> Tuple[str, str]:
+        """
+        Build (context_block, document_block), the parts of the user prompt that
+        don't depend on the conditions checked. Build once and pass as shared_blocks
+        when checking the same document in several calls.
+        """
+        return (
+            self._build_context_block(additional_context, loan_program, borrower_info),
+            self._build_document_block(document_data)
+        )
+    
+    def _build_context_block(
+        self,
+        additional_context: Optional[List[Dict[str, Any]]] = None,
+        loan_program: Optional[str] = None,
+        borrower_info: Optional[Dict[str, Any]] = None
+    ) -> str:
+        """Render loan program, borrower info and step-3 graph context (same for every document of a loan)."""
         
-        # Build user prompt with loan program and borrower info context
-        user_prompt = ""
+        # Built as a list of parts and joined once at the end
+        context_parts: List[str] = []
         
         # Add loan program and borrower info at the top for context
         if loan_program or borrower_info:
-            user_prompt += "LOAN APPLICATION CONTEXT:\n"
+            context_parts.append("LOAN APPLICATION CONTEXT:\n")
             
             if loan_program:
-                user_prompt += f"Loan Program: {loan_program}\n"
-                print(f"  ✓ Adding loan program to LLM context: {loan_program}")
+                context_parts.append(f"Loan Program: {loan_program}\n")
+                logger.info("  ✓ Adding loan program to LLM context: %s", loan_program)
             
             if borrower_info:
-                user_prompt += "Borrower Information:\n"
+                context_parts.append("Borrower Information:\n")
                 borrower_context_items = []
                 
                 if borrower_info.get('first_name') or borrower_info.get('last_name'):
@@ -191,251 +429,553 @@ NOTE: Do not provide confidence scores. Focus only on clear deficiency detection
                         borrower_info.get('last_name', '')
                     ]
                     full_name = ' '.join(part for part in name_parts if part).strip()
-                    user_prompt += f"  - Name: {full_name}\n"
+                    context_parts.append(f"  - Name: {full_name}\n")
                     borrower_context_items.append(f"Name: {full_name}")
                 
                 if borrower_info.get('borrower_type'):
-                    user_prompt += f"  - Type: {borrower_info['borrower_type']}\n"
+                    context_parts.append(f"  - Type: {borrower_info['borrower_type']}\n")
                     borrower_context_items.append(f"Type: {borrower_info['borrower_type']}")
                 
                 if borrower_info.get('business_name'):
-                    user_prompt += f"  - Business Name: {borrower_info['business_name']}\n"
+                    context_parts.append(f"  - Business Name: {borrower_info['business_name']}\n")
                     borrower_context_items.append(f"Business: {borrower_info['business_name']}")
                 
                 if borrower_info.get('email'):
-                    user_prompt += f"  - Email: {borrower_info['email']}\n"
+                    context_parts.append(f"  - Email: {borrower_info['email']}\n")
                 
                 if borrower_context_items:
-                    print(f"  ✓ Adding borrower info to LLM context: {', '.join(borrower_context_items)}")
-            
-            user_prompt += "\nIMPORTANT: Only select and evaluate conditions that relate to the loan program that the borrower is eligible for. Consider the borrower's type and context when evaluating requirements.\n\n"
-        
-        # Add conditions
-        user_prompt += f"""Please evaluate the submitted document(s) against the following conditions:
-
-CONDITIONS TO CHECK: {', '.join(condition_ids)}
-
-"""
-        
-        # Format document data based on type
-        if is_multi_doc:
-            user_prompt += "SUBMITTED DOCUMENTS:\n\n"
-            for idx, doc in enumerate(document_data, 1):
-                classification = doc.get('classification', f'Document {idx}')
-                extracted_entities = doc.get('extracted_entities', {})
-                user_prompt += f"DOCUMENT {idx}: {classification}\n"
-                user_prompt += f"Extracted Data:\n{json.dumps(extracted_entities, indent=2)}\n\n"
+                    logger.info("  ✓ Adding borrower info to LLM context: %s", ', '.join(borrower_context_items))
             
-            user_prompt += """IMPORTANT FOR MULTI-DOCUMENT EVALUATION:
-- Consider ALL documents collectively when evaluating each condition
-- A requirement missing in one document may be satisfied by another document
-- If a condition requires information found in any of the submitted documents, mark it as compliant
-- Specify which document(s) satisfied the requirement in your reasoning
-- In the "documents_checked" field, list all document classifications reviewed
-- In the "satisfied_by" field, specify which document satisfied the requirement (or null if deficient)
-
-"""
-        else:
-            user_prompt += f"DOCUMENT DATA:\n{json.dumps(document_data, indent=2)}\n\n"
+            context_parts.append("\nIMPORTANT: Only select and evaluate conditions that relate to the loan program that the borrower is eligible for. Consider the borrower's type and context when evaluating requirements.\n\n")
         
         # Add additional context from step 3 if available
         if additional_context:
-            user_prompt += "\n\nADDITIONAL CONTEXT FROM GRAPH ANALYSIS:\n"
-            user_prompt += "The following related requirements, conditions, and dependencies were identified as relevant:\n\n"
+            context_parts.append(
+                "ADDITIONAL CONTEXT FROM GRAPH ANALYSIS:\n"
+                "The following related requirements, conditions, and dependencies were identified as relevant:\n\n"
+            )
             
             for idx, req in enumerate(additional_context[:10], 1):  # Limit to top 10 to manage prompt size
                 req_name = req.get('name') or req.get('title') or f"Requirement {idx}"
                 similarity = req.get('similarity_score', 0)
-                user_prompt += f"{idx}. {req_name} (Similarity: {similarity:.3f})\n"
+                context_parts.append(f"{idx}. {req_name} (Similarity: {similarity:.3f})\n")
                 
                 # Add connected nodes information
                 connected = req.get('connected_nodes', {})
                 
                 # Add conditions
                 if connected.get('conditions'):
-                    user_prompt += f"   Related Conditions:\n"
+                    context_parts.append("   Related Conditions:\n")
                     for cond in connected['conditions'][:3]:  # Limit to 3 per requirement
                         cond_title = cond.get('Title') or cond.get('name') or 'Unknown'
-                        cond_desc = cond.get('Description', '')[:100]  # Truncate long descriptions
+                        cond_desc = (cond.get('Description') or '')[:100]  # Truncate long descriptions
                         if cond_desc:
-                            user_prompt += f"   - {cond_title}: {cond_desc}...\n"
+                            context_parts.append(f"   - {cond_title}: {cond_desc}...\n")
                         else:
-                            user_prompt += f"   - {cond_title}\n"
+                            context_parts.append(f"   - {cond_title}\n")
                 
                 # Add dependencies
                 if connected.get('dependencies'):
-                    user_prompt += f"   Dependencies:\n"
+                    context_parts.append("   Dependencies:\n")
                     for dep in connected['dependencies'][:3]:
                         dep_name = dep.get('name') or dep.get('title') or 'Unknown'
-                        user_prompt += f"   - {dep_name}\n"
+                        context_parts.append(f"   - {dep_name}\n")
                 
                 # Add related requirements
                 if connected.get('related_requirements'):
-                    user_prompt += f"   Related Requirements:\n"
+                    context_parts.append("   Related Requirements:\n")
                     for rel_req in connected['related_requirements'][:3]:
                         rel_name = rel_req.get('name') or rel_req.get('title') or 'Unknown'
-                        user_prompt += f"   - {rel_name}\n"
+                        context_parts.append(f"   - {rel_name}\n")
                 
-                user_prompt += "\n"
+                context_parts.append("\n")
             
-            user_prompt += "Consider this context when evaluating the conditions. These connections may indicate:\n"
-            user_prompt += "- Related conditions that should be checked together\n"
-            user_prompt += "- Dependencies between requirements\n"
-            user_prompt += "- Additional requirements that may apply\n\n"
+            context_parts.append(
+                "Consider this context when evaluating the conditions. These connections may indicate:\n"
+                "- Related conditions that should be checked together\n"
+                "- Dependencies between requirements\n"
+                "- Additional requirements that may apply\n\n"
+            )
         
-        user_prompt += """
-For each condition listed above:
-1. Determine if it applies to this loan
-2. Check if all requirements are satisfied
-3. Identify any deficiencies with specific field references and evidence
-4. Provide clear reasoning for your determination
-5. Consider the additional context provided when making your determination
-6. Provide a simple, actionable instruction for resolving each deficiency (e.g., "Upload signed tax return", "Obtain CPA letter showing 25% ownership")
-7. Include "documents_checked" array listing all document classifications reviewed for this condition
-8. Include "satisfied_by" field (string or null) specifying which document satisfied the requirement if compliant, or null if deficient
-
-Return the evaluation as JSON following the response format specified in the system prompt.
-IMPORTANT: Include the "actionable_instruction", "documents_checked", and "satisfied_by" fields for each condition.
-Do NOT include confidence scores - focus only on clear deficiency detection.
-"""
+        return "".join(context_parts)
+    
+    def _build_document_block(self, document_data) -> str:
+        """Render the submitted document(s)."""
         
-        try:
-            # Make API call with prompt caching
-            response = self.client.messages.create(
-                model=self.model,
-                max_tokens=max_tokens,
-                system=[{
-                    "type": "text",
-                    "text": self.system_prompt,
-                    "cache_control": {"type": "ephemeral"}  # Enable caching
-                }],
-                messages=[{
-                    "role": "user",
-                    "content": user_prompt
-                }]
-            )
-            
-            # Parse response
-            response_text = response.content[0].text
-            
-            # Try to extract JSON from response (in case there's markdown formatting)
-            if "```json" in response_text:
-                json_start = response_text.find("```json") + 7
-                json_end = response_text.find("```", json_start)
-                response_text = response_text[json_start:json_end].strip()
-            elif "```" in response_text:
-                json_start = response_text.find("```") + 3
-                json_end = response_text.find("```", json_start)
-                response_text = response_text[json_start:json_end].strip()
-            
-            result = json.loads(response_text)
-            
-            # Enrich results with related documents from CSV
-            if "results" in result:
-                for item in result["results"]:
-                    condition_id = item.get("condition_id")
-                    if condition_id:
-                        # Look up the condition in the CSV
-                        condition_row = self.conditions_df[
-                            self.conditions_df['Title'] == condition_id
-                        ]
-                        if len(condition_row) > 0:
-                            related_docs = condition_row.iloc[0].get('Related documents', '')
-                            item['related_documents'] = related_docs if pd.notna(related_docs) else ''
-                        else:
-                            item['related_documents'] = ''
+        document_parts: List[str] = []
+        
+        # Format document data based on type (single document or multiple documents)
+        # (canonical JSON, so the same document always gives the same cacheable text)
+        if isinstance(document_data, list):
+            document_parts.append("SUBMITTED DOCUMENTS:\n\n")
+            for idx, doc in enumerate(document_data, 1):
+                classification = doc.get('classification', f'Document {idx}')
+                extracted_entities = doc.get('extracted_entities', {})
+                document_parts.append(f"DOCUMENT {idx}: {classification}\n")
+                document_parts.append(f"Extracted Data:\n{_canonical_json(extracted_entities)}\n\n")
             
-            # Add metadata
-            result['_metadata'] = {
+            document_parts.append(MULTI_DOC_INSTRUCTIONS)
+        else:
+            document_parts.append(f"DOCUMENT DATA:\n{_canonical_json(document_data)}\n\n")
+        
+        return "".join(document_parts)
+    
+    def _build_request_block(self, condition_ids: List[str]) -> str:
+        """Build the per-call part of the user prompt: conditions to check and instructions."""
+        
+        # Conditions vary per batch, so they come after the document
+        return REQUEST_TEMPLATE.format(condition_ids=', '.join(condition_ids))
+    
+    def _catalog_block(self, condition_ids: List[str]) -> Optional[str]:
+        """
+        Catalog listing only condition_ids (in CSV order, so the same set always
+        gives the same text). None when none of the IDs are known, in which case
+        the full catalog goes in the system prompt instead.
+        """
+        key = frozenset(condition_ids)
+        if key in self._prompt_cache:
+            return self._prompt_cache[key]
+        
+        subset = self.conditions_df[self.conditions_df['Title'].isin(key)]
+        block = self._build_condition_catalog(subset) if len(subset) else None
+        
+        if len(self._prompt_cache) >= PROMPT_CACHE_SIZE:
+            self._prompt_cache.pop(next(iter(self._prompt_cache)))  # Drop the oldest entry
+        self._prompt_cache[key] = block
+        return block
+    
+    def _message_params(
+        self,
+        prompt: Tuple[str, str, str],
+        condition_ids: List[str],
+        max_tokens: int
+    ) -> Dict[str, Any]:
+        """
+        Arguments for messages.create (shared by the sync and async clients).
+        
+        The cached prefix (instructions, context, document) is the same for every
+        condition batch of a document; the per-batch catalog rows follow it,
+        uncached, with the request.
+        """
+        catalog_block = self._catalog_block(condition_ids)
+        system_blocks = self.system_blocks[:1] if catalog_block is not None else self.system_blocks
+        return dict(
+            model=self.model,
+            max_tokens=max_tokens,
+            temperature=0,  # Deterministic evaluations
+            system=[{
+                "type": "text",
+                "text": block,
+                "cache_control": {"type": "ephemeral", "ttl": self.cache_ttl}  # Enable caching
+            } for block in system_blocks],
+            messages=[{
+                "role": "user",
+                "content": self._user_content(*prompt, catalog_block=catalog_block)
+            }],
+            extra_headers=EXTENDED_CACHE_TTL_HEADERS if self.cache_ttl == "1h" else None
+        )
+    
+    @staticmethod
+    def _user_content(
+        context_block: str,
+        document_block: str,
+        request_block: str,
+        catalog_block: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        User message content blocks; the context block (if any) and the document
+        block are cache breakpoints (with the system blocks, at most the API's limit of 4).
+        They keep the default 5m TTL: longer-TTL breakpoints must come first.
+        catalog_block (the rows for this batch's conditions) goes uncached after them.
+        """
+        content = []
+        if context_block:
+            content.append({
+                "type": "text",
+                "text": context_block,
+                "cache_control": {"type": "ephemeral"}  # Reused across documents of the same loan
+            })
+        content.append({
+            "type": "text",
+            "text": document_block,
+            "cache_control": {"type": "ephemeral"}  # Reused across condition batches
+        })
+        if catalog_block is not None:
+            content.append({"type": "text", "text": catalog_block})
+        content.append({"type": "text", "text": request_block})
+        return content
+    
+    def _parse_response(self, response, condition_ids: List[str]) -> Dict[str, Any]:
+        """Turn a Claude response into the results dict returned by check_document."""
+        response_text = response.content[0].text
+        
+        # Try to extract JSON from response (in case there's markdown formatting)
+        fenced = JSON_FENCE.search(response_text)
+        if fenced:
+            response_text = fenced.group(1).strip()
+        
+        # Only the parse itself is guarded; anything else is a bug and should raise
+        try:
+            result = _loads(response_text)
+        except json.JSONDecodeError as e:
+            return self._parse_error(e, response_text, condition_ids)
+        
+        # Enrich results with related documents from CSV
+        if "results" in result:
+            for item in result["results"]:
+                condition_id = item.get("condition_id")
+                if condition_id:
+                    item['related_documents'] = self._related_docs_by_title.get(condition_id, '')
+        
+        # Add metadata
+        result['_metadata'] = {
+            'model': self.model,
+            'input_tokens': response.usage.input_tokens,
+            'output_tokens': response.usage.output_tokens,
+            'cache_read_tokens': getattr(response.usage, 'cache_read_input_tokens', 0),
+            'cache_creation_tokens': getattr(response.usage, 'cache_creation_input_tokens', 0),
+        }
+        
+        return result
+    
+    @staticmethod
+    def _parse_error(e: json.JSONDecodeError, response_text: str, condition_ids: List[str]) -> Dict[str, Any]:
+        """Report a response that isn't valid JSON."""
+        logger.error("\n❌ ERROR: Failed to parse LLM response as JSON")
+        logger.error("Exception: %s", e)
+        logger.error("Response length: %d characters", len(response_text))
+        logger.error("Raw response (first 500 chars): %s", response_text[:500])
+        logger.error("Raw response (last 500 chars): %s", response_text[-500:])
+        
+        # Try to identify if response was truncated
+        appears_truncated = not response_text.rstrip().endswith('}')
+        if appears_truncated:
+            logger.warning("⚠ WARNING: Response appears to be truncated (doesn't end with '}' )")
+            logger.warning("  This usually means max_tokens is too low for the number of conditions being checked.")
+            logger.warning("  Current conditions: %d", len(condition_ids))
+            logger.warning("  Suggestion: Reduce number of conditions or increase max_tokens parameter")
+        
+        return {
+            "error": "Failed to parse LLM response as JSON",
+            "raw_response": response_text,
+            "exception": str(e),
+            "response_length": len(response_text),
+            "appears_truncated": appears_truncated
+        }
+    
+    def _skipped_result(self) -> Dict[str, Any]:
+        """Result for a call with no conditions to check (no API request is made)."""
+        return {
+            "results": [],
+            "skipped": True,
+            "_metadata": {
                 'model': self.model,
-                'input_tokens': response.usage.input_tokens,
-                'output_tokens': response.usage.output_tokens,
-                'cache_read_tokens': getattr(response.usage, 'cache_read_input_tokens', 0),
-                'cache_creation_tokens': getattr(response.usage, 'cache_creation_input_tokens', 0),
+                'input_tokens': 0,
+                'output_tokens': 0,
+                'cache_read_tokens': 0,
+                'cache_creation_tokens': 0,
             }
+        }
+    
+    @staticmethod
+    def _api_error(e: APIError) -> Dict[str, Any]:
+        """Report a failed API call in the same shape as a parse failure."""
+        logger.error("\n❌ ERROR: API call failed")
+        logger.exception("Exception: %s", e)
+        return {
+            "error": "API call failed",
+            "exception": str(e)
+        }
+    
+    def check_document(
+        self, 
+        document_data, 
+        condition_ids: List[str],
+        max_tokens: int = 8000,  # Increased from 4000 to handle more conditions
+        additional_context: Optional[List[Dict[str, Any]]] = None,
+        loan_program: Optional[str] = None,
+        borrower_info: Optional[Dict[str, Any]] = None,
+        shared_blocks: Optional[Tuple[str, str]] = None
+    ) -> Dict[str, Any]:
+        """
+        Check document(s) against specific conditions.
+        
+        Args:
+            document_data: Either a single document dict or list of document dicts
+                          Single: {classification: str, extracted_entities: dict, ...}
+                          Multiple: [{classification: str, extracted_entities: dict}, ...]
+            condition_ids: List of condition IDs (titles) to check
+            max_tokens: Maximum tokens for response
+            additional_context: Optional context from step 3 (ranked requirements with connected nodes)
+            loan_program: Optional loan program name (e.g., "Flex Supreme")
+            borrower_info: Optional borrower information (name, type, SSN, etc.)
+            shared_blocks: Optional prebuilt _build_shared_blocks output for this
+                           document and context (skips re-serializing them)
             
-            return result
-            
-        except json.JSONDecodeError as e:
-            print(f"\n❌ ERROR: Failed to parse LLM response as JSON")
-            print(f"Exception: {str(e)}")
-            print(f"Response length: {len(response_text)} characters")
-            print(f"Raw response (first 500 chars): {response_text[:500]}")
-            print(f"Raw response (last 500 chars): {response_text[-500:]}")
-            
-            # Try to identify if response was truncated
-            if not response_text.rstrip().endswith('}'):
-                print(f"⚠ WARNING: Response appears to be truncated (doesn't end with '}}' )")
-                print(f"  This usually means max_tokens is too low for the number of conditions being checked.")
-                print(f"  Current conditions: {len(condition_ids)}")
-                print(f"  Suggestion: Reduce number of conditions or increase max_tokens parameter")
-            
-            return {
-                "error": "Failed to parse LLM response as JSON",
-                "raw_response": response_text,
-                "exception": str(e),
-                "response_length": len(response_text),
-                "appears_truncated": not response_text.rstrip().endswith('}')
-            }
-        except Exception as e:
-            print(f"\n❌ ERROR: API call failed")
-            print(f"Exception: {str(e)}")
-            import traceback
-            traceback.print_exc()
-            return {
-                "error": "API call failed",
-                "exception": str(e)
-            }
+        Returns:
+            Dict with evaluation results for each condition
+        """
+        if not condition_ids:
+            return self._skipped_result()
+        
+        prompt = self._build_user_prompt(
+            document_data, condition_ids, additional_context, loan_program, borrower_info, shared_blocks
+        )
+        
+        try:
+            # Make API call with prompt caching (streamed: long responses outlast the read timeout)
+            response = create_message(self.client, stream=True, **self._message_params(prompt, condition_ids, max_tokens))
+        except APIError as e:
+            return self._api_error(e)
+        return self._parse_response(response, condition_ids)
+    
+    async def check_document_async(
+        self, 
+        document_data, 
+        condition_ids: List[str],
+        max_tokens: int = 8000,
+        additional_context: Optional[List[Dict[str, Any]]] = None,
+        loan_program: Optional[str] = None,
+        borrower_info: Optional[Dict[str, Any]] = None,
+        shared_blocks: Optional[Tuple[str, str]] = None
+    ) -> Dict[str, Any]:
+        """
+        Async version of check_document (same arguments and result).
+        
+        Use with asyncio.gather to check several documents or condition
+        chunks concurrently instead of one request after another.
+        """
+        if not condition_ids:
+            return self._skipped_result()
+        
+        prompt = self._build_user_prompt(
+            document_data, condition_ids, additional_context, loan_program, borrower_info, shared_blocks
+        )
+        
+        try:
+            response = await create_message_async(
+                self.async_client, stream=True, **self._message_params(prompt, condition_ids, max_tokens)
+            )
+        except APIError as e:
+            return self._api_error(e)
+        return self._parse_response(response, condition_ids)
     
     def check_document_batch(
         self,
         document_data: Dict[str, Any],
         batch_size: int = 10,
-        additional_context: Optional[List[Dict[str, Any]]] = None
+        additional_context: Optional[List[Dict[str, Any]]] = None,
+        seen: Optional[Set[str]] = None
     ) -> List[Dict[str, Any]]:
         """
         Check document against ALL conditions in batches.
         
+        Batches are sent concurrently (see acheck_document_batch). When called
+        from inside a running event loop, falls back to one batch at a time;
+        await acheck_document_batch there instead.
+        
         Args:
             document_data: Document JSON
             batch_size: Number of conditions to check per API call
             additional_context: Optional context from step 3 (ranked requirements with connected nodes)
+            seen: Optional condition IDs already evaluated; they are left out of the batches
             
         Returns:
             List of all evaluation results
         """
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            # Own loop and async client, closed when the batches are done
+            return run_async(self.acheck_document_batch(document_data, batch_size, additional_context, seen))
+        
+        all_results = []
+        shared_blocks = self._build_shared_blocks(document_data, additional_context)
+        for batch in self._condition_batches(batch_size, seen):
+            result = self.check_document(document_data, batch, shared_blocks=shared_blocks)
+            all_results.extend(self._batch_results(result))
+        return all_results
+    
+    async def acheck_document_batch(
+        self,
+        document_data: Dict[str, Any],
+        batch_size: int = 10,
+        additional_context: Optional[List[Dict[str, Any]]] = None,
+        seen: Optional[Set[str]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Async check_document_batch: batches run concurrently.
+        
+        The first batch runs alone so it writes the prompt cache (instructions,
+        context and document are the same for every batch); the rest then run
+        together and all read from it instead of racing to write it.
+        In-flight requests are capped by anthropic_rate_limit (ANTHROPIC_MAX_CONCURRENT).
+        """
+        batches = self._condition_batches(batch_size, seen)
+        if not batches:
+            return []
+        
+        # Serialize the document and context once for all batches
+        shared_blocks = self._build_shared_blocks(document_data, additional_context)
+        first = await self.check_document_async(document_data, batches[0], shared_blocks=shared_blocks)
+        rest = await asyncio.gather(*[
+            self.check_document_async(document_data, batch, shared_blocks=shared_blocks)
+            for batch in batches[1:]
+        ])
+        
         all_results = []
-        condition_ids = self.conditions_df['Title'].tolist()
+        for result in [first, *rest]:
+            all_results.extend(self._batch_results(result))
+        
+        # With a warm cache only the first batch should write it
+        cache_writes = [r.get('_metadata', {}).get('cache_creation_tokens') or 0 for r in [first, *rest]]
+        logger.info("Cache writes: %d tokens in %d of %d batches", sum(cache_writes), sum(1 for t in cache_writes if t), len(batches))
+        return all_results
+    
+    def check_documents_bulk(
+        self,
+        documents: List[Any],
+        condition_ids: List[str],
+        max_tokens: int = 8000,
+        additional_context: Optional[List[Dict[str, Any]]] = None,
+        loan_program: Optional[str] = None,
+        borrower_info: Optional[Dict[str, Any]] = None,
+        poll_interval: float = 30.0
+    ) -> List[Dict[str, Any]]:
+        """
+        Check many documents against the same conditions via the Message Batches API.
         
-        print(f"Checking document against {len(condition_ids)} conditions in batches of {batch_size}...")
+        Batches cost half as much as live calls and don't count against the live
+        rate limits, but results can take minutes (up to 24h) to come back, so use
+        this for offline bulk runs. Prompt caching still applies within the batch.
         
-        for i in range(0, len(condition_ids), batch_size):
-            batch = condition_ids[i:i+batch_size]
-            print(f"Processing batch {i//batch_size + 1}/{(len(condition_ids)-1)//batch_size + 1}...")
+        Args:
+            documents: Document data, one entry per request (same shape as check_document's document_data)
+            condition_ids, max_tokens, additional_context, loan_program, borrower_info: As for check_document
+            poll_interval: Seconds between batch status checks
             
-            result = self.check_document(document_data, batch, additional_context=additional_context)
+        Returns:
+            One result per document, in input order (same shape as check_document)
+        """
+        if not condition_ids:
+            return [self._skipped_result() for _ in documents]
+        if not documents:
+            return []
+        
+        requests = []
+        extra_headers = None
+        # Context and request are the same for every document, so render them once
+        context_block = self._build_context_block(additional_context, loan_program, borrower_info)
+        request_block = self._build_request_block(condition_ids)
+        for idx, document_data in enumerate(documents):
+            prompt = (context_block, self._build_document_block(document_data), request_block)
+            params = self._message_params(prompt, condition_ids, max_tokens)
+            extra_headers = params.pop('extra_headers')  # Sent once, on the batch request
+            requests.append({"custom_id": f"doc-{idx}", "params": params})
+        
+        try:
+            batch = self.client.messages.batches.create(requests=requests, extra_headers=extra_headers)
+            logger.info("Submitted message batch %s (%d documents)", batch.id, len(requests))
+            while batch.processing_status != "ended":
+                time.sleep(poll_interval)
+                batch = self.client.messages.batches.retrieve(batch.id)
+            logger.info("Message batch %s ended: %s", batch.id, batch.request_counts)
             
-            if "results" in result:
-                all_results.extend(result["results"])
-            else:
-                print(f"Warning: Batch failed - {result.get('error', 'Unknown error')}")
+            results: List[Optional[Dict[str, Any]]] = [None] * len(documents)
+            for entry in self.client.messages.batches.results(batch.id):
+                idx = int(entry.custom_id.split('-', 1)[1])
+                if entry.result.type == "succeeded":
+                    results[idx] = self._parse_response(entry.result.message, condition_ids)
+                else:
+                    error = getattr(entry.result, 'error', None)
+                    results[idx] = {
+                        "error": f"Batch request {entry.result.type}",
+                        "exception": str(error) if error is not None else entry.result.type
+                    }
+        except APIError as e:
+            return [self._api_error(e) for _ in documents]
         
-        return all_results
+        return [
+            r if r is not None else {"error": "Batch request missing from results"}
+            for r in results
+        ]
+    
+    def _condition_batches(self, batch_size: int, seen: Optional[Set[str]] = None) -> List[List[str]]:
+        condition_ids = [title for title in self._titles if not seen or title not in seen]
+        logger.info("Checking document against %d conditions in batches of %d...", len(condition_ids), batch_size)
+        return [condition_ids[i:i+batch_size] for i in range(0, len(condition_ids), batch_size)]
+    
+    @staticmethod
+    def _batch_results(result: Dict[str, Any]) -> List[Dict[str, Any]]:
+        if "results" in result:
+            return result["results"]
+        logger.warning("Warning: Batch failed - %s", result.get('error', 'Unknown error'))
+        return []
+    
+    def compact_document(
+        self,
+        document: Dict[str, Any],
+        condition_ids: List[str],
+        soft_limit: int = PROMPT_SOFT_LIMIT
+    ) -> Dict[str, Any]:
+        """
+        Shrink a document before sending it to Claude.
+        
+        Keeps only extracted_entities whose field name appears in the selected
+        conditions' text (title, description, suggested data elements), drops
+        entities with confidence below CONF_T, and if the result is still over
+        soft_limit characters of JSON, removes source_doc provenance and rounds
+        confidences. Documents without extracted_entities are returned as-is.
+        
+        Args:
+            document: Document dict ({classification, extracted_entities, ...})
+            condition_ids: Condition titles the document will be checked against
+            soft_limit: JSON size (characters) above which provenance is dropped
+            
+        Returns:
+            Compacted copy of the document
+        """
+        entities = document.get('extracted_entities')
+        if not isinstance(entities, dict):
+            return document
+        
+        rows = self.conditions_df[self.conditions_df['Title'].isin(condition_ids)]
+        condition_text = ' '.join(
+            str(value).lower()
+            for column in ('Title', 'Description', 'Suggested Data Elements')
+            if column in rows.columns
+            for value in rows[column].dropna()
+        )
+        
+        kept = {}
+        for field, value in entities.items():
+            # Same substring match filter_by_classification uses for fields
+            if condition_text and field.lower() not in condition_text:
+                continue
+            if isinstance(value, dict) and isinstance(value.get('confidence'), (int, float)):
+                if value['confidence'] < CONF_T:
+                    continue
+            kept[field] = value
+        
+        compacted = {**document, 'extracted_entities': kept}
+        if len(json.dumps(compacted)) > soft_limit:
+            compacted = _strip_provenance(compacted)
+        return compacted
     
     def get_condition_by_title(self, title: str) -> Optional[Dict[str, Any]]:
         """Get full condition details by title."""
-        matches = self.conditions_df[self.conditions_df['Title'] == title]
-        if len(matches) > 0:
-            return matches.iloc[0].to_dict()
-        return None
+        row = self._title_to_row.get(title)
+        return dict(row) if row is not None else None
     
     def search_conditions(self, keyword: str) -> pd.DataFrame:
         """Search conditions by keyword in title or description."""
-        mask = (
-            self.conditions_df['Title'].str.contains(keyword, case=False, na=False) |
-            self.conditions_df['Description'].str.contains(keyword, case=False, na=False)
-        )
-        return self.conditions_df[mask]
+        pattern = re.compile(keyword, re.IGNORECASE)
+        descriptions = self._descriptions or [''] * len(self._titles)
+        rows = [
+            i for i, (title, description) in enumerate(zip(self._titles, descriptions))
+            if pattern.search(title) or pattern.search(description)
+        ]
+        return self.conditions_df.iloc[rows]
     
     def filter_by_classification(
         self, 
@@ -459,62 +999,63 @@ Do NOT include confidence scores - focus only on clear deficiency detection.
             loan_program: Optional loan program name for additional filtering context
             
         Returns:
-            DataFrame of matching conditions
+            DataFrame of matching conditions (cached per classification + field set;
+            treat it as read-only)
         """
+        key = (classification, frozenset(document_fields or ()), loan_program)
+        cached = self._filter_cache.get(key)
+        if cached is not None:
+            return cached
+        
+        matching = self._filter_by_classification(classification, document_fields, loan_program)
+        if len(self._filter_cache) >= FILTER_CACHE_SIZE:
+            self._filter_cache.pop(next(iter(self._filter_cache)))  # Drop the oldest entry
+        self._filter_cache[key] = matching
+        return matching
+    
+    def _filter_by_classification(
+        self,
+        classification: str,
+        document_fields: Optional[List[str]],
+        loan_program: Optional[str]
+    ) -> pd.DataFrame:
+        """Uncached filter_by_classification."""
         if 'Related documents' not in self.conditions_df.columns:
-            print(f"Warning: 'Related documents' column not found")
+            logger.warning("Warning: 'Related documents' column not found")
             return pd.DataFrame()
         
         # Step 1: Filter by classification in Related documents
-        classification_mask = self.conditions_df['Related documents'].fillna('').str.contains(
-            classification,
-            case=False,
-            na=False
-        )
-        classification_matches = self.conditions_df[classification_mask]
+        # (row positions from the term index; the DataFrame is only sliced for the result)
+        rows = sorted(self._rows_containing('related', classification))
+        classification_matches = self.conditions_df.iloc[rows]
         
         # If no document fields provided, return classification matches only
         if not document_fields or 'Suggested Data Elements' not in self.conditions_df.columns:
             if len(classification_matches) > 0:
-                print(f"✓ Found {len(classification_matches)} conditions (classification only)")
+                logger.info("✓ Found %d conditions (classification only)", len(classification_matches))
             return classification_matches
         
         # Step 2: Filter classification matches by field presence
         # Only keep conditions that ALSO have at least one matching field
-        final_mask = pd.Series([False] * len(classification_matches), index=classification_matches.index)
-        
-        for idx, row in classification_matches.iterrows():
-            suggested_elements = str(row.get('Suggested Data Elements', '')).lower()
-            
-            # Check if ANY document field appears in suggested data elements
-            for field in document_fields:
-                if field.lower() in suggested_elements:
-                    final_mask[idx] = True
-                    break  # Found at least one field match, include this condition
+        field_rows = set().union(*(self._rows_containing('suggested', field) for field in document_fields))
         
         # Apply the field filter to classification matches (INTERSECTION)
-        matching = classification_matches[final_mask]
+        matching = self.conditions_df.iloc[[i for i in rows if i in field_rows]]
         
         if len(matching) > 0:
             if loan_program:
-                print(f"✓ Found {len(matching)} conditions (classification + field match) for loan program '{loan_program}'")
+                logger.info("✓ Found %d conditions (classification + field match) for loan program '%s'", len(matching), loan_program)
             else:
-                print(f"✓ Found {len(matching)} conditions (classification + field match)")
+                logger.info("✓ Found %d conditions (classification + field match)", len(matching))
             return matching
         
         # If no matches with both criteria, try "All Docs" fallback
-        print(f"Note: No conditions matched both classification '{classification}' AND document fields")
+        logger.info("Note: No conditions matched both classification '%s' AND document fields", classification)
         
-        fallback_mask = self.conditions_df['Related documents'].fillna('').str.contains(
-            r'all\s+doc',  # Matches "All Docs", "All Documents", etc.
-            case=False,
-            regex=True,
-            na=False
-        )
-        matching = self.conditions_df[fallback_mask]
+        matching = self.conditions_df.iloc[self._all_docs_rows]
         
         if len(matching) > 0:
-            print(f"Using {len(matching)} universal 'All Docs' conditions as fallback")
+            logger.info("Using %d universal 'All Docs' conditions as fallback", len(matching))
         
         return matching
 
@@ -551,7 +1092,7 @@ def format_results_summary(results: List[Dict[str, Any]]) -> str:
             summary += f"   Reasoning: {result['reasoning']}\n"
             
             if result.get('deficiencies'):
-                summary += f"   Issues:\n"
+                summary += "   Issues:\n"
                 for deficiency in result['deficiencies']:
                     summary += f"   • {deficiency['requirement']}\n"
                     summary += f"     Problem: {deficiency['issue']}\n"
@@ -571,7 +1112,7 @@ if __name__ == "__main__":
     
     print(f"Loading sample document from: {sample_doc_path}")
     try:
-        with open(sample_doc_path, "r") as f:
+        with open(sample_doc_path) as f:
             SAMPLE_DOC = json.load(f)
         print(f"✓ Loaded document with classification: {SAMPLE_DOC.get('classification', 'N/A')}")
     except FileNotFoundError:
@@ -594,7 +1135,7 @@ if __name__ == "__main__":
     print("="*80 + "\n")
     
     # Filter conditions based on document classification AND extracted fields
-    print(f"Filtering conditions based on:")
+    print("Filtering conditions based on:")
     print(f"  - Classification: '{doc_classification}'")
     
     # Extract field names from extracted_entities
@@ -610,7 +1151,7 @@ if __name__ == "__main__":
         conditions_to_check = matching_conditions['Title'].tolist()
         print(f"Conditions: {conditions_to_check[:5]}{'...' if len(conditions_to_check) > 5 else ''}\n")
     else:
-        print(f"⚠ No conditions found (including 'All Docs' fallback)")
+        print("⚠ No conditions found (including 'All Docs' fallback)")
         print("Using first 3 conditions for testing purposes...\n")
         conditions_to_check = detector.conditions_df['Title'].head(3).tolist()
     
@@ -618,7 +1159,7 @@ if __name__ == "__main__":
     
     # Print results
     if "results" in result:
-        print(json.dumps(result, indent=2))
+        print(_dumps(result))
         print("\n" + format_results_summary(result["results"]))
         
         # Print token usage
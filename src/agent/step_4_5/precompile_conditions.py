@@ -0,0 +1,35 @@
+"""
+Pre-parse the conditions CSV so LLMDeficiencyDetector can skip CSV parsing at startup.
+
+Writes <csv name>.parquet next to the CSV (when pyarrow or fastparquet is
+installed), otherwise <csv name>.pkl. The detector uses the cache only while
+it is at least as new as the CSV, so re-run this after editing the CSV.
+
+Usage:
+    python precompile_conditions.py [path/to/conditions.csv]
+"""
+
+import sys
+
+import pandas as pd
+from llm_deficiency_detector import conditions_cache_paths
+
+DEFAULT_CSV_PATH = "../merged_conditions_with_related_docs__FULL_filtered_simple.csv"
+
+
+def precompile(csv_path: str) -> str:
+    """Parse csv_path once and write the cache; returns the cache path."""
+    df = pd.read_csv(csv_path)
+    parquet_path, pickle_path = conditions_cache_paths(csv_path)
+    try:
+        df.to_parquet(parquet_path, index=False)
+        return parquet_path
+    except ImportError:
+        df.to_pickle(pickle_path)
+        return pickle_path
+
+
+if __name__ == "__main__":
+    csv_path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_CSV_PATH
+    cache_path = precompile(csv_path)
+    print(f"✓ Wrote {cache_path}")
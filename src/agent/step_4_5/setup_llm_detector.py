@@ -1,13 +1,40 @@
 """
 Interactive setup script for LLM Deficiency Detector
 """
-from dotenv import load_dotenv
 import os
 import sys
+from importlib.util import find_spec
+
+from env_init import init_env
+
+# (pip package, import name) for each dependency setup() checks
+REQUIRED_PACKAGES = (
+    ("anthropic", "anthropic"),
+    ("pandas", "pandas"),
+    ("python-dotenv", "dotenv"),
+)
+
+
+def count_lines(path: str, chunk_size: int = 1 << 20) -> int:
+    """Count lines in a file by scanning 1 MB binary chunks for newlines."""
+    lines = 0
+    last = b"\n"
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            lines += chunk.count(b"\n")
+            last = chunk[-1:]
+    # A final line without a trailing newline still counts
+    return lines + (last != b"\n")
 
-load_dotenv()
 
 def setup():
+    # Load .env here rather than at import, so a missing python-dotenv is
+    # reported by the dependency check below instead of crashing the wizard
+    try:
+        init_env()
+    except ImportError:
+        pass
+    
     print("="*80)
     print("LLM DEFICIENCY DETECTOR - SETUP WIZARD")
     print("="*80)
@@ -15,19 +42,20 @@ def setup():
     
     # Check if .env exists (in parent directory)
     env_path = "../.env"
-    if os.path.exists(env_path):
-        print(f"✓ .env file already exists at {env_path}")
-        with open(env_path, "r") as f:
-            content = f.read()
-            if "ANTHROPIC_API_KEY" in content and "your_api_key" not in content:
-                print("✓ ANTHROPIC_API_KEY appears to be configured")
-                env_ok = True
-            else:
-                print("⚠ ANTHROPIC_API_KEY not configured in .env")
-                env_ok = False
-    else:
+    try:
+        with open(env_path, "rb") as f:
+            content = f.read()  # Bytes: the key check needs no decoding
+    except FileNotFoundError:
         print("✗ .env file not found")
         env_ok = False
+    else:
+        print(f"✓ .env file already exists at {env_path}")
+        if b"ANTHROPIC_API_KEY" in content and b"your_api_key" not in content:
+            print("✓ ANTHROPIC_API_KEY appears to be configured")
+            env_ok = True
+        else:
+            print("⚠ ANTHROPIC_API_KEY not configured in .env")
+            env_ok = False
     
     if not env_ok:
         print()
@@ -59,15 +87,15 @@ def setup():
     
     # Check if CSV exists
     csv_path = "../merged_conditions_with_related_docs__FULL_filtered_simple.csv"
-    if os.path.exists(csv_path):
+    csv_exists = os.path.exists(csv_path)  # Reused by the status checks below
+    if csv_exists:
         print(f"✓ Conditions CSV found: {csv_path}")
         
         # Try to count lines
         try:
-            with open(csv_path, "r", encoding="utf-8") as f:
-                line_count = sum(1 for _ in f) - 1  # Subtract header
+            line_count = count_lines(csv_path) - 1  # Subtract header
             print(f"  Contains {line_count} conditions")
-        except:
+        except OSError:
             print("  (Unable to count conditions)")
     else:
         print(f"✗ Conditions CSV not found: {csv_path}")
@@ -81,26 +109,13 @@ def setup():
     
     missing_deps = []
     
-    try:
-        import anthropic
-        print("✓ anthropic package installed")
-    except ImportError:
-        print("✗ anthropic package not installed")
-        missing_deps.append("anthropic")
-    
-    try:
-        import pandas
-        print("✓ pandas package installed")
-    except ImportError:
-        print("✗ pandas package not installed")
-        missing_deps.append("pandas")
-    
-    try:
-        from dotenv import load_dotenv
-        print("✓ python-dotenv package installed")
-    except ImportError:
-        print("✗ python-dotenv package not installed")
-        missing_deps.append("python-dotenv")
+    # find_spec only locates each package; importing pandas just to check would take hundreds of ms
+    for package, module in REQUIRED_PACKAGES:
+        if find_spec(module) is not None:
+            print(f"✓ {package} package installed")
+        else:
+            print(f"✗ {package} package not installed")
+            missing_deps.append(package)
     
     if missing_deps:
         print()
@@ -111,10 +126,11 @@ def setup():
         if response == 'y':
             import subprocess
             print("Installing...")
-            try:
-                subprocess.check_call([sys.executable, "-m", "pip", "install"] + missing_deps)
+            # pip's output goes straight to the terminal (live progress)
+            result = subprocess.run([sys.executable, "-m", "pip", "install", *missing_deps], check=False)
+            if result.returncode == 0:
                 print("✓ Dependencies installed successfully!")
-            except:
+            else:
                 print("✗ Installation failed. Try manually:")
                 print(f"  pip install {' '.join(missing_deps)}")
     
@@ -131,7 +147,7 @@ def setup():
         print("✗ API Key not configured")
         all_ok = False
     
-    if os.path.exists(csv_path):
+    if csv_exists:
         print("✓ Conditions CSV present")
     else:
         print("✗ Conditions CSV missing")
@@ -161,7 +177,7 @@ def setup():
         print("Quick fixes:")
         if not env_ok:
             print("  • Add API key to .env file")
-        if not os.path.exists(csv_path):
+        if not csv_exists:
             print(f"  • Add {csv_path} to this directory")
         if missing_deps:
             print("  • Run: pip install -r requirements.txt")
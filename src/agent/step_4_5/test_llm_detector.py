@@ -3,21 +3,56 @@ Quick test script for the LLM-based deficiency detector.
 """
 
 import json
-from llm_deficiency_detector import LLMDeficiencyDetector, format_results_summary
-from dotenv import load_dotenv
 import os
+from functools import lru_cache
 
-# Load .env from parent directory
-load_dotenv("../.env")
-load_dotenv()  # Also try current directory
+from env_init import init_env
+from llm_deficiency_detector import (
+    CATALOG_COLUMNS,
+    LLMDeficiencyDetector,
+    conditions_cache_paths,
+)
+from precompile_conditions import precompile
+
+try:
+    import orjson  # Optional: faster JSON parsing/serialization
+except ImportError:
+    orjson = None
+
+# Load .env (parent directory or current directory) once per process
+init_env()
+
+CONDITIONS_CSV_PATH = "../merged_conditions_with_related_docs__FULL_filtered_simple.csv"
+
+
+@lru_cache(maxsize=2)
+def _build_detector(csv_path: str) -> LLMDeficiencyDetector:
+    """
+    One detector per CSV per process. The first run also writes the
+    pre-parsed conditions cache (see precompile_conditions.py) when it's
+    missing or older than the CSV, so later runs skip parsing the CSV.
+    """
+    csv_mtime = os.path.getmtime(csv_path)
+    if not any(
+        os.path.exists(path) and os.path.getmtime(path) >= csv_mtime
+        for path in conditions_cache_paths(csv_path)
+    ):
+        try:
+            precompile(csv_path)
+        except OSError as e:
+            print(f"⚠ Could not write conditions cache ({e}); parsing the CSV each run")
+    # Only the columns the detector reads; the rest of the CSV is never parsed
+    return LLMDeficiencyDetector(conditions_csv_path=csv_path, columns=CATALOG_COLUMNS)
 
 # Load sample document from file
 def load_sample_document():
     """Load sample document from JSON file."""
     sample_path = "../sample_doc_input.json"
     try:
-        with open(sample_path, "r") as f:
-            doc = json.load(f)
+        with open(sample_path, "rb") as f:
+            data = f.read()
+        # orjson.JSONDecodeError subclasses json.JSONDecodeError, so the handler below covers both
+        doc = orjson.loads(data) if orjson is not None else json.loads(data)
         print(f"✓ Loaded sample document from {sample_path}")
         if "classification" in doc:
             print(f"  Document type: {doc['classification']}")
@@ -58,9 +93,7 @@ def main():
     
     # Initialize detector
     print("Initializing detector...")
-    detector = LLMDeficiencyDetector(
-        conditions_csv_path="../merged_conditions_with_related_docs__FULL_filtered_simple.csv"
-    )
+    detector = _build_detector(CONDITIONS_CSV_PATH)
     print(f"✓ Loaded {len(detector.conditions_df)} conditions\n")
     
     # Test 1: Filter conditions based on document classification AND fields
@@ -76,7 +109,7 @@ def main():
         document_fields = list(sample_doc["extracted_entities"].keys())
         print(f"Document fields: {document_fields[:10]}{'...' if len(document_fields) > 10 else ''}")
     
-    print(f"\nSearching for matches in 'Related documents' and 'Suggested Data Elements'...\n")
+    print("\nSearching for matches in 'Related documents' and 'Suggested Data Elements'...\n")
     
     # Find conditions based on classification AND fields
     matching_conditions = detector.filter_by_classification(doc_classification, document_fields)
@@ -90,11 +123,11 @@ def main():
             print(f"  Checking first 5 of {len(sample_conditions)} matches")
             sample_conditions = sample_conditions[:5]
         
-        print(f"\nConditions to check:")
+        print("\nConditions to check:")
         for i, cond in enumerate(sample_conditions, 1):
             print(f"  {i}. {cond}")
     else:
-        print(f"⚠ No conditions found (including 'All Docs' fallback)")
+        print("⚠ No conditions found (including 'All Docs' fallback)")
         print("  Using first 3 conditions for testing")
         sample_conditions = detector.conditions_df['Title'].head(3).tolist()
     
@@ -131,40 +164,49 @@ def main():
         return
     
     if "results" in result:
-        print("\n📊 RESULTS:")
+        # Build the report first and print it in one write
+        lines = ["\n📊 RESULTS:"]
         for r in result["results"]:
             status_icon = "✅" if r["status"] == "satisfied" else "❌" if r["status"] == "deficient" else "⊘"
-            print(f"\n{status_icon} {r['condition_id']}")
-            print(f"   Status: {r['status'].upper()}")
+            lines.append(f"\n{status_icon} {r['condition_id']}")
+            lines.append(f"   Status: {r['status'].upper()}")
             if r.get('related_documents'):
-                print(f"   Related Documents: {r['related_documents']}")
-            print(f"   Reasoning: {r['reasoning'][:100]}..." if len(r['reasoning']) > 100 else f"   Reasoning: {r['reasoning']}")
+                lines.append(f"   Related Documents: {r['related_documents']}")
+            lines.append(f"   Reasoning: {r['reasoning'][:100]}..." if len(r['reasoning']) > 100 else f"   Reasoning: {r['reasoning']}")
             
             if r.get('deficiencies'):
-                print(f"   Deficiencies found:")
+                lines.append("   Deficiencies found:")
                 for d in r['deficiencies']:
-                    print(f"      • {d['requirement']}: {d['issue']}")
+                    lines.append(f"      • {d['requirement']}: {d['issue']}")
         
-        # Print usage stats
+        # Usage stats
         if "_metadata" in result:
             meta = result["_metadata"]
-            print("\n" + "="*80)
-            print("💰 API USAGE:")
-            print(f"   Input tokens: {meta['input_tokens']:,}")
-            print(f"   Output tokens: {meta['output_tokens']:,}")
-            print(f"   Cache read: {meta['cache_read_tokens']:,}")
-            print(f"   Cache creation: {meta['cache_creation_tokens']:,}")
+            lines.append("\n" + "="*80)
+            lines.append("💰 API USAGE:")
+            lines.append(f"   Input tokens: {meta['input_tokens']:,}")
+            lines.append(f"   Output tokens: {meta['output_tokens']:,}")
+            lines.append(f"   Cache read: {meta['cache_read_tokens']:,}")
+            lines.append(f"   Cache creation: {meta['cache_creation_tokens']:,}")
             
             if meta['cache_read_tokens'] > 0:
-                savings = (meta['cache_read_tokens'] * 0.9) / (meta['input_tokens'] if meta['input_tokens'] > 0 else 1)
-                print(f"\n   ✅ Cache HIT! Estimated {savings:.0%} cost savings")
+                savings = (meta['cache_read_tokens'] * 0.9) / max(meta['input_tokens'], 1)
+                lines.append(f"\n   ✅ Cache HIT! Estimated {savings:.0%} cost savings")
             elif meta['cache_creation_tokens'] > 0:
-                print(f"\n   📝 Cache CREATED - next calls will be 90% cheaper!")
+                lines.append("\n   📝 Cache CREATED - next calls will be 90% cheaper!")
+        
+        print("\n".join(lines))
         
         # Save full results to file
-        with open("test_results.json", "w") as f:
-            json.dump(result, f, indent=2)
-        print(f"\n💾 Full results saved to test_results.json")
+        # Written to a temp file and renamed into place, so readers never see a partial file
+        if orjson is not None:
+            with open("test_results.json.tmp", "wb") as f:
+                f.write(orjson.dumps(result, option=orjson.OPT_INDENT_2))
+        else:
+            with open("test_results.json.tmp", "w") as f:
+                json.dump(result, f, indent=2)
+        os.replace("test_results.json.tmp", "test_results.json")
+        print("\n💾 Full results saved to test_results.json")
         
     else:
         print(f"\n❌ ERROR: {result.get('error')}")
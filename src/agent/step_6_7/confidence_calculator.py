@@ -10,50 +10,285 @@ Calculates detection confidence based on evidence quality metrics:
 """
 
 import json
-from typing import Dict, Any, List
+import os
+import re
+from bisect import bisect_right
+from dataclasses import asdict, astuple, dataclass
+from functools import lru_cache
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple, Union
 
+import numpy as np
 
-def calculate_detection_confidence(deficiency_result: Dict[str, Any], config: Dict[str, Any]) -> Dict[str, Any]:
+# Fields every listed deficiency should fill in (see score_evidence_completeness)
+_REQUIRED_FIELDS = ("requirement", "issue", "field_checked", "evidence")
+
+# Keyword groups as single-pass patterns (each scans the text once instead of once per keyword)
+# Any of ".", "[", "]", "_", "line", "schedule", "form" marks a specific field reference
+_SPECIFIC_RE = re.compile(r"[.\[\]_]|line|schedule|form")
+# Lookahead so overlapping indicators are all found, as with separate substring checks
+_STRUCTURE_RE = re.compile(r"(?=(because|since|therefore|however|should|must|would))")
+
+# Reasoning length ladder: <50 chars 0.3, <150 0.5, <300 0.7, else 1.0 (looked up with bisect_right)
+_LENGTH_BOUNDS = (50, 150, 300)
+_LENGTH_SCORES = (0.3, 0.5, 0.7, 1.0)
+
+
+@dataclass(frozen=True)
+class DetectionWeights:
+    """detection_confidence_weights from the scoring config."""
+    evidence_completeness: float
+    deficiency_count: float
+    field_specificity: float
+    evidence_type: float
+    reasoning_quality: float
+
+
+@dataclass(frozen=True)
+class EvidenceTypeScores:
+    """evidence_type_scores from the scoring config."""
+    wrong_value: float
+    invalid_format: float
+    missing_required: float
+    empty_array: float
+    unclear: float
+
+
+@dataclass(frozen=True)
+class DeficiencyCountScores:
+    """deficiency_count_scores from the scoring config ("1", "2" and "3+")."""
+    one: float
+    two: float
+    three_plus: float
+
+
+@dataclass(frozen=True)
+class ScoringConfig:
+    """
+    Parsed scoring_config.json. The scorers read it by attribute; use
+    as_dict() where the original JSON layout is needed (e.g. priority_evaluator).
+    """
+    weights: DetectionWeights
+    priority_score_weights: Dict[str, float]
+    evidence_type_scores: EvidenceTypeScores
+    missing_keywords: Tuple[str, ...]
+    wrong_keywords: Tuple[str, ...]
+    deficiency_count_scores: DeficiencyCountScores
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ScoringConfig":
+        counts = data["deficiency_count_scores"]
+        return cls(
+            weights=DetectionWeights(**data["detection_confidence_weights"]),
+            priority_score_weights=dict(data["priority_score_weights"]),
+            evidence_type_scores=EvidenceTypeScores(**data["evidence_type_scores"]),
+            missing_keywords=tuple(data["evidence_type_keywords"]["missing"]),
+            wrong_keywords=tuple(data["evidence_type_keywords"]["wrong"]),
+            deficiency_count_scores=DeficiencyCountScores(counts["1"], counts["2"], counts["3+"])
+        )
+    
+    def as_dict(self) -> Dict[str, Any]:
+        """The config in scoring_config.json's layout."""
+        weights, scores, counts = self.weights, self.evidence_type_scores, self.deficiency_count_scores
+        return {
+            "detection_confidence_weights": asdict(weights),
+            "priority_score_weights": dict(self.priority_score_weights),
+            "evidence_type_scores": asdict(scores),
+            "evidence_type_keywords": {
+                "missing": list(self.missing_keywords),
+                "wrong": list(self.wrong_keywords)
+            },
+            "deficiency_count_scores": {"1": counts.one, "2": counts.two, "3+": counts.three_plus}
+        }
+
+
+# Scorers also accept the plain JSON dict, as they did before ScoringConfig
+ConfigLike = Union[ScoringConfig, Dict[str, Any]]
+
+
+def _scoring_config(config: ConfigLike) -> ScoringConfig:
+    return ScoringConfig.from_dict(config) if isinstance(config, dict) else config
+
+
+@lru_cache(maxsize=32)
+def _keyword_pattern(keywords: Tuple[str, ...]) -> "re.Pattern[str]":
+    """Pattern matching any of the (lowercased) keywords as a substring."""
+    return re.compile("|".join(re.escape(keyword.lower()) for keyword in keywords))
+
+
+def calculate_detection_confidence(
+    deficiency_result: Dict[str, Any],
+    config: ConfigLike,
+    return_breakdown: bool = True
+) -> Union[Dict[str, Any], float]:
     """
     Calculate empirical detection confidence for a deficiency.
     
     Args:
         deficiency_result: Single result from step_4_5 detection
-        config: Configuration dict with weights and scoring rules
+        config: ScoringConfig (or the raw config dict) with weights and scoring rules
+        return_breakdown: False returns just the overall score (see calculate_detection_confidence_fast)
         
     Returns:
         Dict with overall confidence and breakdown of components
     """
-    weights = config["detection_confidence_weights"]
-    
-    # Calculate each component
-    evidence_comp = score_evidence_completeness(deficiency_result)
-    deficiency_count = score_deficiency_count(deficiency_result, config)
-    field_spec = score_field_specificity(deficiency_result)
-    evidence_type = score_evidence_type(deficiency_result, config)
-    reasoning_qual = score_reasoning_quality(deficiency_result)
-    
-    # Weighted average
-    overall = (
-        evidence_comp * weights["evidence_completeness"] +
-        deficiency_count * weights["deficiency_count"] +
-        field_spec * weights["field_specificity"] +
-        evidence_type * weights["evidence_type"] +
-        reasoning_qual * weights["reasoning_quality"]
-    )
+    if not return_breakdown:
+        return calculate_detection_confidence_fast(deficiency_result, config)
+    
+    config = _scoring_config(config)
+    components = _confidence_components(deficiency_result, config)
     
     return {
-        "overall": round(overall, 3),
+        "overall": round(_weighted_confidence(components, config), 3),
         "breakdown": {
-            "evidence_completeness": round(evidence_comp, 3),
-            "deficiency_count_score": round(deficiency_count, 3),
-            "field_specificity": round(field_spec, 3),
-            "evidence_type": round(evidence_type, 3),
-            "reasoning_quality": round(reasoning_qual, 3)
+            name: round(value, 3) for name, value in zip(_BREAKDOWN_KEYS, components)
         }
     }
 
 
+def calculate_detection_confidence_fast(deficiency_result: Dict[str, Any], config: ConfigLike) -> float:
+    """Overall detection confidence only, without building the breakdown (for batch scoring)."""
+    config = _scoring_config(config)
+    return round(_weighted_confidence(_confidence_components(deficiency_result, config), config), 3)
+
+
+def calculate_detection_confidence_batch(
+    deficiency_results: List[Dict[str, Any]],
+    config: ConfigLike,
+    return_breakdown: bool = False
+) -> Union[np.ndarray, Tuple[np.ndarray, np.ndarray]]:
+    """
+    Overall detection confidence for many results at once.
+    
+    The component scores are gathered into an (M x 5) matrix and weighted a
+    column at a time (the same additions, in the same order, as the
+    single-result path, so the sums match calculate_detection_confidence_fast).
+    
+    Returns:
+        Array of M overall scores (rounded to 3 places); with return_breakdown,
+        also the (M x 5) component matrix (columns in _BREAKDOWN_KEYS order)
+    """
+    config = _scoring_config(config)
+    components = np.array(
+        [_confidence_components(result, config) for result in deficiency_results], dtype=float
+    ).reshape(-1, len(_BREAKDOWN_KEYS))
+    weighted = components * _weight_vector(config.weights)
+    total = weighted[:, 0].copy()
+    for column in range(1, weighted.shape[1]):
+        total += weighted[:, column]
+    overall = _round_array(total)
+    
+    if return_breakdown:
+        return overall, _round_array(components)
+    return overall
+
+
+def _round_array(values: np.ndarray) -> np.ndarray:
+    """
+    Round to 3 places exactly like round(x, 3): np.round scales by 1000 first,
+    which rounds ties such as 0.6125 differently from Python's correctly-rounded round().
+    """
+    return np.array([round(value, 3) for value in values.ravel().tolist()], dtype=float).reshape(values.shape)
+
+
+@lru_cache(maxsize=8)
+def _weight_vector(weights: DetectionWeights) -> np.ndarray:
+    """Weights as a read-only vector in _confidence_components order."""
+    vector = np.array(astuple(weights), dtype=float)
+    vector.flags.writeable = False
+    return vector
+
+
+# Breakdown keys, in _confidence_components order
+_BREAKDOWN_KEYS = (
+    "evidence_completeness",
+    "deficiency_count_score",
+    "field_specificity",
+    "evidence_type",
+    "reasoning_quality"
+)
+
+
+def _confidence_components(deficiency_result: Dict[str, Any], config: ScoringConfig) -> Tuple[float, ...]:
+    """The five component scores (one shared pass over the deficiencies, reasoning lowercased once)."""
+    stats = _deficiency_stats(deficiency_result.get("deficiencies", []), config)
+    reasoning = deficiency_result.get("reasoning", "")
+    reasoning_lower = reasoning.lower()
+    return (
+        _evidence_completeness(stats),
+        score_deficiency_count(deficiency_result, config),
+        _field_specificity(deficiency_result, stats),
+        _evidence_type(reasoning_lower, stats, config),
+        _reasoning_quality(reasoning, reasoning_lower)
+    )
+
+
+def _weighted_confidence(components: Tuple[float, ...], config: ScoringConfig) -> float:
+    """Weighted average of the components (unrounded)."""
+    weights = config.weights
+    evidence_comp, deficiency_count, field_spec, evidence_type, reasoning_qual = components
+    return (
+        evidence_comp * weights.evidence_completeness +
+        deficiency_count * weights.deficiency_count +
+        field_spec * weights.field_specificity +
+        evidence_type * weights.evidence_type +
+        reasoning_qual * weights.reasoning_quality
+    )
+
+
+class _DeficiencyStats(NamedTuple):
+    """Per-deficiency tallies shared by the completeness, specificity and evidence-type scores."""
+    count: int
+    present_fields: int           # Non-empty _REQUIRED_FIELDS across all deficiencies
+    field_refs: int               # Deficiencies with a field_checked
+    specific_field_refs: int      # ...whose field_checked looks like a specific path
+    evidence_scores: List[float]  # Evidence-type score per deficiency (empty without config)
+
+
+def _deficiency_stats(deficiencies: List[Dict[str, Any]], config: Optional[ScoringConfig] = None) -> _DeficiencyStats:
+    """Tally everything the deficiency-based scores need in a single pass (evidence types only with config)."""
+    present_fields = field_refs = specific_field_refs = 0
+    evidence_scores: List[float] = []
+    
+    if config is not None:
+        # Compiled once per keyword list; the text they're matched against is lowercased
+        keywords_missing = _keyword_pattern(config.missing_keywords)
+        keywords_wrong = _keyword_pattern(config.wrong_keywords)
+        scores = config.evidence_type_scores
+    
+    for deficiency in deficiencies:
+        get = deficiency.get
+        present_fields += sum(1 for field in _REQUIRED_FIELDS if get(field))
+        
+        field_checked = get("field_checked", "")
+        if field_checked:
+            field_refs += 1
+            # Field paths are normally strings already; only coerce other values
+            field_lower = field_checked.lower() if isinstance(field_checked, str) else str(field_checked).lower()
+            if _SPECIFIC_RE.search(field_lower):
+                specific_field_refs += 1
+        
+        if config is None:
+            continue
+        
+        # One lowered string serves the keyword checks and the "[]" test
+        combined_text = f"{get('issue', '')} {get('evidence', '')}".lower()
+        
+        # Check for missing keywords, then (only if none) for wrong-value keywords
+        is_missing = keywords_missing.search(combined_text) is not None
+        
+        if is_missing and "[]" in combined_text:
+            evidence_scores.append(scores.empty_array)
+        elif is_missing:
+            evidence_scores.append(scores.missing_required)
+        elif keywords_wrong.search(combined_text):
+            evidence_scores.append(scores.wrong_value)
+        else:
+            # Default: assume it's about missing if we can't classify
+            evidence_scores.append(scores.unclear)
+    
+    return _DeficiencyStats(len(deficiencies), present_fields, field_refs, specific_field_refs, evidence_scores)
+
+
 def score_evidence_completeness(deficiency_result: Dict[str, Any]) -> float:
     """
     Check if all deficiencies have complete fields.
@@ -61,25 +296,18 @@ def score_evidence_completeness(deficiency_result: Dict[str, Any]) -> float:
     Returns 1.0 if all deficiencies have requirement, issue, field_checked, and evidence.
     Returns proportional score if some are incomplete.
     """
-    deficiencies = deficiency_result.get("deficiencies", [])
-    
-    if not deficiencies:
+    return _evidence_completeness(_deficiency_stats(deficiency_result.get("deficiencies", [])))
+
+
+def _evidence_completeness(stats: _DeficiencyStats) -> float:
+    if not stats.count:
         # No deficiencies listed means incomplete evidence
         return 0.2
     
-    required_fields = ["requirement", "issue", "field_checked", "evidence"]
-    total_fields = len(deficiencies) * len(required_fields)
-    present_fields = 0
-    
-    for deficiency in deficiencies:
-        for field in required_fields:
-            if field in deficiency and deficiency[field]:
-                present_fields += 1
-    
-    return present_fields / total_fields if total_fields > 0 else 0.0
+    return stats.present_fields / (stats.count * len(_REQUIRED_FIELDS))
 
 
-def score_deficiency_count(deficiency_result: Dict[str, Any], config: Dict[str, Any]) -> float:
+def score_deficiency_count(deficiency_result: Dict[str, Any], config: ConfigLike) -> float:
     """
     More deficiencies found = higher confidence in the detection.
     
@@ -88,16 +316,10 @@ def score_deficiency_count(deficiency_result: Dict[str, Any], config: Dict[str,
     deficiencies = deficiency_result.get("deficiencies", [])
     count = len(deficiencies)
     
-    scores = config["deficiency_count_scores"]
+    scores = _scoring_config(config).deficiency_count_scores
     
-    if count == 0:
-        return 0.3  # Status is deficient but no specific deficiencies listed
-    elif count == 1:
-        return scores["1"]
-    elif count == 2:
-        return scores["2"]
-    else:  # 3 or more
-        return scores["3+"]
+    # 0 (status is deficient but no specific deficiencies listed), 1, 2, 3 or more
+    return (0.3, scores.one, scores.two, scores.three_plus)[min(count, 3)]
 
 
 def score_field_specificity(deficiency_result: Dict[str, Any]) -> float:
@@ -107,30 +329,21 @@ def score_field_specificity(deficiency_result: Dict[str, Any]) -> float:
     Specific field paths (e.g., "scheduleGPartII[].percentageOwned") score higher
     than vague references (e.g., "document", "form").
     """
+    return _field_specificity(deficiency_result, _deficiency_stats(deficiency_result.get("deficiencies", [])))
+
+
+def _field_specificity(deficiency_result: Dict[str, Any], stats: _DeficiencyStats) -> float:
     checked_fields = deficiency_result.get("checked_fields", [])
-    deficiencies = deficiency_result.get("deficiencies", [])
     
-    if not checked_fields and not deficiencies:
+    if not checked_fields and not stats.count:
         return 0.2
     
-    # Count specific field paths
-    specific_indicators = [".", "[", "]", "_", "line", "schedule", "form"]
-    total_refs = len(checked_fields)
-    specific_refs = 0
-    
-    for field in checked_fields:
-        field_str = str(field).lower()
-        if any(indicator in field_str for indicator in specific_indicators):
-            specific_refs += 1
-    
-    # Also check field_checked in deficiencies
-    for deficiency in deficiencies:
-        field_checked = deficiency.get("field_checked", "")
-        if field_checked:
-            total_refs += 1
-            field_str = str(field_checked).lower()
-            if any(indicator in field_str for indicator in specific_indicators):
-                specific_refs += 1
+    # Count specific field paths (plus field_checked in deficiencies, tallied in stats)
+    total_refs = len(checked_fields) + stats.field_refs
+    specific_refs = stats.specific_field_refs + sum(
+        1 for field in checked_fields
+        if _SPECIFIC_RE.search(field.lower() if isinstance(field, str) else str(field).lower())
+    )
     
     if total_refs == 0:
         return 0.3
@@ -146,49 +359,28 @@ def score_field_specificity(deficiency_result: Dict[str, Any]) -> float:
         return 0.4
 
 
-def score_evidence_type(deficiency_result: Dict[str, Any], config: Dict[str, Any]) -> float:
+def score_evidence_type(deficiency_result: Dict[str, Any], config: ConfigLike) -> float:
     """
     Classify evidence as missing data (lower confidence) vs wrong data (higher confidence).
     
     Missing data: empty arrays, null values, not found
     Wrong data: invalid values, incorrect format, mismatches
     """
-    deficiencies = deficiency_result.get("deficiencies", [])
-    reasoning = deficiency_result.get("reasoning", "")
-    
-    if not deficiencies:
+    config = _scoring_config(config)
+    stats = _deficiency_stats(deficiency_result.get("deficiencies", []), config)
+    return _evidence_type(deficiency_result.get("reasoning", "").lower(), stats, config)
+
+
+def _evidence_type(reasoning_lower: str, stats: _DeficiencyStats, config: ScoringConfig) -> float:
+    if not stats.count:
         return 0.3
     
-    keywords_missing = config["evidence_type_keywords"]["missing"]
-    keywords_wrong = config["evidence_type_keywords"]["wrong"]
-    scores_map = config["evidence_type_scores"]
-    
-    evidence_scores = []
-    
-    for deficiency in deficiencies:
-        issue = str(deficiency.get("issue", "")).lower()
-        evidence = str(deficiency.get("evidence", "")).lower()
-        combined_text = issue + " " + evidence
-        
-        # Check for missing keywords
-        is_missing = any(keyword in combined_text for keyword in keywords_missing)
-        is_wrong = any(keyword in keywords_wrong for keyword in keywords_wrong)
-        
-        if is_missing and "[]" in combined_text:
-            evidence_scores.append(scores_map["empty_array"])
-        elif is_missing:
-            evidence_scores.append(scores_map["missing_required"])
-        elif is_wrong:
-            evidence_scores.append(scores_map["wrong_value"])
-        else:
-            # Default: assume it's about missing if we can't classify
-            evidence_scores.append(scores_map["unclear"])
+    evidence_scores = list(stats.evidence_scores)
     
     # Also check reasoning for overall context
-    reasoning_lower = reasoning.lower()
-    if any(keyword in reasoning_lower for keyword in keywords_missing):
+    if _keyword_pattern(config.missing_keywords).search(reasoning_lower):
         # Bias slightly toward missing
-        evidence_scores.append(scores_map["missing_required"])
+        evidence_scores.append(config.evidence_type_scores.missing_required)
     
     return sum(evidence_scores) / len(evidence_scores) if evidence_scores else 0.5
 
@@ -200,35 +392,38 @@ def score_reasoning_quality(deficiency_result: Dict[str, Any]) -> float:
     Longer, more detailed reasoning = higher confidence in the detection.
     """
     reasoning = deficiency_result.get("reasoning", "")
-    
+    return _reasoning_quality(reasoning, reasoning.lower())
+
+
+def _reasoning_quality(reasoning: str, reasoning_lower: str) -> float:
     if not reasoning:
         return 0.1
     
-    length = len(reasoning)
-    
     # Length-based scoring
-    if length < 50:
-        length_score = 0.3
-    elif length < 150:
-        length_score = 0.5
-    elif length < 300:
-        length_score = 0.7
-    else:
-        length_score = 1.0
+    length_score = _LENGTH_SCORES[bisect_right(_LENGTH_BOUNDS, len(reasoning))]
     
     # Check for structured reasoning indicators
-    structure_indicators = ["because", "since", "therefore", "however", "should", "must", "would"]
-    structure_count = sum(1 for indicator in structure_indicators if indicator in reasoning.lower())
+    structure_count = len(set(_STRUCTURE_RE.findall(reasoning_lower)))  # Distinct indicators present
     structure_score = min(structure_count / 3, 1.0)  # Cap at 1.0 with 3+ indicators
     
     # Combine length and structure (70% length, 30% structure)
     return (length_score * 0.7) + (structure_score * 0.3)
 
 
-def load_config(config_path: str) -> Dict[str, Any]:
-    """Load scoring configuration from JSON file."""
-    with open(config_path, 'r') as f:
-        return json.load(f)
+def load_config(config_path: str) -> ScoringConfig:
+    """
+    Load scoring configuration from JSON file.
+    
+    Parsed once per file per process into a frozen ScoringConfig shared by
+    every caller (config.as_dict() gives the JSON layout back).
+    """
+    return _load_config(os.path.abspath(config_path))
+
+
+@lru_cache(maxsize=8)
+def _load_config(config_path: str) -> ScoringConfig:
+    with open(config_path) as f:
+        return ScoringConfig.from_dict(json.load(f))
 
 
 # Example usage
@@ -5,15 +5,23 @@ Combines empirical detection confidence with LLM-based priority scoring
 to rank and return top N deficiencies.
 """
 
+import asyncio
 import json
 import os
 import re
-from typing import Dict, Any, List, Optional
-from anthropic import Anthropic
-from dotenv import load_dotenv
+from typing import Any, Dict, List, Optional, Tuple
 
 from confidence_calculator import calculate_detection_confidence, load_config
-from priority_evaluator import evaluate_priority
+from dotenv import load_dotenv
+from priority_evaluator import (
+    evaluate_priority,
+    evaluate_priority_async,
+    evaluate_priority_batch,
+    evaluate_priority_batch_async,
+    get_anthropic,
+    get_async_anthropic,
+    run_async,
+)
 
 
 def extract_relevant_documents(actionable_instruction: str, related_documents: str, documents_checked: List[str] = None) -> str:
@@ -118,7 +126,9 @@ class DeficiencyScorer:
         self,
         config_path: str = "scoring_config.json",
         api_key: Optional[str] = None,
-        model: str = "claude-haiku-4-5-20251001"  # Optimized: Haiku is 3-5x faster than Sonnet
+        model: str = "claude-haiku-4-5-20251001",  # Optimized: Haiku is 3-5x faster than Sonnet
+        batch_size: int = 8,
+        use_cache: bool = True
     ):
         """
         Initialize the scorer.
@@ -127,17 +137,29 @@ class DeficiencyScorer:
             config_path: Path to scoring configuration JSON
             api_key: Anthropic API key (defaults to ANTHROPIC_API_KEY env var)
             model: Claude model to use for priority evaluation
+            batch_size: Deficiencies evaluated per priority call in score_deficiencies
+                        (1 sends each on its own)
+            use_cache: Reuse priority evaluations cached on disk (PRIORITY_CACHE_DIR)
+                       for deficiencies already scored with the same model
         """
         self.config = load_config(config_path)
         self.api_key = api_key or os.getenv("ANTHROPIC_API_KEY")
         self.model = model
+        self.batch_size = batch_size
+        self.use_cache = use_cache
         
         if not self.api_key:
             raise ValueError("ANTHROPIC_API_KEY not found in environment or parameters")
         
-        self.client = Anthropic(api_key=self.api_key)
+        # Pooled client from step 4/5; calls go through its shared rate limiter
+        self.client = get_anthropic(self.api_key)
         print(f"✓ DeficiencyScorer initialized with model: {self.model}")
     
+    @property
+    def async_client(self):
+        """Pooled async client for the running event loop (for concurrent scoring)."""
+        return get_async_anthropic(self.api_key)
+    
     def score_deficiencies(
         self,
         detection_results: Dict[str, Any],
@@ -157,7 +179,7 @@ class DeficiencyScorer:
         """
         # Load detection results if path provided
         if isinstance(detection_results, str):
-            with open(detection_results, 'r') as f:
+            with open(detection_results) as f:
                 detection_results = json.load(f)
         
         # Filter to deficient status only
@@ -184,14 +206,8 @@ class DeficiencyScorer:
                 }
             }
         
-        # Score each deficiency
-        scored_deficiencies = []
-        for i, result in enumerate(deficient_results, 1):
-            if verbose:
-                print(f"[{i}/{len(deficient_results)}] Scoring: {result.get('condition_id', 'Unknown')[:60]}...")
-            
-            scored = self.score_single_deficiency(result, verbose=False)
-            scored_deficiencies.append(scored)
+        # Score each deficiency (batched priority calls run concurrently, see ascore_deficiency_list)
+        scored_deficiencies = self._score_all(deficient_results, verbose)
         
         # Sort by priority score (descending)
         scored_deficiencies.sort(key=lambda x: x["priority_score"], reverse=True)
@@ -215,6 +231,88 @@ class DeficiencyScorer:
             "_metadata": detection_results.get("_metadata", {})
         }
     
+    def _score_all(self, deficient_results: List[Dict[str, Any]], verbose: bool) -> List[Dict[str, Any]]:
+        """
+        Score every deficiency, concurrently when no event loop is running
+        (inside one, fall back to one batch at a time; await ascore_deficiency_list there).
+        """
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            # Own loop and async client, closed when scoring is done
+            return run_async(self.ascore_deficiency_list(deficient_results, verbose))
+        
+        scored_deficiencies = []
+        for start, batch in self._batches(deficient_results):
+            self._print_progress(start, batch, len(deficient_results), verbose)
+            confidences = [self._detection_confidence(result, verbose=False) for result in batch]
+            priority_results = evaluate_priority_batch(
+                batch,
+                [confidence for confidence, _ in confidences],
+                self.api_key,
+                self.config.as_dict(),
+                self.model,
+                client=self.client,
+                use_cache=self.use_cache
+            )
+            scored_deficiencies.extend(
+                self._scored_result(result, confidence, breakdown, priority_result, verbose=False)
+                for result, (confidence, breakdown), priority_result in zip(batch, confidences, priority_results)
+            )
+        return scored_deficiencies
+    
+    async def ascore_deficiency_list(
+        self,
+        deficient_results: List[Dict[str, Any]],
+        verbose: bool = True
+    ) -> List[Dict[str, Any]]:
+        """
+        Score deficiencies batch_size per priority call (sharing the rubric and
+        one round-trip), with the calls running concurrently, so wall-clock time
+        is roughly the slowest calls rather than their sum. In-flight requests
+        are capped by anthropic_rate_limit (ANTHROPIC_MAX_CONCURRENT).
+        
+        Returns:
+            Scored deficiencies in the same order as deficient_results
+        """
+        total = len(deficient_results)
+        
+        async def score(start: int, batch: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+            confidences = [self._detection_confidence(result, verbose=False) for result in batch]
+            self._print_progress(start, batch, total, verbose)
+            priority_results = await evaluate_priority_batch_async(
+                batch,
+                [confidence for confidence, _ in confidences],
+                self.api_key,
+                self.config.as_dict(),
+                self.model,
+                client=self.async_client,
+                use_cache=self.use_cache
+            )
+            return [
+                self._scored_result(result, confidence, breakdown, priority_result, verbose=False)
+                for result, (confidence, breakdown), priority_result in zip(batch, confidences, priority_results)
+            ]
+        
+        # gather returns results in task order, whatever order the calls finish in
+        batches = await asyncio.gather(*(score(start, batch) for start, batch in self._batches(deficient_results)))
+        return [scored for batch in batches for scored in batch]
+    
+    def _batches(self, deficient_results: List[Dict[str, Any]]) -> List[Tuple[int, List[Dict[str, Any]]]]:
+        """(1-based index of first item, batch) for each batch_size slice."""
+        size = max(1, self.batch_size)
+        return [
+            (start + 1, deficient_results[start:start + size])
+            for start in range(0, len(deficient_results), size)
+        ]
+    
+    @staticmethod
+    def _print_progress(start: int, batch: List[Dict[str, Any]], total: int, verbose: bool) -> None:
+        if not verbose:
+            return
+        for i, result in enumerate(batch, start):
+            print(f"[{i}/{total}] Scoring: {result.get('condition_id', 'Unknown')[:60]}...")
+    
     def score_single_deficiency(
         self,
         deficiency_result: Dict[str, Any],
@@ -230,7 +328,43 @@ class DeficiencyScorer:
         Returns:
             Dict with detection confidence, priority score, and original data
         """
-        # Calculate empirical detection confidence
+        detection_confidence, confidence_breakdown = self._detection_confidence(deficiency_result, verbose)
+        
+        # Evaluate priority using LLM
+        priority_result = evaluate_priority(
+            deficiency_result,
+            detection_confidence,
+            self.api_key,
+            self.config.as_dict(),
+            self.model,
+            client=self.client,
+            use_cache=self.use_cache
+        )
+        
+        return self._scored_result(deficiency_result, detection_confidence, confidence_breakdown, priority_result, verbose)
+    
+    async def score_single_deficiency_async(
+        self,
+        deficiency_result: Dict[str, Any],
+        verbose: bool = False
+    ) -> Dict[str, Any]:
+        """Async version of score_single_deficiency (priority via the shared AsyncAnthropic client)."""
+        detection_confidence, confidence_breakdown = self._detection_confidence(deficiency_result, verbose)
+        
+        priority_result = await evaluate_priority_async(
+            deficiency_result,
+            detection_confidence,
+            self.api_key,
+            self.config.as_dict(),
+            self.model,
+            client=self.async_client,
+            use_cache=self.use_cache
+        )
+        
+        return self._scored_result(deficiency_result, detection_confidence, confidence_breakdown, priority_result, verbose)
+    
+    def _detection_confidence(self, deficiency_result: Dict[str, Any], verbose: bool) -> Tuple[float, Dict[str, float]]:
+        """Empirical detection confidence and its breakdown."""
         confidence_result = calculate_detection_confidence(deficiency_result, self.config)
         detection_confidence = confidence_result["overall"]
         confidence_breakdown = confidence_result["breakdown"]
@@ -240,15 +374,17 @@ class DeficiencyScorer:
             for key, value in confidence_breakdown.items():
                 print(f"    - {key}: {value:.3f}")
         
-        # Evaluate priority using LLM
-        priority_result = evaluate_priority(
-            deficiency_result,
-            detection_confidence,
-            self.api_key,
-            self.config,
-            self.model
-        )
-        
+        return detection_confidence, confidence_breakdown
+    
+    def _scored_result(
+        self,
+        deficiency_result: Dict[str, Any],
+        detection_confidence: float,
+        confidence_breakdown: Dict[str, float],
+        priority_result: Dict[str, Any],
+        verbose: bool
+    ) -> Dict[str, Any]:
+        """Combine confidence and priority into the scored output format."""
         priority_score = priority_result["overall_priority"]
         
         if verbose:
@@ -322,7 +458,7 @@ class DeficiencyScorer:
         print(f"Total Deficiencies Evaluated: {summary['total_deficiencies_evaluated']}")
         print(f"Average Detection Confidence: {summary['average_detection_confidence']:.3f}")
         print(f"Average Priority Score: {summary['average_priority_score']:.3f}")
-        print(f"\nPriority Distribution:")
+        print("\nPriority Distribution:")
         print(f"  🔴 High Priority (≥0.7): {summary['high_priority_count']}")
         print(f"  🟡 Medium Priority (0.4-0.7): {summary['medium_priority_count']}")
         print(f"  🟢 Low Priority (<0.4): {summary['low_priority_count']}")
@@ -8,10 +8,98 @@ Uses Claude to assess priority dimensions:
 - Complexity: Remediation difficulty?
 """
 
+import asyncio
+import atexit
+import hashlib
 import json
+import logging
 import os
-from typing import Dict, Any, Optional
-from anthropic import Anthropic
+import sqlite3
+import sys
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from anthropic import Anthropic, AsyncAnthropic
+
+# Claude calls share step 4/5's pooled clients and rate limiter (concurrency cap,
+# token budget, 429/5xx retries), so scoring and detection draw on one budget
+sys.path.append(str(Path(__file__).resolve().parent.parent / "step_4_5"))
+from anthropic_rate_limit import create_message, create_message_async
+from client_pool import get_anthropic, get_async_anthropic, run_async  # noqa: F401  (run_async: for deficiency_scorer)
+
+logger = logging.getLogger(__name__)
+
+# Scoring rubric sent after the deficiency details in every priority prompt
+PRIORITY_RUBRIC = """SCORING INSTRUCTIONS:
+Rate each dimension from 0.0 to 1.0 based on the loan underwriting context:
+
+1. SEVERITY: How critical is this to loan approval?
+   - 0.9-1.0: Deal cannot close, regulatory violation, legal requirement
+   - 0.6-0.8: Significant risk, underwriting concern, delays likely
+   - 0.3-0.5: Minor issue, can be resolved with documentation
+   - 0.0-0.2: Trivial, best practice only, optional
+
+2. IMPACT: What are the consequences if NOT resolved?
+   - 0.9-1.0: Legal/regulatory risk, cannot fund loan, investor rejection
+   - 0.6-0.8: Financial risk, requires additional verification, guideline violation
+   - 0.3-0.5: Process delay, manual review needed
+   - 0.0-0.2: Minor inconvenience, documentation preference
+
+3. URGENCY: How time-sensitive is this?
+   - 0.9-1.0: Immediate blocker, must resolve before proceeding
+   - 0.6-0.8: Needed before closing, prior to funding
+   - 0.3-0.5: Post-closing acceptable with conditions
+   - 0.0-0.2: Can be deferred, no immediate timeline
+
+4. COMPLEXITY: How difficult is remediation?
+   - 0.9-1.0: Very difficult, requires multiple parties, lengthy process
+   - 0.6-0.8: Moderate effort, coordination needed, multiple documents
+   - 0.3-0.5: Straightforward, clear process, single request
+   - 0.0-0.2: Easy fix, quick request, readily available
+
+IMPORTANT CONTEXT:
+- Missing signatures on tax returns = HIGH severity (required for loan approval)
+- Ownership verification = HIGH-MEDIUM severity (guideline requirement)
+- Missing optional documentation = LOW severity
+- Empty arrays/missing data = Consider if it's required or optional
+
+Return ONLY valid JSON in this exact format:
+{
+  "severity": 0.0-1.0,
+  "impact": 0.0-1.0,
+  "urgency": 0.0-1.0,
+  "complexity": 0.0-1.0,
+  "explanation": "1-2 sentence explanation of the priority assessment"
+}
+
+Do NOT include markdown formatting or any text outside the JSON."""
+
+# Replaces the rubric's single-object format when several deficiencies share one prompt
+BATCH_RESPONSE_FORMAT = """For these deficiencies, instead of a single object return ONLY valid JSON in this exact format,
+with one entry per deficiency ({count} in total), "id" being its DEFICIENCY number:
+{{
+  "results": [
+    {{"id": 1, "severity": 0.0-1.0, "impact": 0.0-1.0, "urgency": 0.0-1.0, "complexity": 0.0-1.0, "explanation": "1-2 sentences"}}
+  ]
+}}
+
+Do NOT include markdown formatting or any text outside the JSON."""
+
+# Priority dimensions every response must score
+PRIORITY_DIMENSIONS = ("severity", "impact", "urgency", "complexity")
+# Output tokens allowed per evaluated deficiency
+PRIORITY_MAX_TOKENS = 1000
+# Explanation in the default dimensions returned for an unparseable response
+PARSE_ERROR_EXPLANATION = "Error parsing response"
+
+# Persistent priority cache (survives restarts): identical deficiency, confidence,
+# model and prompt version -> the priority dimensions Claude returned. Bump
+# PRIORITY_PROMPT_VERSION whenever the prompt changes so old answers aren't reused
+PRIORITY_CACHE_DIR = os.getenv('PRIORITY_CACHE_DIR', '.priority_cache')
+PRIORITY_PROMPT_VERSION = 2
+_priority_cache_conn = None
+_priority_cache_lock = threading.Lock()
 
 
 def evaluate_priority(
@@ -19,7 +107,9 @@ def evaluate_priority(
     detection_confidence: float,
     api_key: Optional[str],
     config: Dict[str, Any],
-    model: str = "claude-haiku-4-5-20251001"  # Optimized: Haiku is 3-5x faster than Sonnet
+    model: str = "claude-haiku-4-5-20251001",  # Optimized: Haiku is 3-5x faster than Sonnet
+    client: Optional[Anthropic] = None,
+    use_cache: bool = True
 ) -> Dict[str, Any]:
     """
     Evaluate priority of a deficiency using Claude.
@@ -30,65 +120,352 @@ def evaluate_priority(
         api_key: Anthropic API key (or None to use env var)
         config: Configuration dict with weights
         model: Claude model to use
+        client: Anthropic client to use (default: the shared pooled client for api_key)
+        use_cache: Reuse/store the answer in the persistent priority cache
         
     Returns:
         Dict with priority dimensions, overall score, and explanation
     """
-    if not api_key:
-        api_key = os.getenv("ANTHROPIC_API_KEY")
-        if not api_key:
-            raise ValueError("ANTHROPIC_API_KEY not found in environment")
+    cache_key = _priority_cache_key(deficiency_result, detection_confidence, model) if use_cache else None
+    cached = _cached_priority(cache_key)
+    if cached is not None:
+        return _priority_result(cached, config)
     
-    client = Anthropic(api_key=api_key)
+    if client is None:
+        client = get_anthropic(_resolve_api_key(api_key))
     
     # Build prompt
     prompt = build_priority_prompt(deficiency_result, detection_confidence)
     
     # Call Claude
     try:
-        response = client.messages.create(
+        response = create_message(
+            client,
             model=model,
-            max_tokens=1000,
+            max_tokens=PRIORITY_MAX_TOKENS,
             messages=[{
                 "role": "user",
                 "content": prompt
             }]
         )
+        return _priority_from_response(response.content[0].text, config, cache_key)
         
-        response_text = response.content[0].text
-        
-        # Parse JSON from response
-        priority_dims = parse_priority_response(response_text)
-        
-        # Calculate overall priority score
-        overall = calculate_overall_priority(priority_dims, config["priority_score_weights"])
-        
-        return {
-            "severity": priority_dims["severity"],
-            "impact": priority_dims["impact"],
-            "urgency": priority_dims["urgency"],
-            "complexity": priority_dims["complexity"],
-            "explanation": priority_dims.get("explanation", ""),
-            "overall_priority": round(overall, 3)
-        }
+    except Exception as e:
+        return _default_priority(e)
+
+
+async def evaluate_priority_async(
+    deficiency_result: Dict[str, Any],
+    detection_confidence: float,
+    api_key: Optional[str],
+    config: Dict[str, Any],
+    model: str = "claude-haiku-4-5-20251001",
+    client: Optional[AsyncAnthropic] = None,
+    use_cache: bool = True
+) -> Dict[str, Any]:
+    """Async version of evaluate_priority (AsyncAnthropic), for scoring many deficiencies concurrently."""
+    cache_key = _priority_cache_key(deficiency_result, detection_confidence, model) if use_cache else None
+    cached = _cached_priority(cache_key)
+    if cached is not None:
+        return _priority_result(cached, config)
+    
+    if client is None:
+        client = get_async_anthropic(_resolve_api_key(api_key))
+    
+    prompt = build_priority_prompt(deficiency_result, detection_confidence)
+    
+    try:
+        response = await create_message_async(
+            client,
+            model=model,
+            max_tokens=PRIORITY_MAX_TOKENS,
+            messages=[{
+                "role": "user",
+                "content": prompt
+            }]
+        )
+        return _priority_from_response(response.content[0].text, config, cache_key)
         
     except Exception as e:
-        print(f"Error calling Claude API: {e}")
-        # Return default medium priority on error
-        return {
-            "severity": 0.5,
-            "impact": 0.5,
-            "urgency": 0.5,
-            "complexity": 0.5,
-            "explanation": f"Error evaluating priority: {str(e)}",
-            "overall_priority": 0.5
-        }
+        return _default_priority(e)
+
+
+def evaluate_priority_batch(
+    deficiency_results: List[Dict[str, Any]],
+    detection_confidences: List[float],
+    api_key: Optional[str],
+    config: Dict[str, Any],
+    model: str = "claude-haiku-4-5-20251001",
+    client: Optional[Anthropic] = None,
+    use_cache: bool = True
+) -> List[Dict[str, Any]]:
+    """
+    Evaluate several deficiencies with one Claude call (see build_batch_priority_prompt).
+    
+    Deficiencies found in the priority cache are answered from it and left out
+    of the call. If the response doesn't cover every deficiency, each is
+    re-evaluated with evaluate_priority; if the call itself fails, each gets
+    the default medium priority.
+    
+    Returns:
+        One evaluate_priority-style dict per deficiency, in order
+    """
+    cached, keys, pending = _split_cached(deficiency_results, detection_confidences, model, use_cache)
+    if not pending:
+        return [_priority_result(dims, config) for dims in cached]
+    results = [result for _, result in pending]
+    confidences = [detection_confidences[i] for i, _ in pending]
+    
+    if len(pending) == 1:
+        fresh = [evaluate_priority(results[0], confidences[0], api_key, config, model, client=client, use_cache=use_cache)]
+        return _merge_cached(cached, pending, fresh, config)
+    if client is None:
+        client = get_anthropic(_resolve_api_key(api_key))
+    
+    try:
+        response = create_message(
+            client,
+            model=model,
+            max_tokens=PRIORITY_MAX_TOKENS * len(pending),
+            messages=[{
+                "role": "user",
+                "content": build_batch_priority_prompt(results, confidences)
+            }]
+        )
+    except Exception as e:
+        return _merge_cached(cached, pending, [_default_priority(e) for _ in pending], config)
+    
+    dims_list = parse_batch_priority_response(response.content[0].text, len(pending))
+    if dims_list is None:
+        print("Warning: batch priority response incomplete, evaluating deficiencies one at a time")
+        fresh = [
+            evaluate_priority(result, confidence, api_key, config, model, client=client, use_cache=use_cache)
+            for result, confidence in zip(results, confidences)
+        ]
+        return _merge_cached(cached, pending, fresh, config)
+    
+    _store_priorities(zip((keys[i] for i, _ in pending), dims_list))
+    return _merge_cached(cached, pending, [_priority_result(dims, config) for dims in dims_list], config)
+
+
+async def evaluate_priority_batch_async(
+    deficiency_results: List[Dict[str, Any]],
+    detection_confidences: List[float],
+    api_key: Optional[str],
+    config: Dict[str, Any],
+    model: str = "claude-haiku-4-5-20251001",
+    client: Optional[AsyncAnthropic] = None,
+    use_cache: bool = True
+) -> List[Dict[str, Any]]:
+    """Async version of evaluate_priority_batch (fallback evaluations run concurrently)."""
+    cached, keys, pending = _split_cached(deficiency_results, detection_confidences, model, use_cache)
+    if not pending:
+        return [_priority_result(dims, config) for dims in cached]
+    results = [result for _, result in pending]
+    confidences = [detection_confidences[i] for i, _ in pending]
+    if client is None:
+        client = get_async_anthropic(_resolve_api_key(api_key))
+    
+    async def one_at_a_time() -> List[Dict[str, Any]]:
+        fresh = await asyncio.gather(*(
+            evaluate_priority_async(result, confidence, api_key, config, model, client=client, use_cache=use_cache)
+            for result, confidence in zip(results, confidences)
+        ))
+        return _merge_cached(cached, pending, fresh, config)
+    
+    if len(pending) == 1:
+        return await one_at_a_time()
+    
+    try:
+        response = await create_message_async(
+            client,
+            model=model,
+            max_tokens=PRIORITY_MAX_TOKENS * len(pending),
+            messages=[{
+                "role": "user",
+                "content": build_batch_priority_prompt(results, confidences)
+            }]
+        )
+    except Exception as e:
+        return _merge_cached(cached, pending, [_default_priority(e) for _ in pending], config)
+    
+    dims_list = parse_batch_priority_response(response.content[0].text, len(pending))
+    if dims_list is None:
+        print("Warning: batch priority response incomplete, evaluating deficiencies one at a time")
+        return await one_at_a_time()
+    
+    _store_priorities(zip((keys[i] for i, _ in pending), dims_list))
+    return _merge_cached(cached, pending, [_priority_result(dims, config) for dims in dims_list], config)
+
+
+def _get_priority_cache():
+    """Open the on-disk priority cache on first use (None if unavailable)."""
+    global _priority_cache_conn
+    if _priority_cache_conn is None:
+        try:
+            os.makedirs(PRIORITY_CACHE_DIR, exist_ok=True)
+            conn = sqlite3.connect(
+                os.path.join(PRIORITY_CACHE_DIR, 'priorities.sqlite'),
+                check_same_thread=False
+            )
+            conn.execute("CREATE TABLE IF NOT EXISTS priorities (key TEXT PRIMARY KEY, dims TEXT)")
+            conn.commit()
+            _priority_cache_conn = conn
+            atexit.register(conn.close)
+        except (OSError, sqlite3.Error) as e:
+            logger.warning("Priority cache disabled: %s", e)
+            _priority_cache_conn = False
+    return _priority_cache_conn or None
+
+
+def _priority_cache_key(deficiency_result: Dict[str, Any], detection_confidence: float, model: str) -> Optional[str]:
+    """Stable hash of everything the priority prompt is built from (None if not JSON-serializable)."""
+    try:
+        payload = json.dumps({
+            "cid": deficiency_result.get("condition_id", "Unknown"),
+            "status": deficiency_result.get("status", "deficient"),
+            "docs": deficiency_result.get("related_documents", ""),
+            "defs": deficiency_result.get("deficiencies", []),
+            "reason": deficiency_result.get("reasoning", ""),
+            "conf": round(detection_confidence, 2),
+            "model": model,
+            "version": PRIORITY_PROMPT_VERSION
+        }, sort_keys=True)
+    except (TypeError, ValueError):
+        return None
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _cached_priority(key: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Cached priority dimensions for key, or None."""
+    cache = _get_priority_cache() if key is not None else None
+    if cache is None:
+        return None
+    with _priority_cache_lock:
+        row = cache.execute("SELECT dims FROM priorities WHERE key = ?", (key,)).fetchone()
+    return json.loads(row[0]) if row else None
+
+
+def _store_priorities(entries) -> None:
+    """Cache (key, priority dimensions) pairs; entries with key None are skipped."""
+    rows = [(key, json.dumps(dims)) for key, dims in entries if key is not None]
+    cache = _get_priority_cache() if rows else None
+    if cache is None:
+        return
+    with _priority_cache_lock:
+        cache.executemany("INSERT OR REPLACE INTO priorities (key, dims) VALUES (?, ?)", rows)
+        cache.commit()
+
+
+def _split_cached(
+    deficiency_results: List[Dict[str, Any]],
+    detection_confidences: List[float],
+    model: str,
+    use_cache: bool
+) -> Tuple[List[Optional[Dict[str, Any]]], List[Optional[str]], List[Tuple[int, Dict[str, Any]]]]:
+    """Cached dimensions (None for misses), cache keys, and (index, result) for each miss."""
+    keys = [
+        _priority_cache_key(result, confidence, model) if use_cache else None
+        for result, confidence in zip(deficiency_results, detection_confidences)
+    ]
+    cached = [_cached_priority(key) for key in keys]
+    pending = [(i, result) for i, (result, dims) in enumerate(zip(deficiency_results, cached)) if dims is None]
+    return cached, keys, pending
+
+
+def _merge_cached(
+    cached: List[Optional[Dict[str, Any]]],
+    pending: List[Tuple[int, Dict[str, Any]]],
+    fresh: List[Dict[str, Any]],
+    config: Dict[str, Any]
+) -> List[Dict[str, Any]]:
+    """Priority results in input order: cache hits plus fresh results for the pending items."""
+    merged = [_priority_result(dims, config) if dims is not None else None for dims in cached]
+    for (i, _), result in zip(pending, fresh):
+        merged[i] = result
+    return merged
+
+
+def _resolve_api_key(api_key: Optional[str]) -> str:
+    if not api_key:
+        api_key = os.getenv("ANTHROPIC_API_KEY")
+        if not api_key:
+            raise ValueError("ANTHROPIC_API_KEY not found in environment")
+    return api_key
+
+
+def _priority_from_response(response_text: str, config: Dict[str, Any], cache_key: Optional[str] = None) -> Dict[str, Any]:
+    """Priority result from Claude's response text (cached under cache_key if it parsed)."""
+    # Parse JSON from response
+    priority_dims = parse_priority_response(response_text)
+    if priority_dims.get("explanation") != PARSE_ERROR_EXPLANATION:
+        _store_priorities([(cache_key, priority_dims)])
+    return _priority_result(priority_dims, config)
+
+
+def _priority_result(priority_dims: Dict[str, Any], config: Dict[str, Any]) -> Dict[str, Any]:
+    """Priority result (with overall score) from parsed priority dimensions."""
+    # Calculate overall priority score
+    overall = calculate_overall_priority(priority_dims, config["priority_score_weights"])
+    
+    return {
+        "severity": priority_dims["severity"],
+        "impact": priority_dims["impact"],
+        "urgency": priority_dims["urgency"],
+        "complexity": priority_dims["complexity"],
+        "explanation": priority_dims.get("explanation", ""),
+        "overall_priority": round(overall, 3)
+    }
+
+
+def _default_priority(error: Exception) -> Dict[str, Any]:
+    """Default medium priority when the API call or scoring fails."""
+    print(f"Error calling Claude API: {error}")
+    return {
+        "severity": 0.5,
+        "impact": 0.5,
+        "urgency": 0.5,
+        "complexity": 0.5,
+        "explanation": f"Error evaluating priority: {str(error)}",
+        "overall_priority": 0.5
+    }
 
 
 def build_priority_prompt(deficiency_result: Dict[str, Any], detection_confidence: float) -> str:
     """
     Build prompt for Claude to evaluate priority.
     """
+    return (
+        "Evaluate this loan underwriting deficiency for priority scoring.\n\n"
+        + _deficiency_details(deficiency_result, detection_confidence)
+        + "\n\n" + PRIORITY_RUBRIC
+    )
+
+
+def build_batch_priority_prompt(
+    deficiency_results: List[Dict[str, Any]],
+    detection_confidences: List[float]
+) -> str:
+    """
+    Build one prompt that evaluates several deficiencies (numbered 1..K), so
+    they share the rubric and a single API call. Same layout as
+    build_priority_prompt; the response format is a JSON array (see
+    parse_batch_priority_response).
+    """
+    items = "\n\n".join(
+        f"=== DEFICIENCY {item_id} ===\n" + _deficiency_details(result, confidence)
+        for item_id, (result, confidence) in enumerate(zip(deficiency_results, detection_confidences), 1)
+    )
+    return (
+        f"Evaluate each of these {len(deficiency_results)} loan underwriting deficiencies "
+        f"for priority scoring, independently.\n\n{items}\n\n"
+        + PRIORITY_RUBRIC + "\n\n"
+        + BATCH_RESPONSE_FORMAT.format(count=len(deficiency_results))
+    )
+
+
+def _deficiency_details(deficiency_result: Dict[str, Any], detection_confidence: float) -> str:
+    """The per-deficiency part of a priority prompt."""
     condition_id = deficiency_result.get("condition_id", "Unknown")
     status = deficiency_result.get("status", "deficient")
     related_docs = deficiency_result.get("related_documents", "")
@@ -108,9 +485,7 @@ def build_priority_prompt(deficiency_result: Dict[str, Any], detection_confidenc
         deficiency_text += f"   Field: {field}\n"
         deficiency_text += f"   Evidence: {evidence}\n"
     
-    prompt = f"""Evaluate this loan underwriting deficiency for priority scoring.
-
-DEFICIENCY INFORMATION:
+    return f"""DEFICIENCY INFORMATION:
 Condition: {condition_id}
 Status: {status}
 Related Documents: {related_docs}
@@ -121,84 +496,24 @@ This indicates how confident the detection system is that this is truly deficien
 DEFICIENCIES FOUND:{deficiency_text}
 
 REASONING:
-{reasoning}
-
-SCORING INSTRUCTIONS:
-Rate each dimension from 0.0 to 1.0 based on the loan underwriting context:
-
-1. SEVERITY: How critical is this to loan approval?
-   - 0.9-1.0: Deal cannot close, regulatory violation, legal requirement
-   - 0.6-0.8: Significant risk, underwriting concern, delays likely
-   - 0.3-0.5: Minor issue, can be resolved with documentation
-   - 0.0-0.2: Trivial, best practice only, optional
-
-2. IMPACT: What are the consequences if NOT resolved?
-   - 0.9-1.0: Legal/regulatory risk, cannot fund loan, investor rejection
-   - 0.6-0.8: Financial risk, requires additional verification, guideline violation
-   - 0.3-0.5: Process delay, manual review needed
-   - 0.0-0.2: Minor inconvenience, documentation preference
-
-3. URGENCY: How time-sensitive is this?
-   - 0.9-1.0: Immediate blocker, must resolve before proceeding
-   - 0.6-0.8: Needed before closing, prior to funding
-   - 0.3-0.5: Post-closing acceptable with conditions
-   - 0.0-0.2: Can be deferred, no immediate timeline
-
-4. COMPLEXITY: How difficult is remediation?
-   - 0.9-1.0: Very difficult, requires multiple parties, lengthy process
-   - 0.6-0.8: Moderate effort, coordination needed, multiple documents
-   - 0.3-0.5: Straightforward, clear process, single request
-   - 0.0-0.2: Easy fix, quick request, readily available
-
-IMPORTANT CONTEXT:
-- Missing signatures on tax returns = HIGH severity (required for loan approval)
-- Ownership verification = HIGH-MEDIUM severity (guideline requirement)
-- Missing optional documentation = LOW severity
-- Empty arrays/missing data = Consider if it's required or optional
-
-Return ONLY valid JSON in this exact format:
-{{
-  "severity": 0.0-1.0,
-  "impact": 0.0-1.0,
-  "urgency": 0.0-1.0,
-  "complexity": 0.0-1.0,
-  "explanation": "1-2 sentence explanation of the priority assessment"
-}}
-
-Do NOT include markdown formatting or any text outside the JSON."""
-    
-    return prompt
+{reasoning}"""
 
 
 def parse_priority_response(response_text: str) -> Dict[str, Any]:
     """
     Parse Claude's JSON response into priority dimensions.
     """
-    # Try to extract JSON if wrapped in markdown
-    if "```json" in response_text:
-        json_start = response_text.find("```json") + 7
-        json_end = response_text.find("```", json_start)
-        response_text = response_text[json_start:json_end].strip()
-    elif "```" in response_text:
-        json_start = response_text.find("```") + 3
-        json_end = response_text.find("```", json_start)
-        response_text = response_text[json_start:json_end].strip()
+    response_text = _strip_code_fence(response_text)
     
     try:
         data = json.loads(response_text)
         
         # Validate required fields
-        required_fields = ["severity", "impact", "urgency", "complexity"]
-        for field in required_fields:
+        for field in PRIORITY_DIMENSIONS:
             if field not in data:
                 raise ValueError(f"Missing required field: {field}")
-            
-            # Ensure values are in range 0-1
-            if not (0 <= data[field] <= 1):
-                print(f"Warning: {field} value {data[field]} out of range, clamping to [0,1]")
-                data[field] = max(0, min(1, data[field]))
         
-        return data
+        return _clamp_dimensions(data)
         
     except json.JSONDecodeError as e:
         print(f"Error parsing JSON response: {e}")
@@ -209,10 +524,64 @@ def parse_priority_response(response_text: str) -> Dict[str, Any]:
             "impact": 0.5,
             "urgency": 0.5,
             "complexity": 0.5,
-            "explanation": "Error parsing response"
+            "explanation": PARSE_ERROR_EXPLANATION
         }
 
 
+def parse_batch_priority_response(response_text: str, count: int) -> Optional[List[Dict[str, Any]]]:
+    """
+    Parse a build_batch_priority_prompt response into priority dimensions for
+    deficiencies 1..count, in order. Returns None unless every deficiency got
+    exactly one entry with numeric dimensions (callers then evaluate one at a time).
+    """
+    try:
+        data = json.loads(_strip_code_fence(response_text))
+    except json.JSONDecodeError:
+        return None
+    
+    items = data.get("results") if isinstance(data, dict) else None
+    if not isinstance(items, list):
+        return None
+    
+    by_id = {}
+    for item in items:
+        if not isinstance(item, dict) or not all(
+            isinstance(item.get(field), (int, float)) for field in PRIORITY_DIMENSIONS
+        ):
+            return None
+        try:
+            by_id[int(item.get("id"))] = item
+        except (TypeError, ValueError):
+            return None
+    
+    if len(items) != count or set(by_id) != set(range(1, count + 1)):
+        return None
+    return [_clamp_dimensions(by_id[item_id]) for item_id in range(1, count + 1)]
+
+
+def _strip_code_fence(response_text: str) -> str:
+    """The JSON inside a ```json / ``` fence, or the text unchanged."""
+    if "```json" in response_text:
+        json_start = response_text.find("```json") + 7
+        json_end = response_text.find("```", json_start)
+        return response_text[json_start:json_end].strip()
+    if "```" in response_text:
+        json_start = response_text.find("```") + 3
+        json_end = response_text.find("```", json_start)
+        return response_text[json_start:json_end].strip()
+    return response_text
+
+
+def _clamp_dimensions(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Clamp each priority dimension to [0, 1] (in place)."""
+    for field in PRIORITY_DIMENSIONS:
+        # Ensure values are in range 0-1
+        if not (0 <= data[field] <= 1):
+            print(f"Warning: {field} value {data[field]} out of range, clamping to [0,1]")
+            data[field] = max(0, min(1, data[field]))
+    return data
+
+
 def calculate_overall_priority(dimensions: Dict[str, float], weights: Dict[str, float]) -> float:
     """
     Calculate weighted overall priority score.
@@ -236,7 +605,7 @@ if __name__ == "__main__":
     load_dotenv()
     
     # Load config
-    with open("scoring_config.json", 'r') as f:
+    with open("scoring_config.json") as f:
         config = json.load(f)
     
     # Example deficiency result
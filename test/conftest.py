@@ -0,0 +1,3 @@
+# The script-style tests run the full pipeline against live APIs at import
+# time; run them directly (python test/quick_test.py), not through pytest.
+collect_ignore = ["quick_test.py", "test_multi_document_agent.py", "create_custom_test.py"]
@@ -0,0 +1,43 @@
+"""
+Tests for the step 4/5 Anthropic client pool.
+
+Async clients must be shared within one event loop only, and closed before a
+run_async loop ends. No API access (clients are built but never called).
+
+Run:
+    python -m pytest test/test_client_pool.py
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add src/agent/step_4_5 to path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root / "src" / "agent" / "step_4_5"))
+
+import client_pool  # noqa: E402
+
+
+async def _clients(*api_keys):
+    return [client_pool.get_async_anthropic(key) for key in api_keys]
+
+
+def test_async_client_shared_within_loop():
+    first, again, other = client_pool.run_async(_clients("key-a", "key-a", "key-b"))
+    assert first is again
+    assert first is not other
+
+
+def test_async_client_not_reused_across_loops():
+    (first,) = client_pool.run_async(_clients("key-a"))
+    (second,) = client_pool.run_async(_clients("key-a"))
+    assert second is not first
+    # run_async closed each loop's pool before the loop ended
+    assert first.is_closed() and second.is_closed()
+
+
+def test_async_client_needs_running_loop():
+    with pytest.raises(RuntimeError):
+        client_pool.get_async_anthropic("key-a")
@@ -0,0 +1,244 @@
+"""
+Equivalence tests for the Step 4 rule evaluator.
+
+Each optimized evaluation path must give the same results as the original
+dict-walking evaluator on fixed inputs. No API or database access.
+
+Run:
+    python -m pytest test/test_detect_deficiencies.py
+"""
+
+import copy
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add src/agent/step_4_5 to path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root / "src" / "agent" / "step_4_5"))
+
+from detect_deficiencies import (  # noqa: E402
+    CONDITION_TEMPLATES,
+    CONF_T,
+    DOC_JSON,
+    ConditionIndex,
+    evaluate_batch,
+    evaluate_condition,
+    evaluate_document,
+    flatten_doc,
+    present_docs,
+)
+
+# ---------- Reference: the evaluator before compilation/vectorization ----------
+
+def _ref_get_value(d, dotted_key):
+    cur = d
+    for part in dotted_key.split("."):
+        if not isinstance(cur, dict):
+            cur = None
+            break
+        cur = cur.get(part)
+        if cur is None:
+            break
+    if isinstance(cur, dict) and "value" in cur:
+        return cur.get("value"), float(cur.get("confidence", 0.0) or 0.0), cur.get("source_doc")
+    if isinstance(cur, (bool, int, float, str)):
+        return cur, 1.0, None
+    return None, 0.0, None
+
+
+def _ref_compare(op, actual, expected):
+    try:
+        if op == "eq":
+            return actual == expected
+        if op == "neq":
+            return actual != expected
+        if op == "gte":
+            return float(actual) >= float(expected)
+        if op == "lte":
+            return float(actual) <= float(expected)
+        if op == "in":
+            return actual in expected
+        if op == "between":
+            lo, hi = expected
+            return float(lo) <= float(actual) <= float(hi)
+    except Exception:
+        return False
+    return False
+
+
+def _ref_evaluate(doc, cond):
+    base = {"condition_id": cond["condition_id"], "title": cond.get("title")}
+    for rule in cond.get("applies_when", []):
+        actual, conf, _ = _ref_get_value(doc, rule["field"])
+        if conf < CONF_T or not _ref_compare(rule["op"], actual, rule["value"]):
+            return {**base, "status": "not_applicable", "failures": [],
+                    "notes": "applies_when not satisfied"}
+
+    failures = []
+    for docname in cond.get("must_have_docs", []):
+        if not doc.get("doc_presence", {}).get(docname, False):
+            failures.append({"field": f"doc_presence.{docname}", "expected": "present",
+                             "actual": "missing", "provenance": None})
+
+    for ex in cond.get("exceptions", []):
+        actual, conf, _ = _ref_get_value(doc, ex["when"]["field"])
+        if conf >= CONF_T and _ref_compare(ex["when"]["op"], actual, ex["when"]["value"]):
+            return {**base, "status": ex.get("action", "unknown"), "failures": failures,
+                    "notes": ex.get("note", "")}
+
+    for rule in cond.get("checks", []):
+        actual, conf, prov = _ref_get_value(doc, rule["field"])
+        expected = f"{rule['op']} {rule['value']}"
+        if conf < CONF_T or actual is None:
+            failures.append({"field": rule["field"], "expected": expected,
+                             "actual": "unknown", "provenance": prov})
+        elif not _ref_compare(rule["op"], actual, rule["value"]):
+            failures.append({"field": rule["field"], "expected": expected,
+                             "actual": actual, "provenance": prov})
+
+    return {**base, "status": "deficient" if failures else "satisfied",
+            "failures": failures, "notes": ""}
+
+
+# ---------- Fixed inputs ----------
+
+NUMERIC_CONDITIONS = [
+    {
+        "condition_id": "COND_LTV",
+        "title": "LTV within program limits",
+        "severity": "soft",
+        "applies_when": [{"field": "loan.program", "op": "in", "value": ["Flex Select", "Flex Supreme"]}],
+        "must_have_docs": ["Appraisal Report"],
+        "checks": [
+            {"field": "loan.ltv", "op": "lte", "value": 80},
+            {"field": "borrower.fico", "op": "gte", "value": 660},
+            {"field": "loan.dscr", "op": "between", "value": [1.0, 5.0]},
+            {"field": "loan.occupancy", "op": "neq", "value": "Primary"},
+            {"field": "loan.unknown_op", "op": "matches", "value": ".*"},
+        ],
+        "exceptions": [
+            {"when": {"field": "loan.waiver", "op": "eq", "value": True},
+             "action": "waived", "note": "Manual waiver on file."}
+        ],
+    },
+    {
+        # No applies_when 'eq' rule, so ConditionIndex always evaluates it
+        "condition_id": "COND_ALWAYS",
+        "title": "Appraisal present",
+        "must_have_docs": ["Appraisal Report"],
+        "checks": [{"field": "appraisal.value", "op": "gte", "value": 100000}],
+    },
+]
+
+CONDITIONS = CONDITION_TEMPLATES + NUMERIC_CONDITIONS
+
+
+_DELETE = object()
+
+
+def _variant(**changes):
+    """DOC_JSON plus loan fields, with a__b__c=value overrides (_DELETE removes a key)."""
+    doc = copy.deepcopy(DOC_JSON)
+    doc.update({
+        "loan": {
+            "program": {"value": "Flex Select", "confidence": 0.95},
+            "ltv": {"value": 75, "confidence": 0.9, "source_doc": "1008.pdf"},
+            "dscr": {"value": "1.25", "confidence": 0.9},
+            "occupancy": {"value": "Investment", "confidence": 0.9},
+        },
+        "borrower": {"fico": 700},
+        "appraisal": dict(DOC_JSON["appraisal"], value={"value": 250000, "confidence": 0.9}),
+    })
+    for dotted, value in changes.items():
+        *path, leaf = dotted.split("__")
+        node = doc
+        for part in path:
+            node = node.setdefault(part, {})
+        if value is _DELETE:
+            node.pop(leaf, None)
+        else:
+            node[leaf] = value
+    return doc
+
+
+DOCS = [
+    DOC_JSON,
+    _variant(),
+    _variant(transaction__purpose={"value": "Refinance", "confidence": 0.99}),
+    _variant(property__fema_impacted={"value": True, "confidence": 0.4}),
+    _variant(appraisal__damage_observed={"value": True, "confidence": 0.93}),
+    _variant(doc_presence={"Borrower Attestation": True, "Appraisal Report": False}),
+    _variant(attestation__borrower__no_damage={"value": False, "confidence": 0.95, "source_doc": "att.pdf"}),
+    _variant(attestation__borrower__no_claims={"value": True, "confidence": 0.2, "source_doc": "att.pdf"}),
+    _variant(attestation__borrower__no_claims={"value": True, "confidence": "n/a"}),
+    _variant(photos="not available"),
+    _variant(loan__ltv={"value": 95, "confidence": 0.9}, borrower__fico="unknown"),
+    _variant(loan__dscr={"value": [1, 2], "confidence": 0.9}, loan__occupancy={"value": "Primary", "confidence": 0.9}),
+    _variant(loan__waiver={"value": True, "confidence": 0.8}, loan__ltv={"value": 99, "confidence": 0.9}),
+    _variant(loan__program={"value": "Other", "confidence": 0.95}),
+    _variant(loan__program={"value": ["Flex Select"], "confidence": 0.95}),
+    _variant(appraisal__value=_DELETE, certification__seller=None),
+]
+
+
+def _reference_results(doc):
+    results = []
+    for cond in CONDITIONS:
+        try:
+            results.append(_ref_evaluate(doc, cond))
+        except (TypeError, ValueError):
+            results.append(None)  # baseline raised (unparseable confidence)
+    return results
+
+
+# ---------- Tests ----------
+
+@pytest.mark.parametrize("doc_index", range(len(DOCS)))
+def test_compiled_evaluator_matches_reference(doc_index):
+    doc = DOCS[doc_index]
+    for cond, expected in zip(CONDITIONS, _reference_results(doc)):
+        if expected is None:
+            with pytest.raises((TypeError, ValueError)):
+                evaluate_condition(doc, cond)
+            continue
+        assert evaluate_condition(doc, cond) == expected
+        assert evaluate_condition(doc, cond, present_docs(doc), flat=flatten_doc(doc)) == expected
+
+
+@pytest.mark.parametrize("doc_index", range(len(DOCS)))
+def test_evaluate_document_matches_reference(doc_index):
+    doc = DOCS[doc_index]
+    expected = _reference_results(doc)
+    if None in expected:
+        pytest.skip("reference evaluator raises on this doc")
+    assert evaluate_document(doc, ConditionIndex(CONDITIONS)) == expected
+
+
+def test_fail_fast_keeps_status():
+    for doc in DOCS:
+        for cond, expected in zip(CONDITIONS, _reference_results(doc)):
+            if expected is None:
+                continue
+            result = evaluate_condition(doc, cond, fail_fast=True)
+            assert result["status"] == expected["status"]
+            assert result["failures"] == expected["failures"][:len(result["failures"])]
+
+
+def test_evaluate_batch_matches_evaluate_condition():
+    docs = [doc for doc in DOCS if None not in _reference_results(doc)]
+    frame = evaluate_batch(docs, CONDITIONS)
+
+    assert len(frame) == len(docs) * len(CONDITIONS)
+    rows = {(row["doc_index"], row["condition_id"]): row for row in frame.to_dict("records")}
+    for i, doc in enumerate(docs):
+        for cond in CONDITIONS:
+            row = rows[(i, cond["condition_id"])]
+            expected = evaluate_condition(doc, cond)
+            assert {key: row[key] for key in expected} == expected
+
+
+def test_evaluate_batch_empty():
+    assert evaluate_batch([], CONDITIONS).empty
+    assert evaluate_batch(DOCS, []).empty
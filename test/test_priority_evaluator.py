@@ -0,0 +1,205 @@
+"""
+Equivalence tests for Step 6/7 priority scoring.
+
+Batched scoring (one Claude call for several deficiencies) must give the same
+results as scoring each deficiency on its own, incomplete batch responses must
+fall back to single calls, and the on-disk priority cache must only hit for an
+identical deficiency, confidence and model. Claude is replaced by a fake client.
+
+Run:
+    python -m pytest test/test_priority_evaluator.py
+"""
+
+import asyncio
+import json
+import re
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+# Add src/agent/step_6_7 to path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root / "src" / "agent" / "step_6_7"))
+
+import priority_evaluator as pe  # noqa: E402
+
+CONFIG = {"priority_score_weights": {"severity": 0.4, "impact": 0.3, "urgency": 0.2, "complexity": 0.1}}
+MODEL = "claude-haiku-4-5-20251001"
+
+DEFICIENCIES = [
+    {"condition_id": "COND_TAX_RETURNS_SIGNED", "status": "deficient",
+     "deficiencies": [{"requirement": "Tax returns signed", "issue": "2023 return unsigned"}], "reasoning": "Signature page missing."},
+    {"condition_id": "COND_K1_OWNERSHIP", "status": "deficient",
+     "deficiencies": [{"requirement": "Ownership documented", "issue": "Ownership % not shown"}], "reasoning": "K-1 line J blank."},
+    {"condition_id": "COND_BANK_STATEMENTS", "status": "deficient",
+     "deficiencies": [{"requirement": "Two months of statements", "issue": "Only one month provided"}], "reasoning": "Two months required."},
+]
+CONFIDENCES = [0.9, 0.75, 0.6]
+
+# What the fake Claude answers for each deficiency (1.4 is clamped to 1)
+ANSWERS = {
+    "COND_TAX_RETURNS_SIGNED": {"severity": 0.9, "impact": 0.8, "urgency": 0.7, "complexity": 0.2,
+                                "explanation": "Blocks closing."},
+    "COND_K1_OWNERSHIP": {"severity": 0.6, "impact": 0.5, "urgency": 1.4, "complexity": 0.4,
+                          "explanation": "Needs CPA letter."},
+    "COND_BANK_STATEMENTS": {"severity": 0.3, "impact": 0.4, "urgency": 0.5, "complexity": 0.1,
+                             "explanation": "Easy to obtain."},
+}
+
+
+def _reply(kwargs, complete_batches):
+    prompt = kwargs["messages"][0]["content"]
+    cids = re.findall(r"COND_[A-Z0-9_]+", prompt)
+    if "=== DEFICIENCY" not in prompt:
+        return json.dumps(ANSWERS[cids[0]])
+    results = [dict(ANSWERS[cid], id=i) for i, cid in enumerate(cids, 1)]
+    if not complete_batches:
+        results = results[:-1]
+    # Out of order and fenced, as Claude sometimes answers
+    return "```json\n" + json.dumps({"results": results[::-1]}) + "\n```"
+
+
+class FakeClient:
+    """Stands in for Anthropic: answers from ANSWERS and records each prompt."""
+
+    def __init__(self, complete_batches=True):
+        self.calls = []
+        self.messages = self
+        self.complete_batches = complete_batches
+
+    def create(self, **kwargs):
+        self.calls.append(kwargs)
+        text = _reply(kwargs, self.complete_batches)
+        return SimpleNamespace(content=[SimpleNamespace(text=text)])
+
+
+class FakeAsyncClient(FakeClient):
+    async def create(self, **kwargs):
+        return FakeClient.create(self, **kwargs)
+
+
+class GarbledClient(FakeClient):
+    def create(self, **kwargs):
+        self.calls.append(kwargs)
+        return SimpleNamespace(content=[SimpleNamespace(text="oops")])
+
+
+def _batch_size(call):
+    return call["messages"][0]["content"].count("=== DEFICIENCY")
+
+
+@pytest.fixture
+def priority_cache(tmp_path, monkeypatch):
+    """A fresh on-disk priority cache for one test."""
+    monkeypatch.setattr(pe, "PRIORITY_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(pe, "_priority_cache_conn", None)
+    yield tmp_path
+    if pe._priority_cache_conn:
+        pe._priority_cache_conn.close()
+
+
+def _single_results():
+    client = FakeClient()
+    return [
+        pe.evaluate_priority(result, confidence, None, CONFIG, MODEL, client=client, use_cache=False)
+        for result, confidence in zip(DEFICIENCIES, CONFIDENCES)
+    ]
+
+
+# ---------- Batch response parsing ----------
+
+def test_parse_batch_matches_single_parse():
+    items = [dict(ANSWERS[d["condition_id"]], id=i) for i, d in enumerate(DEFICIENCIES, 1)]
+    text = "Here you go:\n```json\n" + json.dumps({"results": items[::-1]}) + "\n```"
+
+    parsed = pe.parse_batch_priority_response(text, len(items))
+    singles = [pe.parse_priority_response(json.dumps(ANSWERS[d["condition_id"]])) for d in DEFICIENCIES]
+    assert [{k: p[k] for k in s} for p, s in zip(parsed, singles)] == singles
+    assert parsed[1]["urgency"] == 1
+
+
+@pytest.mark.parametrize("results", [
+    [{"id": 1, "severity": 1, "impact": 1, "urgency": 1, "complexity": 1}],
+    [{"id": i, "severity": 1, "impact": 1, "urgency": 1, "complexity": 1} for i in (1, 1)],
+    [{"id": i, "severity": 1, "impact": 1, "urgency": 1, "complexity": 1} for i in (1, 3)],
+    [{"id": 1, "severity": 1, "impact": 1, "urgency": 1, "complexity": 1},
+     {"id": 2, "severity": "high", "impact": 1, "urgency": 1, "complexity": 1}],
+    [{"id": "x", "severity": 1, "impact": 1, "urgency": 1, "complexity": 1},
+     {"id": 2, "severity": 1, "impact": 1, "urgency": 1, "complexity": 1}],
+])
+def test_parse_batch_rejects_incomplete(results):
+    assert pe.parse_batch_priority_response(json.dumps({"results": results}), 2) is None
+
+
+def test_parse_batch_rejects_non_json():
+    assert pe.parse_batch_priority_response("not json", 1) is None
+    assert pe.parse_batch_priority_response(json.dumps([1, 2]), 2) is None
+
+
+# ---------- Batched vs single scoring ----------
+
+def test_batch_matches_single_calls():
+    client = FakeClient()
+    batched = pe.evaluate_priority_batch(DEFICIENCIES, CONFIDENCES, None, CONFIG, MODEL, client=client, use_cache=False)
+
+    assert batched == _single_results()
+    assert [_batch_size(call) for call in client.calls] == [len(DEFICIENCIES)]
+
+
+def test_incomplete_batch_falls_back_to_single_calls():
+    client = FakeClient(complete_batches=False)
+    batched = pe.evaluate_priority_batch(DEFICIENCIES, CONFIDENCES, None, CONFIG, MODEL, client=client, use_cache=False)
+
+    assert batched == _single_results()
+    assert [_batch_size(call) for call in client.calls] == [len(DEFICIENCIES), 0, 0, 0]
+
+
+@pytest.mark.parametrize("complete_batches", [True, False])
+def test_async_batch_matches_single_calls(complete_batches):
+    client = FakeAsyncClient(complete_batches)
+    batched = asyncio.run(pe.evaluate_priority_batch_async(
+        DEFICIENCIES, CONFIDENCES, None, CONFIG, MODEL, client=client, use_cache=False
+    ))
+    assert batched == _single_results()
+
+
+# ---------- Priority cache keying ----------
+
+def test_priority_cache_key():
+    key = pe._priority_cache_key(DEFICIENCIES[0], 0.9, MODEL)
+    assert key == pe._priority_cache_key(dict(DEFICIENCIES[0]), 0.9, MODEL)
+    assert key == pe._priority_cache_key(DEFICIENCIES[0], 0.901, MODEL)  # rounded like the prompt
+    assert key != pe._priority_cache_key(DEFICIENCIES[0], 0.8, MODEL)
+    assert key != pe._priority_cache_key(DEFICIENCIES[0], 0.9, "claude-sonnet-4-5")
+    assert key != pe._priority_cache_key(dict(DEFICIENCIES[0], reasoning="Signed."), 0.9, MODEL)
+    assert pe._priority_cache_key(dict(DEFICIENCIES[0], deficiencies=[object()]), 0.9, MODEL) is None
+
+
+def test_priority_cache_hits_and_misses(priority_cache):
+    client = FakeClient()
+    first = pe.evaluate_priority_batch(DEFICIENCIES[:2], CONFIDENCES[:2], None, CONFIG, MODEL, client=client)
+    assert [_batch_size(call) for call in client.calls] == [2]
+
+    # Cached deficiencies are left out of the call; results keep input order
+    second = pe.evaluate_priority_batch(DEFICIENCIES, CONFIDENCES, None, CONFIG, MODEL, client=client)
+    assert second[:2] == first
+    assert second == _single_results()
+    assert [_batch_size(call) for call in client.calls] == [2, 0]
+    assert "COND_BANK_STATEMENTS" in json.dumps(client.calls[-1]["messages"])
+
+    # All cached: no call. Different model or confidence: miss
+    pe.evaluate_priority_batch(DEFICIENCIES, CONFIDENCES, None, CONFIG, MODEL, client=client)
+    assert len(client.calls) == 2
+    pe.evaluate_priority(DEFICIENCIES[0], 0.5, None, CONFIG, MODEL, client=client)
+    pe.evaluate_priority(DEFICIENCIES[0], 0.9, None, CONFIG, "claude-sonnet-4-5", client=client)
+    assert len(client.calls) == 4
+
+
+def test_unparsed_response_is_not_cached(priority_cache):
+    client = GarbledClient()
+    for _ in range(2):
+        result = pe.evaluate_priority(DEFICIENCIES[0], 0.9, None, CONFIG, MODEL, client=client)
+        assert result["explanation"] == pe.PARSE_ERROR_EXPLANATION
+    assert len(client.calls) == 2
@@ -0,0 +1,169 @@
+"""
+Equivalence tests for the Step 3 similarity ranking.
+
+Optimized scoring and selection must match exact cosine ranking with a full
+sort, and the embedding / score / matrix caches must miss when their inputs
+change. No OpenAI or Neo4j access.
+
+Run:
+    python -m pytest test/test_rank_by_similarity.py
+"""
+
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+# Add src/agent/step_3 to path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root / "src" / "agent" / "step_3"))
+
+import rank_by_similarity as rbs  # noqa: E402
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    """Point the embedding / matrix caches at a fresh directory."""
+    monkeypatch.setattr(rbs, "EMB_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(rbs, "_emb_cache_conn", None)
+    yield tmp_path
+    if rbs._emb_cache_conn:
+        rbs._emb_cache_conn.close()
+
+
+def _requirements(count, dim=64, seed=0):
+    rng = np.random.default_rng(seed)
+    return [
+        {"id": f"r{i}", "embedding": rng.normal(size=dim).tolist()}
+        for i in range(count)
+    ]
+
+
+def _exact_ranking(requirements, entity_embeddings, method, top_n):
+    scored = [
+        (rbs.calculate_requirement_similarity(req, entity_embeddings, method), req["id"])
+        for req in requirements
+    ]
+    scored.sort(key=lambda item: item[0], reverse=True)
+    return scored[:top_n]
+
+
+@pytest.mark.parametrize("method", ["max", "avg"])
+def test_int8_prefilter_matches_exact_top_n(cache_dir, method):
+    requirements = _requirements(1200)
+    entity_embeddings = np.random.default_rng(1).normal(size=(3, 64)).tolist()
+    top_n = 10
+
+    candidates = rbs._score_requirements(requirements, entity_embeddings, method, top_n=top_n)
+    assert candidates is not None  # int8 path taken
+    assert len(candidates) >= top_n + rbs.INT8_CANDIDATE_MARGIN
+    ranked = rbs._select_top(requirements, top_n, candidates)
+
+    expected = _exact_ranking(requirements, entity_embeddings, method, top_n)
+    assert [req["id"] for req in ranked] == [req_id for _, req_id in expected]
+    assert [req["similarity_score"] for req in ranked] == pytest.approx(
+        [score for score, _ in expected], abs=1e-5
+    )
+
+
+def test_select_top_ignores_approximate_scores():
+    requirements = [{"id": f"r{i}", "similarity_score": i / 10} for i in range(10)]
+    # r9 and r8 only carry approximate scores; the exact candidates are r0..r5
+    ranked = rbs._select_top(requirements, 3, candidates=[5, 0, 3, 1, 4, 2])
+    assert [req["id"] for req in ranked] == ["r5", "r4", "r3"]
+
+
+def test_full_pass_matches_cosine_similarity(cache_dir):
+    requirements = _requirements(50) + [{"id": "empty", "embedding": []}]
+    entity_embeddings = np.random.default_rng(2).normal(size=(2, 64)).tolist()
+
+    assert rbs._score_requirements(requirements, entity_embeddings, "max") is None
+    for req in requirements:
+        assert req["similarity_score"] == pytest.approx(
+            rbs.calculate_requirement_similarity(req, entity_embeddings, "max"), abs=1e-5
+        )
+
+
+def test_matrix_path_tracks_embeddings():
+    requirements = _requirements(5)
+    path = rbs._requirement_matrix_path(requirements)
+    assert rbs._requirement_matrix_path(list(reversed(requirements))) == path
+
+    requirements[2] = {"id": "r2", "embedding": [0.0] * 63 + [1.0]}
+    assert rbs._requirement_matrix_path(requirements) != path
+
+
+def test_embedding_fingerprint():
+    emb = np.random.default_rng(4).normal(size=3072)
+    fingerprint = rbs._embedding_fingerprint({"embedding": emb.tolist()})
+    assert rbs._embedding_fingerprint({"embedding": emb.astype(np.float32)}) == fingerprint
+    assert rbs._embedding_fingerprint({"embedding": (emb + 0.01).tolist()}) != fingerprint
+    assert rbs._embedding_fingerprint({"embedding": emb[:1536].tolist()}) != fingerprint
+    assert rbs._embedding_fingerprint({"embedding": []}) is None
+    assert rbs._embedding_fingerprint({}) is None
+
+
+def test_select_top_matches_full_sort():
+    rng = np.random.default_rng(3)
+    # Rounded so some scores tie; heapq.nlargest must break ties like sorted()
+    requirements = [{"id": f"r{i}", "similarity_score": round(float(s), 2)} for i, s in enumerate(rng.random(500))]
+    requirements.append({"id": "unscored"})
+
+    full = sorted(requirements, key=rbs._similarity_score, reverse=True)
+    for top_n in (1, 5, 20, None):
+        assert rbs._select_top(requirements, top_n) == (full[:top_n] if top_n else full)
+
+
+def test_score_cache_keys_on_embedding_fingerprint():
+    rbs.clear_score_cache()
+    requirements = _requirements(3)
+    entities = ["rental income", "LLC"]
+    fingerprints = [rbs._embedding_fingerprint(req) for req in requirements]
+    keys = rbs._score_cache_keys(requirements, fingerprints, entities, "max")
+
+    assert not rbs._apply_cached_scores(requirements, keys)
+    for i, req in enumerate(requirements):
+        req["similarity_score"] = i / 10
+    rbs._store_cached_scores(requirements, keys)
+
+    hit = [{"id": req["id"], "embedding": req["embedding"]} for req in requirements]
+    assert rbs._apply_cached_scores(hit, rbs._score_cache_keys(hit, fingerprints, entities, "max"))
+    assert [req["similarity_score"] for req in hit] == [0.0, 0.1, 0.2]
+
+    # Other entities or method, or a re-embedded requirement: miss
+    assert not rbs._apply_cached_scores(hit, rbs._score_cache_keys(hit, fingerprints, ["LLC"], "max"))
+    assert not rbs._apply_cached_scores(hit, rbs._score_cache_keys(hit, fingerprints, entities, "avg"))
+    hit[0]["embedding"] = [0.5] * 64
+    refreshed = [rbs._embedding_fingerprint(req) for req in hit]
+    assert not rbs._apply_cached_scores(hit, rbs._score_cache_keys(hit, refreshed, entities, "max"))
+    rbs.clear_score_cache()
+
+
+class _FakeEmbeddings:
+    def __init__(self):
+        self.calls = []
+
+    def create(self, input, model):
+        self.calls.append(list(input))
+        data = [SimpleNamespace(index=i, embedding=[float(len(text)), float(i)]) for i, text in enumerate(input)]
+        return SimpleNamespace(data=list(reversed(data)))
+
+
+def test_entity_embedding_cache_hits_and_misses(cache_dir, monkeypatch):
+    assert rbs._emb_cache_key("LLC") == rbs._emb_cache_key("LLC")
+    assert rbs._emb_cache_key("LLC") != rbs._emb_cache_key("LLC ")
+    assert rbs._emb_cache_key("LLC") != rbs._emb_cache_key("LLC", model="text-embedding-3-small")
+
+    embeddings = _FakeEmbeddings()
+    monkeypatch.setattr(rbs, "openai_client", SimpleNamespace(embeddings=embeddings))
+
+    first = rbs.get_entity_embeddings(["LLC", "rental income", "LLC"])
+    assert embeddings.calls == [["LLC", "rental income"]]
+    assert first == [[3.0, 0.0], [13.0, 1.0], [3.0, 0.0]]
+
+    # Cached texts cost no request; only the new one is embedded
+    second = rbs.get_entity_embeddings(["rental income", "K-1", "LLC"])
+    assert embeddings.calls[1:] == [["K-1"]]
+    assert second == [[13.0, 1.0], [3.0, 0.0], [3.0, 0.0]]
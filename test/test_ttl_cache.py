@@ -0,0 +1,51 @@
+"""
+Tests for the Step 2 TTL cache decorator.
+
+Calls that bind to the same arguments must share one cache entry, whether
+the arguments are passed positionally, by keyword or left at their defaults.
+
+Run:
+    python -m pytest test/test_ttl_cache.py
+"""
+
+import sys
+from pathlib import Path
+
+# Add src/agent/step_2 to path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root / "src" / "agent" / "step_2"))
+
+from ttl_cache import ttl_cache  # noqa: E402
+
+
+def _counted():
+    calls = []
+
+    @ttl_cache(maxsize=8, ttl=600)
+    def search(labels, limit=10, verbose=False):
+        calls.append((labels, limit))
+        return [{"label": label} for label in labels[:limit]]
+
+    return search, calls
+
+
+def test_equivalent_calls_share_an_entry():
+    search, calls = _counted()
+    search(["A", "B"])
+    search(["A", "B"], 10)
+    search(labels=["A", "B"])
+    search(["A", "B"], limit=10, verbose=True)
+    search(["A", "B"], 10, True)
+    assert calls == [(["A", "B"], 10)]
+
+
+def test_different_arguments_miss():
+    search, calls = _counted()
+    search(["A", "B"])
+    search(["A", "B"], 1)
+    search(["B", "A"])
+    assert len(calls) == 3
+
+    search.cache_clear()
+    search(["A", "B"])
+    assert len(calls) == 4